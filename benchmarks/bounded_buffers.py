@@ -0,0 +1,51 @@
+"""
+有界 line buffer 的内存对比: 同一策略在相同的模拟K线上分别以 exactbars=0/1 运行, 统计耗时和峰值内存
+python -m benchmarks.bounded_buffers --bars 1000000
+"""
+import argparse
+import time
+import tracemalloc
+
+import backtrader as bt
+from loguru import logger
+
+from benchmarks.data import SyntheticFeed
+from strategy.RSIReversal import RSIReversal
+from utils import log
+
+
+def run(bars, exactbars):
+    cerebro = bt.Cerebro(stdstats=False)
+    cerebro.adddata(SyntheticFeed(bars=bars))
+    cerebro.addstrategy(RSIReversal, boll_period=60, rsi_period=30, boll_dev=2.0, rsi_buy_signal=45,
+                        rsi_downward_period=3, stop_loss=0.05)
+    cerebro.broker.set_cash(1000)
+
+    tracemalloc.start()
+    start = time.perf_counter()
+    strategy = cerebro.run(preload=False, runonce=False, exactbars=exactbars)[0]
+    elapsed = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return elapsed, peak, strategy.generate_combinations_report()
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--bars', type=int, default=1000000)
+    args = parser.parse_args()
+    logger.remove()
+    log.set_level(None)
+
+    results = {}
+    for exactbars in (0, 1):
+        elapsed, peak, report = run(args.bars, exactbars)
+        results[exactbars] = report
+        print(f"exactbars={exactbars} bars={args.bars} time={elapsed:.1f}s "
+              f"bars/s={args.bars / elapsed:.0f} peak={peak / 1024 / 1024:.1f}MB "
+              f"trades={report['获胜'] + report['失败']}")
+    print(f"same trades: {results[0] == results[1]}")
+
+
+if __name__ == '__main__':
+    main()
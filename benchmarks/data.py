@@ -0,0 +1,27 @@
+import backtrader as bt
+
+from utils.dataset import synthetic_candles
+
+
+class SyntheticFeed(bt.DataBase):
+    """逐根生成模拟K线的数据源, 不预加载, 与实盘 CCXTStore 一样按 _load 逐根推送"""
+    params = (
+        ('bars', 1000),
+        ('seed', 0),
+    )
+
+    def start(self):
+        super(SyntheticFeed, self).start()
+        self._candles = synthetic_candles(self.p.bars, self.p.seed)
+
+    def _load(self):
+        ohlcv = next(self._candles, None)
+        if ohlcv is None:
+            return False
+        self.lines.datetime[0] = bt.date2num(ohlcv[0])
+        self.lines.open[0] = ohlcv[1]
+        self.lines.high[0] = ohlcv[2]
+        self.lines.low[0] = ohlcv[3]
+        self.lines.close[0] = ohlcv[4]
+        self.lines.volume[0] = ohlcv[5]
+        return True
@@ -0,0 +1,268 @@
+"""
+实盘链路压力测试: 启动本地模拟 OKX 服务, 用真实的 CCXTStore / OKXKlineSocket / OKXBroker 连接它
+统计K线吞吐量、K线推送到策略 next 的延迟、REST 请求延迟和订单从提交到成交的耗时
+
+python -m benchmarks.load_test
+python -m benchmarks.load_test --bars 5000 --candle-rate 2000 --orders 200 --latency 0.02 --jitter 0.01
+"""
+import argparse
+import json
+import threading
+import time
+
+import backtrader as bt
+import numpy as np
+import websocket
+from loguru import logger
+
+from benchmarks.mock_okx import MockOKXServer
+from broker.OKXBroker import OKXBroker
+from stores.CCXTStore import CCXTStore
+from utils import log
+
+SYMBOL = 'FIL-USDT'
+
+
+def percentiles(values):
+    """毫秒为单位的延迟分布"""
+    if not values:
+        return {}
+    ms = np.array(values) * 1000
+    return {
+        'count': len(ms),
+        'mean': float(ms.mean()),
+        'p50': float(np.percentile(ms, 50)),
+        'p90': float(np.percentile(ms, 90)),
+        'p99': float(np.percentile(ms, 99)),
+        'max': float(ms.max()),
+    }
+
+
+def _store(server, rate_limit):
+    store = CCXTStore(api_key='mock', api_secret='mock', password='mock', exchange_name='okx', symbol=SYMBOL,
+                      interval='1m', rest_url=server.rest_url, ws_url=server.ws_url)
+    store.exchange.enableRateLimit = rate_limit
+    return store
+
+
+class _CountBars(bt.Strategy):
+    """统计到达 next 的K线, 计算模拟服务推送到 next 的延迟"""
+    params = (
+        ('bars', 1000),
+        ('server', None),
+    )
+
+    def start(self):
+        self.count = 0
+        self.first = None
+        self.latencies = []
+
+    def next(self):
+        now = time.perf_counter()
+        if self.first is None:
+            self.first = now
+        self.count += 1
+        pushed = self.p.server.pushed.get(int(self.data.datetime.datetime(0).timestamp() * 1000))
+        if pushed is not None:
+            self.latencies.append(now - pushed)
+        if self.count >= self.p.bars:
+            self.elapsed = now - self.first
+            self.env.runstop()
+
+
+class _OrderLoop(bt.Strategy):
+    """每根K线最多一个挂单: 成交后下一根K线再以收盘价挂买单, 统计提交耗时和提交到成交的耗时"""
+    params = (
+        ('orders', 100),
+    )
+
+    def start(self):
+        self.submitted = None
+        self.submit_times = []
+        self.lifecycles = []
+
+    def next(self):
+        if self.submitted is not None:
+            return
+        if len(self.lifecycles) >= self.p.orders:
+            self.env.runstop()
+            return
+        self.submitted = time.perf_counter()
+        self.buy(size=1, price=self.data.close[0], exectype=bt.Order.Limit)
+        self.submit_times.append(time.perf_counter() - self.submitted)
+
+    def notify_order(self, order):
+        if order.status in [bt.Order.Completed, bt.Order.Canceled, bt.Order.Rejected] and self.submitted:
+            if order.status == bt.Order.Completed:
+                self.lifecycles.append(time.perf_counter() - self.submitted)
+            self.submitted = None
+
+
+def rest_history(server, bars, rate_limit):
+    """REST 拉取历史K线: 每批 100 根"""
+    store = _store(server, rate_limit)
+    to_ = int(time.time() * 1000)
+    from_ = to_ - store._interval_to_milliseconds('1m') * bars
+    start = time.perf_counter()
+    store.fetch_data(from_, to_, limit=100)
+    elapsed = time.perf_counter() - start
+    return {'candles': len(store.ohlcv), 'seconds': elapsed, 'candles_per_sec': len(store.ohlcv) / elapsed}
+
+
+def candle_stream(server, bars, rate_limit):
+    """candle 频道 -> OKXKlineSocket -> CCXTStore._load -> 策略 next"""
+    store = _store(server, rate_limit)
+    cerebro = bt.Cerebro(stdstats=False)
+    cerebro.adddata(store)
+    cerebro.addstrategy(_CountBars, bars=bars, server=server)
+    strategy = cerebro.run()[0]
+    store.wsc.close()
+    return {
+        'candles': strategy.count,
+        'seconds': strategy.elapsed,
+        'candles_per_sec': (strategy.count - 1) / strategy.elapsed if strategy.elapsed else None,
+        'push_to_next_ms': percentiles(strategy.latencies),
+    }
+
+
+class _OrderPushes:
+    """订阅 private 端点 orders 频道, 记录每个订单各状态首次推送的时间"""
+
+    def __init__(self, server):
+        self.times = {}
+        self._ready = threading.Event()
+        self.ws = websocket.WebSocketApp(f"{server.ws_url}/private", on_open=self._on_open,
+                                         on_message=self._on_message)
+        threading.Thread(target=self.ws.run_forever, daemon=True).start()
+        self._ready.wait(5)
+
+    def _on_open(self, ws):
+        ws.send(json.dumps({'op': 'login', 'args': [{'apiKey': 'mock', 'passphrase': 'mock', 'timestamp': '0',
+                                                     'sign': 'mock'}]}))
+        ws.send(json.dumps({'op': 'subscribe', 'args': [{'channel': 'orders', 'instType': 'ANY'}]}))
+
+    def _on_message(self, ws, message):
+        now = time.perf_counter()
+        message = json.loads(message)
+        if message.get('event') == 'subscribe':
+            self._ready.set()
+        for order in message.get('data', []):
+            self.times.setdefault((order['ordId'], order['state']), now)
+
+    def close(self):
+        self.ws.close()
+
+
+def order_requests(server, orders, rate_limit):
+    """
+    REST 下单/查单/撤单各自的往返时间, 以及下单到 orders 频道推送 live 的时间
+    订单挂在盘口之外, 测试期间不会成交
+    """
+    store = _store(server, rate_limit)
+    pushes = _OrderPushes(server)
+    fill_delay, server.fill_delay = server.fill_delay, None
+    price = store.wsc.get_ohlcv()[4] * 0.97
+    store.wsc.close()
+
+    create, fetch, cancel, pushed = [], [], [], []
+    starts = {}
+    try:
+        for _ in range(orders):
+            start = time.perf_counter()
+            order = store.create_order(SYMBOL, 'buy', 'limit', 1, round(price, 3))
+            create.append(time.perf_counter() - start)
+            starts[order['id']] = start
+
+            start = time.perf_counter()
+            store.fetch_order(order['id'], SYMBOL)
+            fetch.append(time.perf_counter() - start)
+
+            start = time.perf_counter()
+            store.cancel_order(order['id'], SYMBOL)
+            cancel.append(time.perf_counter() - start)
+
+        for ordId, start in starts.items():
+            live = pushes.times.get((ordId, 'live'))
+            if live is not None:
+                pushed.append(live - start)
+    finally:
+        server.fill_delay = fill_delay
+        pushes.close()
+
+    return {
+        'create_ms': percentiles(create),
+        'fetch_ms': percentiles(fetch),
+        'cancel_ms': percentiles(cancel),
+        'create_to_push_ms': percentiles(pushed),
+    }
+
+
+def order_lifecycle(server, orders, rate_limit):
+    """
+    通过 cerebro + OKXBroker 下单: 提交耗时包含限价、持仓查询和下单请求
+    成交由 OKXBroker.next 在下一根K线轮询发现, 耗时受K线推送频率影响
+    """
+    store = _store(server, rate_limit)
+    cerebro = bt.Cerebro(stdstats=False)
+    cerebro.adddata(store)
+    cerebro.setbroker(OKXBroker(store=store, cash=1e9, symbol=SYMBOL, type=OKXBroker.SPOT))
+    cerebro.addstrategy(_OrderLoop, orders=orders)
+    strategy = cerebro.run()[0]
+    store.wsc.close()
+    return {
+        'submit_ms': percentiles(strategy.submit_times),
+        'submit_to_complete_ms': percentiles(strategy.lifecycles),
+    }
+
+
+def _print(name, result, indent=''):
+    if isinstance(result, dict) and 'p50' in result:
+        print(f"{indent}{name:<24} n={result['count']:<6} mean={result['mean']:8.2f} p50={result['p50']:8.2f} "
+              f"p90={result['p90']:8.2f} p99={result['p99']:8.2f} max={result['max']:8.2f} ms")
+    elif isinstance(result, dict):
+        print(f"{indent}{name}")
+        for key, value in result.items():
+            _print(key, value, indent + '  ')
+    elif isinstance(result, float):
+        print(f"{indent}{name:<24} {result:.2f}")
+    else:
+        print(f"{indent}{name:<24} {result}")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--bars', type=int, default=2000, help='candle 频道测试的K线数量')
+    parser.add_argument('--history', type=int, default=5000, help='REST 拉取的历史K线数量')
+    parser.add_argument('--orders', type=int, default=100)
+    parser.add_argument('--candle-rate', type=float, default=1000, help='吞吐量测试时每秒推送的K线数量, 超过处理能力时推送到 next 的延迟会持续增大')
+    parser.add_argument('--order-candle-rate', type=float, default=20, help='订单测试时每秒推送的K线数量')
+    parser.add_argument('--latency', type=float, default=0.0, help='REST 固定延迟(秒)')
+    parser.add_argument('--jitter', type=float, default=0.0, help='REST 随机附加延迟上限(秒)')
+    parser.add_argument('--fill-delay', type=float, default=0.0, help='限价单成交延迟(秒)')
+    parser.add_argument('--rate-limit', action='store_true', help='开启 ccxt 内置限速(实盘默认开启)')
+    parser.add_argument('--json', help='结果另存为 json')
+    args = parser.parse_args()
+    logger.remove()
+    log.set_level(None)
+
+    server = MockOKXServer(latency=args.latency, jitter=args.jitter, candle_rate=args.candle_rate,
+                           fill_delay=args.fill_delay).start()
+    results = {'config': vars(args)}
+    try:
+        results['rest_history'] = rest_history(server, args.history, args.rate_limit)
+        results['candle_stream'] = candle_stream(server, args.bars, args.rate_limit)
+        results['order_requests'] = order_requests(server, args.orders, args.rate_limit)
+        server.candle_rate = args.order_candle_rate
+        results['order_lifecycle'] = order_lifecycle(server, args.orders, args.rate_limit)
+    finally:
+        server.stop()
+
+    for name in ('rest_history', 'candle_stream', 'order_requests', 'order_lifecycle'):
+        _print(name, results[name])
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
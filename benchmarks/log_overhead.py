@@ -0,0 +1,94 @@
+"""
+日志对回测每根K线的开销: SWAPStrategy 每根K线输出两条 INFO
+
+    python -m benchmarks.log_overhead                 # 默认 100 万根K线
+    python -m benchmarks.log_overhead --bars 50000
+
+场景:
+    none           没有任何日志输出, 作为基准
+    sync_info      INFO 级别, 同步写文件(loguru 默认方式)
+    enqueue_info   INFO 级别, 后台线程写文件(utils.log.QueueSink)
+    eager_warning  WARNING 级别, 日志调用前不判断级别, 被过滤的消息仍然格式化(改动前的写法)
+    lazy_warning   WARNING 级别, 先用 utils.log.enabled 判断, 被过滤时不格式化
+"""
+import argparse
+import json
+import os
+import tempfile
+import time
+
+import backtrader as bt
+from loguru import logger
+
+from benchmarks.data import SyntheticFeed
+from strategy.swap_rsi import SWAPStrategy
+from utils import log
+
+
+class _EagerSWAP(SWAPStrategy):
+    """改动前的 next: 无论级别都先格式化"""
+
+    def next(self):
+        current_close = self.data.close[0]
+        current_time = self.datas[0].datetime.datetime(0)
+        data = self.datas[0]
+        logger.info(
+            f"{data.datetime.datetime()}, Open: {data.open[0]}, High: {data.high[0]}, Low: {data.low[0]}, Close: {data.close[0]}, Volume: {data.volume[0]:.2f}",
+        )
+        logger.info(f"{current_time} {current_close} RSI:{self.rsi[0]:2f} EMA:{self.ema[0]}")
+
+
+def _run(strategy, bars):
+    cerebro = bt.Cerebro(stdstats=False)
+    cerebro.adddata(SyntheticFeed(bars=bars))
+    cerebro.addstrategy(strategy)
+    start = time.perf_counter()
+    cerebro.run()
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--bars', type=int, default=1000000)
+    parser.add_argument('--repeat', type=int, default=1, help='每个场景运行次数, 取最快的一次')
+    parser.add_argument('--json', help='结果另存为 json')
+    args = parser.parse_args()
+
+    path = os.path.join(tempfile.mkdtemp(), 'bench.log')
+    scenarios = {
+        'none': (SWAPStrategy, None, None),
+        'sync_info': (SWAPStrategy, 'INFO', False),
+        'enqueue_info': (SWAPStrategy, 'INFO', True),
+        'eager_warning': (_EagerSWAP, 'WARNING', False),
+        'lazy_warning': (SWAPStrategy, 'WARNING', False),
+    }
+    results = {}
+    for name, (strategy, level, enqueue) in scenarios.items():
+        best = drain = None
+        for _ in range(args.repeat):
+            logger.remove()
+            if level is not None:
+                logger.add(log.QueueSink(path) if enqueue else path, level=level)
+            log.set_level(level)
+            elapsed = _run(strategy, args.bars)
+            start = time.perf_counter()
+            logger.remove()  # QueueSink.stop 等待后台线程写完
+            if best is None or elapsed < best:
+                best, drain = elapsed, time.perf_counter() - start
+        results[name] = {'seconds': best, 'drain_seconds': drain, 'us_per_bar': best / args.bars * 1e6}
+    logger.remove()
+    log.set_level(None)
+
+    base = results['none']['us_per_bar']
+    print(f"{'scenario':<16}{'seconds':>10}{'us/bar':>10}{'overhead':>10}{'drain':>10}")
+    for name, result in results.items():
+        result['overhead_us_per_bar'] = result['us_per_bar'] - base
+        print(f"{name:<16}{result['seconds']:>10.2f}{result['us_per_bar']:>10.2f}"
+              f"{result['overhead_us_per_bar']:>10.2f}{result['drain_seconds']:>10.2f}")
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump({'bars': args.bars, 'results': results}, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,514 @@
+"""
+本地模拟 OKX 服务, 用于实盘链路(CCXTStore / OKXKlineSocket / OKXBroker)的压力测试
+
+REST: 交易对、K线、服务器时间、限价、持仓、下单/查单/撤单(含批量)、设置杠杆
+websocket: business 端点的 candle 频道, private 端点的 orders / account / positions 频道(登录不校验签名)
+账户: 初始只有 balance USDT, 成交时按现货(计价币/基础币)或合约(逐仓保证金、已实现盈亏)更新余额
+
+python -m benchmarks.mock_okx --port 8080 --candle-rate 10 --latency 0.02
+"""
+import argparse
+import asyncio
+import itertools
+import json
+import math
+import random
+import threading
+import time
+
+from aiohttp import web, WSMsgType
+from loguru import logger
+
+INSTRUMENTS = {
+    'SPOT': [{
+        'instType': 'SPOT', 'instId': 'FIL-USDT', 'baseCcy': 'FIL', 'quoteCcy': 'USDT', 'settleCcy': '',
+        'tickSz': '0.001', 'lotSz': '0.0001', 'minSz': '0.1', 'lever': '5', 'maxMktSz': '1000000',
+        'state': 'live', 'listTime': '1597026383085',
+    }],
+    'SWAP': [{
+        'instType': 'SWAP', 'instId': 'FIL-USDT-SWAP', 'uly': 'FIL-USDT', 'instFamily': 'FIL-USDT',
+        'baseCcy': '', 'quoteCcy': '', 'settleCcy': 'USDT', 'ctVal': '0.1', 'ctValCcy': 'FIL', 'ctType': 'linear',
+        'tickSz': '0.001', 'lotSz': '1', 'minSz': '1', 'lever': '75', 'state': 'live', 'listTime': '1597026383085',
+    }],
+}
+
+INTERVALS = {'s': 1000, 'm': 60 * 1000, 'H': 3600 * 1000, 'D': 86400 * 1000}
+
+
+def _bar_ms(bar):
+    return int(bar[:-1]) * INTERVALS[bar[-1]]
+
+
+def candle(ts, interval_ms, price=5.0):
+    """由时间戳确定的K线, 同一个 ts 每次请求结果相同"""
+    rng = random.Random(ts)
+    open_ = price * (1 + 0.05 * math.sin(ts / (interval_ms * 240))) * (1 + rng.gauss(0, 0.002))
+    close = open_ * (1 + rng.gauss(0, 0.002))
+    high = max(open_, close) * (1 + abs(rng.gauss(0, 0.001)))
+    low = min(open_, close) * (1 - abs(rng.gauss(0, 0.001)))
+    volume = rng.uniform(100, 1000)
+    return [ts, round(open_, 3), round(high, 3), round(low, 3), round(close, 3), round(volume, 4)]
+
+
+def _candle_data(row, confirm='1'):
+    ts, open_, high, low, close, volume = row
+    return [str(ts), str(open_), str(high), str(low), str(close), str(volume), str(volume),
+            str(round(volume * close, 4)), confirm]
+
+
+class MockOKXServer:
+    def __init__(self, host='127.0.0.1', port=0, latency=0.0, jitter=0.0, candle_rate=1.0, candle_updates=1,
+                 fill_delay=0.0, balance=10000.0):
+        """
+        :param latency: REST 响应固定延迟(秒)
+        :param jitter: REST 响应随机附加延迟上限(秒)
+        :param candle_rate: candle 频道每秒推送多少根已完成K线, 模拟时钟按K线周期前进
+        :param candle_updates: 每根K线推送的次数, 前 candle_updates-1 次为未完成(confirm=0)
+        :param fill_delay: 限价单挂出多少秒后按委托价全部成交, None 表示永不成交
+        :param balance: 初始 USDT 余额
+        """
+        self.host = host
+        self.port = port
+        self.latency = latency
+        self.jitter = jitter
+        self.candle_rate = candle_rate
+        self.candle_updates = candle_updates
+        self.fill_delay = fill_delay
+
+        self.orders = {}
+        self.positions = {}
+        self.balances = {'USDT': float(balance)}
+        self.pushed = {}  # K线 ts -> 推送时间(perf_counter), 用于计算端到端延迟
+        self._ids = itertools.count(1)
+        self._sockets = set()
+        self._order_sockets = set()
+        self._account_sockets = set()
+        self._position_sockets = set()
+        self._loop = None
+        self._runner = None
+        self._started = threading.Event()
+        self._thread = None
+
+    @property
+    def rest_url(self):
+        return f"http://{self.host}:{self.port}"
+
+    @property
+    def ws_url(self):
+        return f"ws://{self.host}:{self.port}/ws/v5"
+
+    # ---------------- 生命周期 ----------------
+
+    def _app(self):
+        app = web.Application()
+        app.add_routes([
+            web.get('/api/v5/public/instruments', self.instruments),
+            web.get('/api/v5/asset/currencies', self.currencies),
+            web.get('/api/v5/public/time', self.server_time),
+            web.get('/api/v5/market/candles', self.candles),
+            web.get('/api/v5/market/history-candles', self.candles),
+            web.get('/api/v5/public/price-limit', self.price_limit),
+            web.get('/api/v5/account/positions', self.account_positions),
+            web.post('/api/v5/account/set-leverage', self.set_leverage),
+            web.get('/api/v5/trade/order', self.get_order),
+            web.post('/api/v5/trade/order', self.place_order),
+            web.post('/api/v5/trade/batch-orders', self.place_orders),
+            web.post('/api/v5/trade/cancel-order', self.cancel_order),
+            web.post('/api/v5/trade/cancel-batch-orders', self.cancel_orders),
+            web.get('/ws/v5/business', self.business_socket),
+            web.get('/ws/v5/public', self.business_socket),
+            web.get('/ws/v5/private', self.private_socket),
+        ])
+        return app
+
+    def start(self):
+        """在后台线程中启动服务, 返回时已开始监听"""
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+        self._started.wait()
+        logger.info(f"Mock OKX server listening on {self.rest_url}")
+        return self
+
+    def _run(self):
+        self._loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self._loop)
+        self._runner = web.AppRunner(self._app())
+        self._loop.run_until_complete(self._runner.setup())
+        site = web.TCPSite(self._runner, self.host, self.port)
+        self._loop.run_until_complete(site.start())
+        self.port = site._server.sockets[0].getsockname()[1]
+        self._started.set()
+        self._loop.run_forever()
+
+    def stop(self):
+        if self._loop is None:
+            return
+        asyncio.run_coroutine_threadsafe(self._shutdown(), self._loop).result()
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join()
+
+    async def _shutdown(self):
+        # 先关闭 websocket, 否则 cleanup 会等待连接超时
+        for ws in list(self._sockets):
+            await ws.close()
+        await self._runner.cleanup()
+
+    # ---------------- 公共 ----------------
+
+    async def _reply(self, data, code='0', msg=''):
+        delay = self.latency + (random.uniform(0, self.jitter) if self.jitter else 0)
+        if delay:
+            await asyncio.sleep(delay)
+        return web.json_response({'code': code, 'msg': msg, 'data': data})
+
+    @staticmethod
+    def _now():
+        return int(time.time() * 1000)
+
+    def _price(self, inst_id):
+        interval_ms = 60 * 1000
+        now = self._now()
+        return candle(now - now % interval_ms, interval_ms)[4]
+
+    async def instruments(self, request):
+        return await self._reply(INSTRUMENTS.get(request.query.get('instType'), []))
+
+    async def currencies(self, request):
+        return await self._reply([])
+
+    async def server_time(self, request):
+        return await self._reply([{'ts': str(self._now())}])
+
+    async def candles(self, request):
+        interval_ms = _bar_ms(request.query.get('bar', '1m'))
+        limit = min(int(request.query.get('limit', 100)), 300)
+        now = self._now()
+        end = int(request.query.get('after', now))  # 返回 ts < after
+        end = min(end, now - now % interval_ms)  # 只返回已完成的K线
+        begin = int(request.query.get('before', 0))  # 返回 ts > before
+        ts = (end - 1) - (end - 1) % interval_ms
+        data = []
+        while ts > begin and len(data) < limit:
+            data.append(_candle_data(candle(ts, interval_ms)))  # 新的在前
+            ts -= interval_ms
+        return await self._reply(data)
+
+    async def price_limit(self, request):
+        inst_id = request.query.get('instId')
+        price = self._price(inst_id)
+        return await self._reply([{
+            'instType': 'SWAP' if inst_id.endswith('SWAP') else 'SPOT', 'instId': inst_id,
+            'buyLmt': str(round(price * 1.05, 3)), 'sellLmt': str(round(price * 0.95, 3)), 'ts': str(self._now()),
+        }])
+
+    # ---------------- 账户 ----------------
+
+    async def account_positions(self, request):
+        data = []
+        for inst_id in request.query.get('instId', '').split(','):
+            if inst_id:
+                data.append(self._position(inst_id))
+        return await self._reply(data)
+
+    def _position(self, inst_id):
+        pos, avg = self.positions.get(inst_id, (0.0, 0.0))
+        return {
+            'instType': 'SWAP' if inst_id.endswith('SWAP') else 'MARGIN', 'instId': inst_id, 'mgnMode': 'isolated',
+            'posSide': 'net', 'pos': str(pos) if pos else '', 'avgPx': str(avg) if pos else '', 'lever': '3',
+            'posCcy': '', 'ccy': 'USDT', 'upl': '0', 'uplRatio': '0', 'liqPx': '', 'markPx': str(self._price(inst_id)),
+            'margin': '', 'imr': '', 'mmr': '', 'notionalUsd': '', 'cTime': str(self._now()), 'uTime': str(self._now()),
+        }
+
+    @staticmethod
+    def _ct_val(inst_id):
+        return float(INSTRUMENTS['SWAP'][0]['ctVal']) if inst_id.endswith('SWAP') else 1.0
+
+    def _settle(self, inst_id, pos, avg, signed, price, fee):
+        """成交后的余额变化: 现货交换计价币和基础币, 合约只计已实现盈亏, 手续费从 USDT 扣除"""
+        self.balances['USDT'] += fee
+        if not inst_id.endswith('SWAP'):
+            base = inst_id.split('-')[0]
+            self.balances[base] = self.balances.get(base, 0.0) + signed
+            self.balances['USDT'] -= signed * price
+            return
+        if pos and (pos > 0) != (signed > 0):
+            closed = min(abs(signed), abs(pos)) * (1 if pos > 0 else -1)
+            self.balances['USDT'] += closed * (price - avg) * self._ct_val(inst_id)
+
+    def _frozen(self):
+        """挂单冻结: 现货买单冻结计价币、卖单冻结基础币, 合约冻结保证金"""
+        frozen = {}
+        for order in self.orders.values():
+            if order['state'] != 'live':
+                continue
+            size, price, inst_id = float(order['sz']), float(order['px']), order['instId']
+            if inst_id.endswith('SWAP'):
+                ccy, amount = 'USDT', size * price * self._ct_val(inst_id) / 3
+            elif order['side'] == 'buy':
+                ccy, amount = 'USDT', size * price
+            else:
+                ccy, amount = inst_id.split('-')[0], size
+            frozen[ccy] = frozen.get(ccy, 0.0) + amount
+        return frozen
+
+    def _account_data(self):
+        frozen = self._frozen()
+        margin = upl = 0.0
+        for inst_id, (pos, avg) in self.positions.items():
+            if pos and inst_id.endswith('SWAP'):
+                margin += abs(pos) * avg * self._ct_val(inst_id) / 3
+                upl += pos * (self._price(inst_id) - avg) * self._ct_val(inst_id)
+        details = []
+        total = 0.0
+        for ccy, cash in self.balances.items():
+            held = frozen.get(ccy, 0.0)
+            if ccy == 'USDT':
+                equity = cash + upl
+                available = cash - held - margin
+                usd = equity
+            else:
+                equity, available = cash, cash - held
+                usd = cash * self._price(f"{ccy}-USDT")
+            total += usd
+            details.append({'ccy': ccy, 'cashBal': str(cash), 'eq': str(equity), 'availBal': str(available),
+                            'availEq': str(available), 'frozenBal': str(held + (margin if ccy == 'USDT' else 0.0)),
+                            'ordFrozen': str(held), 'upl': str(upl if ccy == 'USDT' else 0.0), 'eqUsd': str(usd),
+                            'uTime': str(self._now())})
+        return {'totalEq': str(total), 'imr': '', 'mmr': '', 'uTime': str(self._now()), 'details': details}
+
+    def _positions_data(self):
+        data = []
+        for inst_id, (pos, avg) in self.positions.items():
+            position = self._position(inst_id)
+            if pos and inst_id.endswith('SWAP'):
+                mark = self._price(inst_id)
+                position.update({'margin': str(abs(pos) * avg * self._ct_val(inst_id) / 3),
+                                 'upl': str(pos * (mark - avg) * self._ct_val(inst_id))})
+            data.append(position)
+        return data
+
+    def _push_account(self):
+        """account / positions 频道: 余额或持仓变化时推送"""
+        self._push(self._account_sockets, {'channel': 'account', 'uid': 'mock'}, [self._account_data()])
+        self._push(self._position_sockets, {'channel': 'positions', 'instType': 'ANY', 'uid': 'mock'},
+                   self._positions_data())
+
+    @staticmethod
+    def _push(sockets, arg, data):
+        message = json.dumps({'arg': arg, 'data': data})
+        for ws in list(sockets):
+            if not ws.closed:
+                asyncio.ensure_future(ws.send_str(message))
+
+    async def set_leverage(self, request):
+        body = await request.json()
+        return await self._reply([{'instId': body.get('instId'), 'lever': str(body.get('lever')),
+                                   'mgnMode': body.get('mgnMode'), 'posSide': ''}])
+
+    # ---------------- 订单 ----------------
+
+    def _create(self, body):
+        """创建订单, 返回 (sCode, sMsg, 订单)"""
+        inst_id = body.get('instId')
+        size = float(body.get('sz') or 0)
+        price = float(body.get('px') or 0) or self._price(inst_id)
+        if inst_id not in {i['instId'] for v in INSTRUMENTS.values() for i in v}:
+            return '51001', 'Instrument ID does not exist', None
+        if size <= 0:
+            return '51008', 'Order failed. Insufficient balance', None
+        market = self._price(inst_id)
+        if not market * 0.95 <= price <= market * 1.05:
+            return '51006', 'Order price is not within the price limit', None
+
+        now = self._now()
+        order = {
+            'instType': 'SWAP' if inst_id.endswith('SWAP') else 'SPOT', 'instId': inst_id,
+            'ordId': str(next(self._ids)), 'clOrdId': body.get('clOrdId', ''), 'tag': body.get('tag', ''),
+            'px': str(price), 'sz': str(size), 'ordType': body.get('ordType', 'limit'), 'side': body.get('side'),
+            'posSide': 'net', 'tdMode': body.get('tdMode', 'cash'), 'accFillSz': '0', 'fillPx': '', 'fillSz': '0',
+            'avgPx': '', 'state': 'live', 'lever': '', 'fee': '0', 'feeCcy': 'USDT', 'rebate': '0',
+            'reduceOnly': str(body.get('reduceOnly', 'false')).lower(), 'cTime': str(now), 'uTime': str(now),
+        }
+        self.orders[order['ordId']] = order
+        self._push_order(order)
+        self._push_account()
+        if self.fill_delay is not None:
+            self._loop.call_later(self.fill_delay, self._fill, order)
+        return '0', '', order
+
+    def _fill(self, order):
+        if order['state'] != 'live':
+            return
+        size, price = float(order['sz']), float(order['px'])
+        order.update({
+            'state': 'filled', 'accFillSz': order['sz'], 'fillSz': order['sz'], 'fillPx': order['px'],
+            'avgPx': order['px'], 'fee': str(-round(size * price * 0.001, 8)), 'uTime': str(self._now()),
+        })
+        pos, avg = self.positions.get(order['instId'], (0.0, 0.0))
+        signed = size if order['side'] == 'buy' else -size
+        self._settle(order['instId'], pos, avg, signed, price, float(order['fee']))
+        if pos + signed == 0:
+            self.positions[order['instId']] = (0.0, 0.0)
+        elif pos == 0 or (pos > 0) == (signed > 0):
+            self.positions[order['instId']] = (pos + signed, (pos * avg + signed * price) / (pos + signed))
+        else:
+            self.positions[order['instId']] = (pos + signed, avg)
+        self._push_order(order)
+        self._push_account()
+
+    def _cancel(self, body):
+        order = self.orders.get(body.get('ordId'))
+        if order is None:
+            return '51603', 'Order does not exist', {'ordId': body.get('ordId')}
+        if order['state'] != 'live':
+            return '51402', 'Order has been completed', order
+        order.update({'state': 'canceled', 'uTime': str(self._now())})
+        self._push_order(order)
+        self._push_account()
+        return '0', '', order
+
+    @staticmethod
+    def _ack(code, msg, order):
+        order = order or {}
+        return {'ordId': order.get('ordId', ''), 'clOrdId': order.get('clOrdId', ''), 'tag': order.get('tag', ''),
+                'sCode': code, 'sMsg': msg}
+
+    @staticmethod
+    def _batch_code(acks):
+        failed = sum(ack['sCode'] != '0' for ack in acks)
+        if failed == 0:
+            return '0', ''
+        if failed == len(acks):
+            return '1', 'All operations failed'
+        return '2', 'Bulk operation partially succeeded'
+
+    async def place_order(self, request):
+        ack = self._ack(*self._create(await request.json()))
+        return await self._reply([ack], *self._batch_code([ack]))
+
+    async def place_orders(self, request):
+        acks = [self._ack(*self._create(body)) for body in await request.json()]
+        return await self._reply(acks, *self._batch_code(acks))
+
+    async def cancel_order(self, request):
+        ack = self._ack(*self._cancel(await request.json()))
+        return await self._reply([ack], *self._batch_code([ack]))
+
+    async def cancel_orders(self, request):
+        acks = [self._ack(*self._cancel(body)) for body in await request.json()]
+        return await self._reply(acks, *self._batch_code(acks))
+
+    async def get_order(self, request):
+        order = self.orders.get(request.query.get('ordId'))
+        if order is None:
+            return await self._reply([], '51603', 'Order does not exist')
+        return await self._reply([dict(order)])
+
+    # ---------------- websocket ----------------
+
+    async def _socket(self, request):
+        ws = web.WebSocketResponse()
+        await ws.prepare(request)
+        self._sockets.add(ws)
+        return ws
+
+    async def business_socket(self, request):
+        ws = await self._socket(request)
+        tasks = []
+        try:
+            async for msg in ws:
+                if msg.type != WSMsgType.TEXT:
+                    continue
+                if msg.data == 'ping':
+                    await ws.send_str('pong')
+                    continue
+                message = json.loads(msg.data)
+                for arg in message.get('args', []):
+                    if message.get('op') == 'subscribe':
+                        await ws.send_json({'event': 'subscribe', 'arg': arg, 'connId': 'mock'})
+                        if arg.get('channel', '').startswith('candle'):
+                            tasks.append(asyncio.ensure_future(self._push_candles(ws, arg)))
+                    elif message.get('op') == 'unsubscribe':
+                        await ws.send_json({'event': 'unsubscribe', 'arg': arg, 'connId': 'mock'})
+        finally:
+            self._sockets.discard(ws)
+            for task in tasks:
+                task.cancel()
+        return ws
+
+    async def _push_candles(self, ws, arg):
+        """按模拟时钟推送K线, 每根K线的间隔为 1/candle_rate 秒, 与K线周期无关"""
+        interval_ms = _bar_ms(arg['channel'][len('candle'):])
+        now = self._now()
+        ts = now - now % interval_ms
+        period = 1.0 / self.candle_rate
+        updates = max(self.candle_updates, 1)
+        next_push = time.perf_counter()
+        while not ws.closed:
+            row = candle(ts, interval_ms)
+            for i in range(updates):
+                next_push += period / updates
+                delay = next_push - time.perf_counter()
+                if delay > 0:
+                    await asyncio.sleep(delay)
+                confirm = '1' if i == updates - 1 else '0'
+                if confirm == '1':
+                    self.pushed[ts] = time.perf_counter()
+                await ws.send_str(json.dumps({'arg': arg, 'data': [_candle_data(row, confirm)]}))
+            ts += interval_ms
+
+    async def private_socket(self, request):
+        ws = await self._socket(request)
+        try:
+            async for msg in ws:
+                if msg.type != WSMsgType.TEXT:
+                    continue
+                if msg.data == 'ping':
+                    await ws.send_str('pong')
+                    continue
+                message = json.loads(msg.data)
+                if message.get('op') == 'login':
+                    await ws.send_json({'event': 'login', 'code': '0', 'msg': '', 'connId': 'mock'})
+                elif message.get('op') == 'subscribe':
+                    for arg in message.get('args', []):
+                        await ws.send_json({'event': 'subscribe', 'arg': arg, 'connId': 'mock'})
+                        channel = arg.get('channel')
+                        if channel == 'orders':
+                            self._order_sockets.add(ws)
+                        elif channel == 'account':
+                            self._account_sockets.add(ws)
+                            await ws.send_json({'arg': arg, 'data': [self._account_data()]})  # 快照
+                        elif channel == 'positions':
+                            self._position_sockets.add(ws)
+                            await ws.send_json({'arg': arg, 'data': self._positions_data()})
+        finally:
+            self._sockets.discard(ws)
+            self._order_sockets.discard(ws)
+            self._account_sockets.discard(ws)
+            self._position_sockets.discard(ws)
+        return ws
+
+    def _push_order(self, order):
+        """orders 频道: 订单状态每次变化时推送"""
+        self._push(self._order_sockets, {'channel': 'orders', 'instType': 'ANY', 'uid': 'mock'}, [dict(order)])
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='本地模拟 OKX 服务')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8080)
+    parser.add_argument('--latency', type=float, default=0.0, help='REST 固定延迟(秒)')
+    parser.add_argument('--jitter', type=float, default=0.0, help='REST 随机附加延迟上限(秒)')
+    parser.add_argument('--candle-rate', type=float, default=1.0, help='每秒推送的K线数量')
+    parser.add_argument('--candle-updates', type=int, default=1, help='每根K线推送次数')
+    parser.add_argument('--fill-delay', type=float, default=0.0, help='限价单成交延迟(秒), 负数表示不成交')
+    parser.add_argument('--balance', type=float, default=10000.0, help='初始 USDT 余额')
+    args = parser.parse_args()
+
+    server = MockOKXServer(args.host, args.port, args.latency, args.jitter, args.candle_rate, args.candle_updates,
+                           None if args.fill_delay < 0 else args.fill_delay, args.balance).start()
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        server.stop()
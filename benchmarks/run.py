@@ -0,0 +1,138 @@
+"""
+运行基准测试并保存结果, 与基线对比发现性能回退
+
+python -m benchmarks.run                          # 全部用例, 数据集 1m_30d
+python -m benchmarks.run -b backtest_rsi_reversal -d small
+python -m benchmarks.run --baseline benchmarks/results/xxx.json --threshold 0.1
+
+结果保存在 benchmarks/results/<时间>_<commit>.json, 未指定 --baseline 时与上一次结果对比
+"""
+import argparse
+import gc
+import glob
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+import tracemalloc
+from datetime import datetime
+
+from loguru import logger
+
+from benchmarks.suite import BENCHMARKS
+from utils import log
+from utils.dataset import load_dataset
+
+RESULTS_DIR = os.path.join(os.path.dirname(__file__), 'results')
+
+
+def _commit():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'], text=True,
+                                       stderr=subprocess.DEVNULL).strip()
+    except Exception:
+        return 'unknown'
+
+
+def measure(name, df, repeat, memory):
+    """计时取 repeat 次中最快的一次, 峰值内存单独跑一次(tracemalloc 会拖慢计时)"""
+    best = None
+    for _ in range(repeat):
+        fn, units = BENCHMARKS[name](df)
+        gc.collect()
+        start = time.perf_counter()
+        fn()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+
+    peak = None
+    if memory:
+        fn, units = BENCHMARKS[name](df)
+        gc.collect()
+        tracemalloc.start()
+        fn()
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+
+    return {
+        'units': units,
+        'seconds': best,
+        'units_per_sec': units / best,
+        'peak_mb': peak / 1024 / 1024 if peak is not None else None,
+    }
+
+
+def _latest_result():
+    files = sorted(glob.glob(os.path.join(RESULTS_DIR, '*.json')))
+    return files[-1] if files else None
+
+
+def compare(results, baseline, threshold):
+    """吞吐量下降超过 threshold 视为回退, 返回回退的用例"""
+    regressions = []
+    for name, result in results['benchmarks'].items():
+        base = baseline['benchmarks'].get(name)
+        if not base or base['units'] != result['units']:
+            continue
+        change = result['units_per_sec'] / base['units_per_sec'] - 1
+        flag = ''
+        if change < -threshold:
+            flag = ' REGRESSION'
+            regressions.append(name)
+        print(f"{name:<24} {base['units_per_sec']:>12.0f} -> {result['units_per_sec']:>12.0f} /s ({change:+.1%}){flag}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('-b', '--benchmark', action='append', choices=list(BENCHMARKS), help='只运行指定用例, 可重复')
+    parser.add_argument('-d', '--dataset', default='1m_30d', help='数据集名称或 csv 路径')
+    parser.add_argument('-r', '--repeat', type=int, default=3)
+    parser.add_argument('--no-memory', action='store_true', help='不统计峰值内存')
+    parser.add_argument('--baseline', help='对比的基线结果文件')
+    parser.add_argument('--threshold', type=float, default=0.1, help='吞吐量下降超过该比例视为回退')
+    parser.add_argument('--no-save', action='store_true')
+    args = parser.parse_args()
+    logger.remove()
+    log.set_level(None)
+
+    baseline_path = args.baseline or _latest_result()
+    df = load_dataset(args.dataset)
+    commit = _commit()
+    results = {
+        'commit': commit,
+        'time': datetime.now().isoformat(timespec='seconds'),
+        'dataset': args.dataset,
+        'python': platform.python_version(),
+        'machine': platform.machine(),
+        'benchmarks': {},
+    }
+
+    for name in args.benchmark or BENCHMARKS:
+        result = measure(name, df, args.repeat, not args.no_memory)
+        results['benchmarks'][name] = result
+        peak = f"{result['peak_mb']:.1f}MB" if result['peak_mb'] is not None else '-'
+        print(f"{name:<24} {result['units']:>8} {result['seconds']:>8.3f}s {result['units_per_sec']:>12.0f}/s peak {peak}")
+
+    if not args.no_save:
+        os.makedirs(RESULTS_DIR, exist_ok=True)
+        path = os.path.join(RESULTS_DIR, f"{datetime.now():%Y%m%d-%H%M%S}_{commit}.json")
+        with open(path, 'w') as f:
+            json.dump(results, f, indent=2)
+        print(f"save to {path}")
+
+    if baseline_path:
+        with open(baseline_path) as f:
+            baseline = json.load(f)
+        if baseline['dataset'] != args.dataset:
+            print(f"baseline {baseline_path} uses dataset {baseline['dataset']}, skip compare")
+            return
+        print(f"compare with {baseline_path} ({baseline['commit']})")
+        if compare(results, baseline, args.threshold):
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
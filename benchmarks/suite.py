@@ -0,0 +1,127 @@
+"""
+基准测试用例, 每个用例完成准备工作后返回 (待计时的函数, 处理的数量)
+"""
+import queue
+import threading
+import json
+
+import backtrader as bt
+
+from stores.CCXTStore import CCXTStore
+from stores.OKX_Data import OKXKlineSocket
+from strategy.MartingaleSimulator import param_grid, simulate
+from strategy.MartingaleStrategy import MartingaleLongStrategy
+from strategy.RSIReversal import RSIReversal
+from strategy.swap_rsi import SWAPStrategy
+
+MARKETS = {
+    'FIL/USDT': {'precision': {'price': 0.001, 'amount': 0.0001}},
+}
+
+
+class ReplayStore(CCXTStore):
+    """不连接交易所, 回放给定K线的 CCXTStore, 用于测试 _load"""
+    params = (
+        ('candles', None),
+        ('exchange_name', 'replay'),
+    )
+
+    def _connect(self):
+        self.exchange = None
+        self.markets = MARKETS
+
+    def start(self):
+        super(ReplayStore, self).start()
+        self.ohlcv = [list(candle) for candle in self.p.candles]
+
+    def _load(self):
+        if not self.ohlcv and self._history_idx >= len(self._history):
+            return False
+        return super(ReplayStore, self)._load()
+
+
+def _backtest(df, strategy, **kwargs):
+    cerebro = bt.Cerebro(stdstats=False)
+    cerebro.adddata(bt.feeds.PandasData(dataname=df))
+    cerebro.addstrategy(strategy, **kwargs)
+    cerebro.broker.set_cash(1000)
+    return cerebro.run, len(df)
+
+
+def backtest_rsi_reversal(df):
+    return _backtest(df, RSIReversal, boll_period=60, rsi_period=30, boll_dev=2.0, rsi_buy_signal=45,
+                     rsi_downward_period=3, stop_loss=0.05)
+
+
+def backtest_martingale(df):
+    return _backtest(df, MartingaleLongStrategy, rsi_period=14, take_profit=0.01)
+
+
+def backtest_swap(df):
+    return _backtest(df, SWAPStrategy)
+
+
+def simulate_martingale_grid(df):
+    # 单位为 K线数 * 参数组数, 与 backtest_martingale 的 K线/秒 直接可比
+    params = param_grid(factor=[1, 2, 3, 4], max_steps=[3, 5, 8], take_profit=[0.005, 0.01, 0.02],
+                        rsi_period=[14, 30, 60])
+    return (lambda: simulate(df, params, cash=1000)), len(df) * len(params['factor'])
+
+
+def simulate_martingale_grid_stats(df):
+    # 同 simulate_martingale_grid, 附加逐根K线的回撤、夏普等绩效统计
+    params = param_grid(factor=[1, 2, 3, 4], max_steps=[3, 5, 8], take_profit=[0.005, 0.01, 0.02],
+                        rsi_period=[14, 30, 60])
+    return (lambda: simulate(df, params, cash=1000, stats=True)), len(df) * len(params['factor'])
+
+
+def store_load_replay(df):
+    candles = [[dt.to_pydatetime(), *row] for dt, row in zip(df.index, df[['open', 'high', 'low', 'close', 'volume']].values.tolist())]
+    cerebro = bt.Cerebro(stdstats=False)
+    cerebro.adddata(ReplayStore(candles=candles))
+    cerebro.addstrategy(bt.Strategy)
+    return (lambda: cerebro.run(preload=False, runonce=False)), len(df)
+
+
+def okx_kline_parsing(df):
+    # 不建立连接, 只测试消息解析
+    socket = OKXKlineSocket.__new__(OKXKlineSocket)
+    socket.symbol = 'FIL-USDT'
+    socket.interval = '1m'
+    socket.interval_ms = 60 * 1000
+    socket.backfill = None
+    socket.ohlcv = queue.Queue()
+    socket._lock = threading.Lock()
+    messages = []
+    for dt, row in zip(df.index, df[['open', 'high', 'low', 'close', 'volume']].values.tolist()):
+        kline = [str(int(dt.timestamp() * 1000))] + [str(v) for v in row] + [str(row[4]), str(row[4] * row[3]), '1']
+        messages.append(json.dumps({'arg': {'channel': 'candle1m', 'instId': 'FIL-USDT'}, 'data': [kline]}))
+
+    def run():
+        socket.last_ts = None  # 每轮重新计时, 否则全部按重复推送丢弃
+        for message in messages:
+            socket._handle_message(message)
+            socket.ohlcv.get_nowait()
+    return run, len(messages)
+
+
+def handler_precision(df):
+    store = ReplayStore(candles=[])
+    values = [(row[0], row[1] * 100) for row in df[['close', 'volume']].values.tolist()]
+
+    def run():
+        for price, size in values:
+            store.handler_precision('FIL/USDT', price, size)
+    return run, len(values)
+
+
+BENCHMARKS = {
+    'backtest_rsi_reversal': backtest_rsi_reversal,
+    'backtest_martingale': backtest_martingale,
+    'backtest_swap': backtest_swap,
+    'simulate_martingale_grid': simulate_martingale_grid,
+    'simulate_martingale_grid_stats': simulate_martingale_grid_stats,
+    'store_load_replay': store_load_replay,
+    'okx_kline_parsing': okx_kline_parsing,
+    'handler_precision': handler_precision,
+}
@@ -1,29 +1,46 @@
 import backtrader as bt
 
+from .PositionLedger import fill_delta
+
 
 class CCXTOrder(bt.OrderBase):
-    def __init__(self, owner, data, ccxt_order, side, size, price, exectype):
+    def __init__(self, owner, data, ccxt_order, side, size, price, exectype, signal_price=None):
         self.owner = owner
         self.data = data
         self.ccxt_order = ccxt_order
-        self.executed_fills = []
+        self.executed_fills = []  # 每次 update 新增的成交 (带方向的数量, 价格, 手续费)
         self.ordtype = side
         self.size = size
         self.price = price
+        self.signal_price = price if signal_price is None else signal_price  # 策略给出的价格, 未加滑点和限价调整
         self.exectype = exectype
+        self.recorded_status = None  # 最近一次写入订单历史的状态
 
         super(CCXTOrder, self).__init__()
 
     def update(self, ccxt_order):
+        """
+        :return: 相对上次 update 新增的成交列表
+        """
+        filled, average, fee = self.executed.size, self.executed.price, self.executed.comm
         self.ccxt_order = ccxt_order
         self.executed.size = ccxt_order['filled']
         self.executed.price = (ccxt_order['average'] if 'average' in ccxt_order else ccxt_order['price'])
-        self.executed.comm = ccxt_order['fee']['cost']
+        self.executed.comm = (ccxt_order.get('fee') or {}).get('cost') or 0.0
         if ccxt_order['status'] == 'closed':
             self.status = bt.Order.Completed
         elif ccxt_order['status'] == 'canceled':
             self.status = bt.Order.Canceled
         elif ccxt_order['status'] == 'open':
-            self.status = bt.Order.Accepted
+            self.status = bt.Order.Partial if self.executed.size else bt.Order.Accepted
         else:
             self.status = bt.Order.Rejected
+
+        fills = []
+        fill = fill_delta(filled or 0.0, average or 0.0, fee or 0.0,
+                          self.executed.size or 0.0, self.executed.price or 0.0, self.executed.comm or 0.0)
+        if fill is not None:
+            size, price, commission = fill
+            fills.append((size if self.ordtype == bt.Order.Buy else -size, price, commission))
+            self.executed_fills.extend(fills)
+        return fills
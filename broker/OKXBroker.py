@@ -1,10 +1,13 @@
+import math
 import sys
+from concurrent.futures import ThreadPoolExecutor
 
 import backtrader as bt
 import collections
 from backtrader.position import Position
 from loguru import logger
 from .CCXTOrder import CCXTOrder
+from .PositionLedger import PositionLedger
 
 
 class OKXBroker(bt.BackBroker):
@@ -16,6 +19,12 @@ class OKXBroker(bt.BackBroker):
         ('slippage', 0.000),  # 滑点比例%
         ('stop_percent', 0),  # 止损百分比
         ('limit_percent', 0),  # 止盈百分比
+        ('journal', None),  # StateJournal, 保存资金和未完成订单用于崩溃后恢复
+        ('book_channel', None),  # books5 / books: 按订单簿深度计算限价, None 时使用固定滑点
+        ('book_max_age', 5),  # 订单簿超过多少秒未更新视为失效, 退回固定滑点
+        ('workers', 1),  # 每根K线并发查询订单状态的线程数
+        ('history', None),  # OrderHistory, 记录订单状态变化和成交用于订单分析
+        ('account_channel', False),  # 订阅 account / positions 频道, 资金和持仓以交易所推送的余额、持仓为上限
     )
 
     SWAP = 'SWAP'
@@ -39,6 +48,16 @@ class OKXBroker(bt.BackBroker):
             self.store.set_leverage(self._symbol(), self.p.leverage)
             self.contract_size = self.get_contract_size()
             logger.info(f"contract_size:{self.contract_size}")
+        self.ledger = PositionLedger()  # 按实际成交记账的持仓均价和盈亏
+        self._pool = None
+        if self.p.workers > 1:
+            self._pool = ThreadPoolExecutor(max_workers=self.p.workers)
+        self.book = None
+        if self.p.book_channel:
+            self.book = self.store.start_order_book(self._symbol(), self.p.book_channel)
+        self.account = None
+        if self.p.account_channel:
+            self.account = self.store.start_account(self.SWAP if self._is_swap() else 'ANY')
 
     def _symbol(self):
         if self.p.type == self.SWAP:
@@ -64,6 +83,79 @@ class OKXBroker(bt.BackBroker):
         self.notifs = collections.deque()
         # self.positions = collections.defaultdict(Position)
 
+    def start(self):
+        super(OKXBroker, self).start()
+        if self.p.journal is not None:
+            state = self.p.journal.get('broker')
+            if state:
+                self.set_state(state)
+
+    def get_state(self):
+        return {
+            'cash': self.cash,
+            'startingcash': self.startingcash,
+            'orders': [{
+                'id': order.ccxt_order['id'],
+                'side': order.ordtype,
+                'size': float(order.size),
+                'price': float(order.price),
+                'signal_price': float(order.signal_price) if order.signal_price is not None else None,
+                'exectype': order.exectype,
+                'filled': float(order.executed.size or 0.0),
+                'average': float(order.executed.price or 0.0),
+                'fee': float(order.executed.comm or 0.0),
+            } for order in self.orders],
+            'ledger': self.ledger.get_state(),
+        }
+
+    def set_state(self, state):
+        logger.info(f"Restore broker state: cash:{state['cash']} orders:{len(state['orders'])}")
+        self.cash = state['cash']
+        self.startingcash = state['startingcash']
+        self._value = self.cash
+        if 'ledger' in state:
+            self.ledger.set_state(state['ledger'])
+        self._recovered_orders = state['orders']
+
+    def reattach_orders(self, owner, data):
+        """
+        恢复未完成订单: 从交易所查询最新状态, 仍在挂单的继续跟踪, 期间已成交或撤销的直接通知并更新资金
+        由策略在 start 中调用, 订单需要关联 owner
+        """
+        for spec in getattr(self, '_recovered_orders', []):
+            ccxt_order = self.store.fetch_order(spec['id'], self._symbol())
+            if ccxt_order is None:
+                logger.error(f"Reattach order failed: {spec['id']}")
+                continue
+            order = CCXTOrder(owner, data, ccxt_order, spec['side'], spec['size'], spec['price'], spec['exectype'],
+                              spec.get('signal_price'))
+            # 崩溃前已记账的部分成交不重复计入
+            order.executed.size = spec.get('filled', 0.0)
+            order.executed.price = spec.get('average', 0.0)
+            order.executed.comm = spec.get('fee', 0.0)
+            self._add_fills(order, order.update(ccxt_order))
+            if order.alive():
+                self.orders.append(order)
+            else:
+                self._update_cash(order)
+            self.notify(order)
+            logger.info(f"Reattach order {spec['id']}: {order.getstatusname()}")
+        self._recovered_orders = []
+        self.checkpoint()
+
+    def _record(self, order, status=None):
+        """状态变化时写入订单历史"""
+        if self.p.history is None:
+            return
+        status = order.status if status is None else status
+        if status != order.recorded_status:
+            order.recorded_status = status
+            self.p.history.record_order(self._symbol(), order, status=status)
+
+    def checkpoint(self):
+        if self.p.journal is not None:
+            self.p.journal.append('broker', self.get_state())
+
     def get_notification(self):
         try:
             return self.notifs.popleft()
@@ -75,8 +167,19 @@ class OKXBroker(bt.BackBroker):
     def notify(self, order):
         self.notifs.append(order.clone())
 
+    def _currencies(self):
+        """(基础币, 计价币), 如 FIL-USDT -> (FIL, USDT)"""
+        base, quote = self.p.symbol.split('-')[:2]
+        return base, quote
+
+    def _synced(self):
+        return self.account is not None and self.account.ready
+
     def get_cash(self):
         '''Returns the current cash (alias: ``getcash``)'''
+        if self._synced():
+            # 交易所推送的计价币可用余额(已扣除挂单冻结和逐仓保证金), 不超过本策略按成交记账的资金 [broker] cash
+            return min(self.account.available(self._currencies()[1]), self.cash)
         return self.cash
 
     getcash = get_cash
@@ -88,9 +191,23 @@ class OKXBroker(bt.BackBroker):
 
     setcash = set_cash
 
+    def _own_size(self, exchange_size):
+        """本策略按成交记账的持仓, 不超过交易所的持仓(同一账户可能还有其他策略或手动交易)"""
+        size = self.ledger.size
+        if size * exchange_size <= 0:
+            return 0.0
+        return math.copysign(min(abs(size), abs(exchange_size)), size)
+
     def getposition(self, data):
         '''Returns the current position status (a ``Position`` instance) for
         the given ``data``'''
+        if self._synced():
+            if self._is_swap():
+                exchange_size = self.account.position(self._symbol())[0]
+            else:
+                exchange_size = self.account.balance(self._currencies()[0])
+            size = self._own_size(exchange_size)
+            return Position(size=size, price=self.ledger.price if size else 0.0)
         position = self.store.fetch_positions(self._symbol())
         size = position['pos'] if position['pos'] != '' else 0
         price = position['avgPx'] if position['avgPx'] != '' else 0
@@ -99,17 +216,45 @@ class OKXBroker(bt.BackBroker):
 
     def get_value(self, datas=None, mkt=False, lever=False):
         '''Returns the current value of the portfolio'''
+        if self._synced():
+            # 与 getcash 范围一致, 只计本策略的资金和持仓; 账户总权益见 get_account_equity
+            size = self.getposition(None).size
+            if not size:
+                return self.cash
+            price = self._mark_price() or self.ledger.price
+            if self._is_swap():
+                # 合约: 开仓时从 cash 扣除的保证金 + 浮动盈亏
+                margin = abs(size) * self.contract_size * self.ledger.price / self.p.leverage
+                return self.cash + margin + (price - self.ledger.price) * size * self.contract_size
+            return self.cash + size * price
         value = self.cash
         return value
 
-    getvalue = get_value
+    def get_margin(self):
+        """占用保证金, 需要 account_channel"""
+        return self.account.margin if self._synced() else None
 
-    def _submit(self, data, side, ordtype, size, price):
-        ordtyp = self.ExecTypes.get(ordtype)
-        if not ordtyp:
-            logger.error(f"ordtyp:{ordtyp}")
+    def get_account_equity(self):
+        """账户总权益(美元), 包含其他策略和手动交易的资产, 需要 account_channel"""
+        return self.account.total_equity if self._synced() else None
 
-        position = self.getposition(data)
+    def _mark_price(self):
+        """合约取交易所推送的标记价格, 没有时取最新K线收盘价"""
+        if self._is_swap():
+            mark = self.account.mark(self._symbol())
+            if mark:
+                return mark
+        return self._last_price()
+
+    def _last_price(self):
+        try:
+            return self.store.close[0]
+        except IndexError:
+            return None
+
+    getvalue = get_value
+
+    def _order_params(self, side, price):
         params = {}
         if self.p.type == self.SWAP:
             params = {
@@ -135,6 +280,15 @@ class OKXBroker(bt.BackBroker):
 
         if len(algo_orders) != 0:
             params['attachAlgoOrds'] = algo_orders
+        return params
+
+    def _submit(self, data, side, ordtype, size, price):
+        ordtyp = self.ExecTypes.get(ordtype)
+        if not ordtyp:
+            logger.error(f"ordtyp:{ordtyp}")
+
+        position = self.getposition(data)
+        params = self._order_params(side, price)
 
         side = self.OrdTypes.get(side)
         if not side:
@@ -143,39 +297,113 @@ class OKXBroker(bt.BackBroker):
         result = self.store.create_order(self._symbol(), side, ordtyp, size, price, params=params)
         return result
 
+    def _limit_price(self, side, price, limits):
+        """
+        按交易所限价调整委托价格
+        :param limits: (buyLmt, sellLmt)
+        """
+        buyLmt, sellLmt = limits
+        if side == bt.Order.Buy and price > buyLmt:
+            logger.warning(f"调整买单价格，当前价格{price}, 限价:{buyLmt}")
+            return buyLmt
+        if side == bt.Order.Sell and price < sellLmt:
+            logger.warning(f"调整买单价格，当前价格{price}, 限价:{sellLmt}")
+            return sellLmt
+        return price
+
     def buy(self, owner, data, size, price=None, exectype=bt.Order.Limit, **kwargs):
         side = bt.Order.Buy
+        signal_price = price
         # 滑点
-        price = self._calculate_slippage(price, side)
+        price = self._order_price(price, size, side)
         # 处理限价
-        buyLmt, sellLmt = self.get_highest_price_limit(self._symbol())
-        if price > buyLmt:
-            logger.warning(f"调整买单价格，当前价格{price}, 限价:{buyLmt}")
-            price = buyLmt
+        price = self._limit_price(side, price, self.get_highest_price_limit(self._symbol()))
 
         # 处理小数位
         price, size = self.store.handler_precision(self._market_id(), price, size)
         result = self._submit(data, side, exectype, size, price)
-        order = CCXTOrder(owner, data, result, side, size, price, exectype)
+        order = CCXTOrder(owner, data, result, side, size, price, exectype, signal_price)
         self.orders.append(order)
+        self._record(order, bt.Order.Submitted)
+        self.checkpoint()
         return
 
     def sell(self, owner, data, size, price=None, exectype=bt.Order.Limit, **kwargs):
         side = bt.Order.Sell
+        signal_price = price
         # 滑点
-        price = self._calculate_slippage(price, side)
+        price = self._order_price(price, size, side)
 
         # 处理限价
-        buyLmt, sellLmt = self.get_highest_price_limit(self._symbol())
-        if price < sellLmt:
-            logger.warning(f"调整买单价格，当前价格{price}, 限价:{sellLmt}")
-            price = sellLmt
+        price = self._limit_price(side, price, self.get_highest_price_limit(self._symbol()))
 
         # 处理小数位
         price, size = self.store.handler_precision(self._market_id(), price, size)
         result = self._submit(data, side, exectype, size, price)
-        order = CCXTOrder(owner, data, result, side, size, price, exectype)
+        order = CCXTOrder(owner, data, result, side, size, price, exectype, signal_price)
         self.orders.append(order)
+        self._record(order, bt.Order.Submitted)
+        self.checkpoint()
+
+    def submit_orders(self, owner, data, orders):
+        """
+        批量下单, 价格限制只查询一次, 订单通过交易所批量接口提交
+        :param orders: [{'side': bt.Order.Buy, 'size': 1, 'price': 1.0, 'exectype': bt.Order.Limit}, ...]
+        :return: 与 orders 一一对应的 CCXTOrder 列表, 被拒绝的订单状态为 Rejected
+        """
+        limits = self.get_highest_price_limit(self._symbol())
+        pending = []
+        requests = []
+        for spec in orders:
+            side = spec['side']
+            exectype = spec.get('exectype', bt.Order.Limit)
+            price = self._order_price(spec['price'], spec['size'], side)
+            price = self._limit_price(side, price, limits)
+            price, size = self.store.handler_precision(self._market_id(), price, spec['size'])
+            pending.append((side, size, price, exectype, spec['price']))
+            requests.append({
+                'symbol': self._symbol(),
+                'type': self.ExecTypes.get(exectype),
+                'side': self.OrdTypes.get(side),
+                'amount': size,
+                'price': price,
+                'params': self._order_params(side, price),
+            })
+
+        results = self.store.create_orders(requests)
+        created = []
+        for (side, size, price, exectype, signal_price), result in zip(pending, results):
+            order = CCXTOrder(owner, data, result, side, size, price, exectype, signal_price)
+            if result is None or result.get('status') == 'rejected':
+                logger.error(f"Order rejected: {result['info'] if result else None}")
+                order.reject()
+                self.notify(order)
+                self._record(order)
+            else:
+                self.orders.append(order)
+                self._record(order, bt.Order.Submitted)
+            created.append(order)
+        self.checkpoint()
+        return created
+
+    def cancel_orders(self, orders):
+        """
+        批量撤单, 订单最终状态由 next 查询后通知
+        :param orders: CCXTOrder 列表
+        :return: 撤单请求被交易所接受的 CCXTOrder 列表
+        """
+        orders = [order for order in orders if order.alive()]
+        results = self.store.cancel_orders([order.ccxt_order['id'] for order in orders], self._symbol())
+        cancelled = []
+        for order, result in zip(orders, results):
+            if result is None or result.get('status') == 'rejected':
+                logger.warning(f"Cancel rejected: {order.ccxt_order['id']} {result['info'] if result else None}")
+                continue
+            cancelled.append(order)
+        return cancelled
+
+    def cancel(self, order, bracket=False):
+        return len(self.cancel_orders([order])) != 0
 
     def buy_bracket(self, data=None, size=None, price=None, plimit=None,
                     exectype=bt.Order.Limit, valid=None, tradeid=0,
@@ -185,18 +413,32 @@ class OKXBroker(bt.BackBroker):
                     **kwargs):
         pass
 
+    def _fetch_order(self, order):
+        return self.store.fetch_order(order.ccxt_order['id'], self._symbol())
+
     def next(self):
-        for order in self.orders:
+        if self._pool is not None and len(self.orders) > 1:
+            fetched = list(self._pool.map(self._fetch_order, self.orders))
+        else:
+            fetched = [self._fetch_order(order) for order in self.orders]
+        for order, ccxt_order in zip(self.orders, fetched):
             try:
-                ccxt_order = self.store.fetch_order(order.ccxt_order['id'], self._symbol())
-                order.update(ccxt_order)
+                self._add_fills(order, order.update(ccxt_order))
                 self._update_cash(order)
                 self.notify(order)
             except Exception as e:
                 logger.error(f"Error fetching order status: {e}")
 
-        # 清理已完成或取消的订单
-        self.orders = [order for order in self.orders if order.status in [bt.Order.Submitted, bt.Order.Accepted]]
+        # 清理已完成或取消的订单, 部分成交的订单继续跟踪
+        self.orders = [order for order in self.orders if order.alive()]
+        self.checkpoint()
+
+    def _add_fills(self, order, fills):
+        for size, price, fee in fills:
+            self.ledger.add_fill(size, price, fee)
+            if self.p.history is not None:
+                self.p.history.record_fill(self._symbol(), order, size, price, fee)
+        self._record(order)
 
     def get_highest_price_limit(self, symbol):
         response = self.store.exchange.public_get_public_price_limit({
@@ -246,7 +488,7 @@ class OKXBroker(bt.BackBroker):
         :param price:
         :return:
         """
-        open_contracts = (self.cash * self.p.leverage) / (self.contract_size * price)
+        open_contracts = (self.get_cash() * self.p.leverage) / (self.contract_size * price)
         return open_contracts
 
     def _calculate_open_spot(self, price):
@@ -255,7 +497,7 @@ class OKXBroker(bt.BackBroker):
         :param price:
         :return:
         """
-        return (self.cash - 0.1) / price
+        return (self.get_cash() - 0.1) / price
 
     def calculate_open_number(self, price, side):
         price = self._calculate_slippage(price, side)
@@ -266,6 +508,16 @@ class OKXBroker(bt.BackBroker):
 
         return 0
 
+    def _order_price(self, price, size, side):
+        """
+        委托价格: 订单簿可用时按深度取能成交 size 的价格, 否则按固定滑点
+        """
+        if self.book is not None and self.book.age() < self.p.book_max_age:
+            book_price = self.book.fill_price(side == bt.Order.Buy, float(size))
+            if book_price is not None:
+                return book_price
+        return self._calculate_slippage(price, side)
+
     def _calculate_slippage(self, price, side):
         if self.p.slippage == 0:
             return price
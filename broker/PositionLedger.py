@@ -0,0 +1,102 @@
+def fill_delta(filled, average, fee, new_filled, new_average, new_fee):
+    """
+    由订单的累计成交量、成交均价、手续费计算新增的一笔成交
+    :return: (数量, 价格, 手续费), 没有新成交时返回 None
+    """
+    size = new_filled - filled
+    if size <= 0:
+        return None
+    if filled == 0:
+        price = new_average  # 第一笔成交直接取均价, 避免 price * size / size 的舍入误差
+    else:
+        price = (new_average * new_filled - average * filled) / size
+    return size, price, new_fee - fee
+
+
+class PositionLedger:
+    def __init__(self):
+        """
+        按成交逐笔记账的持仓: 按数量加权的持仓均价、已实现盈亏、手续费, 每笔成交 O(1) 更新
+        多头数量为正, 空头为负; 减仓不改变均价, 反手时剩余部分以成交价开仓
+        """
+        self.size = 0.0
+        self.price = 0.0  # 持仓均价
+        self.realized = 0.0  # 已实现盈亏, 不含手续费
+        self.fees = 0.0
+        self.fills = 0
+        self._orders = {}  # 订单 -> (累计成交量, 成交均价, 手续费), 用于 order_fill 计算增量
+
+    def add_fill(self, size, price, fee=0.0):
+        """
+        :param size: 成交数量, 买入为正, 卖出为负
+        :param price: 成交价
+        :param fee: 手续费(正数为支出)
+        """
+        position = self.size
+        new = position + size
+        if position == 0:
+            self.price = price
+        elif (position > 0) == (size > 0):
+            # 加仓
+            self.price = (self.price * position + price * size) / new
+        else:
+            closed = -size if abs(size) <= abs(position) else position
+            self.realized += (price - self.price) * closed
+            if new == 0:
+                self.price = 0.0
+            elif (new > 0) != (position > 0):
+                self.price = price  # 反手
+        self.size = new
+        self.fees += fee
+        self.fills += 1
+
+    def order_fill(self, key, size, price, fee=0.0):
+        """
+        按订单的累计成交更新, 只记入相对上次的新增部分, 适用于部分成交多次通知的情况
+        :param key: 订单标识
+        :param size: 累计成交数量, 买入为正, 卖出为负
+        :param price: 成交均价
+        :param fee: 累计手续费
+        :return: 新增的 (带方向的数量, 价格, 手续费), 没有新成交时返回 None
+        """
+        sign = 1 if size >= 0 else -1
+        filled, average, paid = self._orders.get(key, (0.0, 0.0, 0.0))
+        fill = fill_delta(filled, average, paid, abs(size), price, fee)
+        if fill is None:
+            return None
+        self._orders[key] = (abs(size), price, fee)
+        delta, fill_price, fill_fee = fill
+        self.add_fill(sign * delta, fill_price, fill_fee)
+        return sign * delta, fill_price, fill_fee
+
+    def close_order(self, key):
+        """订单结束后不再需要记录累计成交"""
+        self._orders.pop(key, None)
+
+    def unrealized(self, price):
+        return (price - self.price) * self.size
+
+    def pnl(self, price):
+        """总盈亏: 已实现 + 浮动 - 手续费"""
+        return self.realized + self.unrealized(price) - self.fees
+
+    def reset(self):
+        self.__init__()
+
+    def get_state(self):
+        return {
+            'size': self.size,
+            'price': self.price,
+            'realized': self.realized,
+            'fees': self.fees,
+            'fills': self.fills,
+            'orders': [[key, *value] for key, value in self._orders.items()],
+        }
+
+    def set_state(self, state):
+        self.size = state['size']
+        self.price = state['price']
+        self.realized = state['realized']
+        self.fees = state['fees']
+        self.fills = state['fills']
+        self._orders = {key: tuple(value) for key, *value in state.get('orders', [])}
@@ -0,0 +1,18 @@
+import click
+
+
+@click.command("Martingale")
+@click.pass_context
+@click.option('--max_steps', type=int, default=None, help="资金分成的份数")
+@click.option('--factor', type=float, default=None, help="马丁因子")
+@click.option('--take_profit', type=float, default=None, help="止盈百分比")
+@click.option('--stop_loss', type=float, default=None, help="止损百分比")
+@click.option('--rsi_period', type=int, default=None, help="RSI周期")
+@click.option('--rsi_downward', type=int, default=None, help="RSI连续下降周期")
+def Martingale(ctx, **options):
+    """马丁格尔做多策略, 未给出的参数取配置文件 [strategy.Martingale], 再取策略默认值"""
+    from cli.runner import run, strategy_params
+    from strategy.MartingaleStrategy import MartingaleLongStrategy
+
+    config = ctx.obj
+    run(config, MartingaleLongStrategy, strategy_params(config, 'Martingale', options))
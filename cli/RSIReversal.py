@@ -1,15 +1,28 @@
-from live import live
 import click
 
+# 实盘调优过的参数, 未在命令行和配置文件中给出时使用
+DEFAULTS = {
+    'boll_period': 60,
+    'boll_dev': 4.0,
+    'rsi_period': 80,
+    'rsi_buy_signal': 41.5,
+    'stop_loss': 0.3,
+    'rsi_downward_period': 8,
+}
 
-@live.command()
+
+@click.command("RSIReversal")
 @click.pass_context
-@click.option('--boll_period', type=int, default=60, required=True, help="布林带的周期长度")
-@click.option('--boll_dev', type=float, default=4.0, required=True, help="布林带的标准差倍数")
-@click.option('--rsi_period', type=int, default=80, required=True, help="RSI周期")
-@click.option('--rsi_buy_signal', type=float, default=41.5, required=True, help="买入信号")
-@click.option('--stop_loss', type=float, default=0.3, required=True, help="止损百分比")
-@click.option('--rsi_downward_period', type=int, default=8, required=True, help="RSI联系下降周期")
-def RSIReversal(ctx, boll_period, boll_dev, rsi_period, rsi_buy_signal, stop_loss, rsi_downward_period):
+@click.option('--boll_period', type=int, default=None, help=f"布林带的周期长度, 默认 {DEFAULTS['boll_period']}")
+@click.option('--boll_dev', type=float, default=None, help=f"布林带的标准差倍数, 默认 {DEFAULTS['boll_dev']}")
+@click.option('--rsi_period', type=int, default=None, help=f"RSI周期, 默认 {DEFAULTS['rsi_period']}")
+@click.option('--rsi_buy_signal', type=float, default=None, help=f"买入信号, 默认 {DEFAULTS['rsi_buy_signal']}")
+@click.option('--stop_loss', type=float, default=None, help=f"止损百分比, 默认 {DEFAULTS['stop_loss']}")
+@click.option('--rsi_downward_period', type=int, default=None, help=f"RSI联系下降周期, 默认 {DEFAULTS['rsi_downward_period']}")
+def RSIReversal(ctx, **options):
+    """RSI 反转策略, 未给出的参数取配置文件 [strategy.RSIReversal], 再取 DEFAULTS"""
+    from cli.runner import run, strategy_params
+    from strategy.RSIReversal import RSIReversal as Strategy
+
     config = ctx.obj
-    print(config)
\ No newline at end of file
+    run(config, Strategy, strategy_params(config, 'RSIReversal', options, DEFAULTS))
@@ -0,0 +1,15 @@
+import click
+
+
+@click.command("SWAP")
+@click.pass_context
+@click.option('--rsi_period', type=int, default=None, help="RSI周期")
+def SWAP(ctx, **options):
+    """永续合约 RSI 策略, 配置文件 [market] type 应为 SWAP, 参数取 [strategy.SWAP]"""
+    from cli.runner import run, strategy_params
+    from strategy.swap_rsi import SWAPStrategy
+
+    config = ctx.obj
+    if config['market'].get('type') != 'SWAP':
+        raise click.BadParameter("[market] type must be SWAP", param_hint='--config')
+    run(config, SWAPStrategy, strategy_params(config, 'SWAP', options))
@@ -1,3 +0,0 @@
-from live import live
-
-
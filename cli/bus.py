@@ -0,0 +1,51 @@
+import click
+
+
+@click.command()
+@click.option('--symbol', '-s', 'symbols', multiple=True, required=True, help='交易对, 可重复, 如 -s FIL-USDT -s BTC-USDT-SWAP')
+@click.option('--interval', '-i', 'intervals', multiple=True, default=['1m'], show_default=True, help='K线周期, 可重复')
+@click.option('--capacity', type=int, default=10000, show_default=True, help='每个交易对/周期保留的K线数')
+@click.option('--prefetch', type=int, default=1000, show_default=True, help='共享内存为空时预加载的K线数')
+@click.option('--sandbox', is_flag=True, default=False, help='模拟盘')
+@click.option('--rest-url', default=None, help='替换交易所 REST 地址')
+@click.option('--ws-url', default=None, help='替换 OKX websocket 地址前缀')
+def bus(symbols, intervals, capacity, prefetch, sandbox, rest_url, ws_url):
+    """
+    行情进程: 订阅 OKX K线写入共享内存, 同一台机器上 CCXTStore(bus=True) 的策略进程共用
+    配置文件中 [data] bus = true 即可读取, 行情进程重启时策略进程不受影响
+    """
+    import threading
+
+    from loguru import logger
+
+    from stores.CCXTStore import CCXTStore
+    from stores.MarketBus import CandleRing, publish, segment_name
+
+    stop = threading.Event()
+    threads, rings, stores = [], [], []
+    for symbol in symbols:
+        for interval in intervals:
+            store = CCXTStore(exchange_name='okx', sandbox=sandbox, rest_url=rest_url, ws_url=ws_url,
+                              symbol=symbol, interval=interval)
+            name = segment_name(symbol, interval)
+            ring = CandleRing.create(name, capacity, store._interval_to_milliseconds(interval))
+            logger.info(f"Publish {symbol} {interval} to market bus {name}")
+            thread = threading.Thread(target=publish, args=(store, ring, prefetch, stop), name=name, daemon=True)
+            thread.start()
+            threads.append(thread)
+            rings.append(ring)
+            stores.append(store)
+    try:
+        while all(thread.is_alive() for thread in threads):
+            stop.wait(1)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        stop.set()
+        for thread in threads:
+            thread.join(5)
+        for store in stores:
+            store.wsc.close()
+        # 不删除共享内存: 行情进程重启后沿用, 策略进程不需要重新连接
+        for ring in rings:
+            ring.close()
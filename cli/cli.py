@@ -1,8 +1,19 @@
-from cli import live
 import click
 
-@click.group()
+from cli.lazy import LazyGroup
+
+
+@click.group(cls=LazyGroup, lazy_subcommands={
+    'live': 'cli.live:live',
+    'walkforward': 'cli.walkforward:walkforward',
+    'orders': 'cli.orders:orders',
+    'bus': 'cli.bus:bus',
+    'shadow': 'cli.shadow:shadow',
+    'import-time': 'cli.importtime:import_time',
+})
 def cli():
     pass
 
-cli.add_command(live, "live")
\ No newline at end of file
+
+if __name__ == '__main__':
+    cli()
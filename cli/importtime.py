@@ -0,0 +1,71 @@
+import os
+import subprocess
+import sys
+import time
+
+import click
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# 统计导入耗时的默认模块
+MODULES = ('cli.cli', 'numpy', 'pandas', 'backtrader', 'ccxt', 'stores.CCXTStore', 'broker.OKXBroker',
+           'strategy.RSIReversal')
+# CLI 启动时不应加载的重量级依赖
+HEAVY = ('numpy', 'pandas', 'backtrader', 'ccxt', 'matplotlib', 'aiohttp')
+
+
+def _importtime(args):
+    """
+    用 python -X importtime 在新进程中运行, 解析每个模块的导入耗时
+    :return: [(模块名, 自身耗时us, 累计耗时us, 缩进层级), ...]
+    """
+    result = subprocess.run([sys.executable, '-X', 'importtime', *args], cwd=ROOT, capture_output=True, text=True)
+    modules = []
+    for line in result.stderr.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        self_us, cumulative, name = line[len('import time:'):].split('|')
+        depth = (len(name) - len(name.lstrip(' ')) - 1) // 2
+        modules.append((name.strip(), int(self_us), int(cumulative), depth))
+    return modules
+
+
+def _cold_start(repeat):
+    """python -m cli.cli --help 的最短耗时(秒)"""
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        subprocess.run([sys.executable, '-m', 'cli.cli', '--help'], cwd=ROOT, capture_output=True, check=True)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+@click.command('import-time')
+@click.pass_context
+@click.option('--module', '-m', 'modules', multiple=True, help='统计导入耗时的模块, 可重复, 默认为常用的重量级模块')
+@click.option('--top', type=int, default=10, show_default=True, help='每个模块列出耗时最多的依赖数')
+@click.option('--repeat', type=int, default=5, show_default=True, help='冷启动计时次数, 取最短')
+@click.option('--target', type=float, default=0.3, show_default=True, help='CLI 冷启动(--help)目标耗时(秒), 超出时返回码为 1')
+def import_time(ctx, modules, top, repeat, target):
+    """各模块导入耗时和 CLI 冷启动耗时"""
+    startup = {name for name, _, _, _ in _importtime(['-c', 'pass'])}  # 解释器启动时已加载的模块
+    for module in modules or MODULES:
+        imported = [m for m in _importtime(['-c', f'import {module}']) if m[0] not in startup]
+        if not imported:
+            click.echo(f"{module}: import failed")
+            continue
+        total = sum(cumulative for _, _, cumulative, depth in imported if depth == 0)
+        click.echo(f"{module}: {total / 1000:.1f} ms")
+        direct = sorted((m for m in imported if m[3] <= 1), key=lambda m: m[2], reverse=True)
+        for name, _, cumulative, _ in direct[:top]:
+            click.echo(f"  {cumulative / 1000:8.1f} ms  {name}")
+
+    loaded = {name.split('.')[0] for name, _, _, _ in _importtime(['-m', 'cli.cli', '--help'])}
+    heavy = [name for name in HEAVY if name in loaded]
+    elapsed = _cold_start(repeat)
+    click.echo(f"cli --help cold start: {elapsed * 1000:.1f} ms (target {target * 1000:.0f} ms)")
+    if heavy:
+        click.echo(f"heavy modules loaded at startup: {', '.join(heavy)}")
+    if elapsed > target or heavy:
+        ctx.exit(1)
@@ -0,0 +1,32 @@
+import importlib
+
+import click
+
+
+class LazyGroup(click.Group):
+    """
+    子命令在第一次用到时才导入所在模块, 启动和 --help 不加载 backtrader、ccxt、pandas 等重量级依赖
+    子命令模块顶层只导入 click, 重量级依赖放在命令函数内部导入
+    """
+
+    def __init__(self, *args, lazy_subcommands=None, **kwargs):
+        """
+        :param lazy_subcommands: {命令名: "模块:属性"}
+        """
+        super(LazyGroup, self).__init__(*args, **kwargs)
+        self.lazy_subcommands = lazy_subcommands or {}
+
+    def list_commands(self, ctx):
+        return sorted(set(super(LazyGroup, self).list_commands(ctx)) | set(self.lazy_subcommands))
+
+    def get_command(self, ctx, cmd_name):
+        if cmd_name in self.lazy_subcommands:
+            return self._load(cmd_name)
+        return super(LazyGroup, self).get_command(ctx, cmd_name)
+
+    def _load(self, cmd_name):
+        module, attr = self.lazy_subcommands[cmd_name].split(':')
+        command = getattr(importlib.import_module(module), attr)
+        if not isinstance(command, click.Command):
+            raise ValueError(f"{self.lazy_subcommands[cmd_name]} is not a click command")
+        return command
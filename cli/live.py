@@ -1,9 +1,19 @@
 import click
 import toml
 
-@click.group()
+from cli.lazy import LazyGroup
+
+
+@click.group(cls=LazyGroup, lazy_subcommands={
+    'RSIReversal': 'cli.RSIReversal:RSIReversal',
+    'Martingale': 'cli.Martingale:Martingale',
+    'SWAP': 'cli.SWAP:SWAP',
+})
 @click.pass_context
 @click.option('--config', "-c", "config", type=click.File('r'), required=True, help='Path to the configuration file.')
-def live(ctx, config):
-    """实盘交易"""
+@click.option('--profile', is_flag=True, default=False, help='启动即开始性能采样, 退出或 kill -USR1 时输出报告')
+def live(ctx, config, profile):
+    """实盘交易, 配置文件格式见 cli/runner.py"""
     ctx.obj = toml.load(config)
+    if profile:
+        ctx.obj.setdefault('performance', {})['profile'] = True
@@ -0,0 +1,26 @@
+import click
+
+
+@click.command()
+@click.option('--dir', '-d', 'path', default='~/.cryptotrader/orders', show_default=True, help='订单历史目录')
+@click.option('--symbol', '-s', default=None, help='交易对, 如 FIL-USDT, 默认全部')
+@click.option('--start', default=None, help='起始时间(含, UTC), 如 2024-01-01')
+@click.option('--end', default=None, help='结束时间(不含, UTC)')
+@click.option('--table', type=click.Choice(['report', 'orders', 'fills']), default='report', show_default=True,
+              help='report 为按交易对汇总, orders / fills 列出明细')
+@click.option('--output', '-o', default=None, help='结果另存为 csv')
+def orders(path, symbol, start, end, table, output):
+    """订单分析: 成交率、相对信号价格的滑点、手续费合计"""
+    from stores.OrderHistory import OrderHistory
+
+    history = OrderHistory(path)
+    try:
+        if table == 'report':
+            result = history.report(symbol, start, end)
+        else:
+            result = history.read(table, symbol, start, end)
+    finally:
+        history.close()
+    click.echo(result.to_string())
+    if output:
+        result.to_csv(output)
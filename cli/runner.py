@@ -0,0 +1,197 @@
+"""
+按 TOML 配置组装实盘: CCXTStore + OKXBroker + 策略, 由 live 子命令调用
+
+    [exchange]
+    name = "okx"
+    api_key = "..."
+    api_secret = "..."
+    password = "..."
+    sandbox = true
+    # rest_url / ws_url: 替换交易所地址, 如连接本地模拟服务
+
+    [market]
+    symbol = "FIL-USDT"
+    interval = "1m"
+    type = "SPOT"                 # SPOT / SWAP
+
+    [data]
+    prefetch = 300                # 启动时预加载的K线数量
+    websocket = true              # false 时按 REST 轮询K线; OKX 以外的交易所使用 ccxt.pro 推送
+    bus = false                   # true 时从 cli bus 行情进程的共享内存读取K线, 多个策略进程共用一个连接
+    feed = "candle"               # candle / trades
+    exactbars = 1                 # 只保留回看所需的K线, 长期运行内存不增长
+    stall_timeout = 130           # 超过多少秒没有K线时重连并按 REST 补齐, 默认 2 个周期 + 10 秒
+    resample = ["15m"]            # 由基础K线合成的更大周期, 依次作为策略的 datas[1], datas[2] ...
+
+    [broker]
+    cash = 100
+    leverage = 3
+    slippage = 0.001
+    book_channel = "books5"       # 按订单簿深度定价, 不配置时使用固定滑点
+    account_channel = true        # 订阅账户/持仓推送; 资金、持仓、总资产只计本策略, 并以交易所余额和持仓为上限
+
+    [performance]
+    cache_dir = "~/.cryptotrader" # 状态日志(崩溃恢复)所在目录
+    workers = 4                   # 并发查询订单状态的线程数
+    order_concurrency = 2         # 批量下单/撤单同时提交的请求数
+    history_dir = "~/.cryptotrader/orders"  # 订单状态变化和成交历史, 用 cli orders 命令分析
+    profile_dir = "~/.cryptotrader/profile" # 性能采样输出目录, kill -USR1 <pid> 开始/停止采样, 不停止交易
+    profile = false               # 启动即开始采样, 退出时输出; 同 live --profile
+    profile_interval = 0.01       # 采样间隔(秒)
+
+    [log]
+    level = "INFO"
+    path = "~/.cryptotrader/live.log"
+    enqueue = true                # 后台线程写日志, 交易线程不等待 IO
+
+    [strategy.RSIReversal]        # 策略参数, 命令行选项优先
+    rsi_period = 80
+"""
+import os
+
+import backtrader as bt
+from loguru import logger
+
+from broker.OKXBroker import OKXBroker
+from stores.CCXTStore import CCXTStore
+from stores.OrderHistory import OrderHistory
+from stores.StateJournal import StateJournal
+from utils import log
+from utils.profiler import ProfileHooks, Profiler
+
+
+def strategy_params(config, name, options, defaults=None):
+    """
+    策略参数, 优先级: 命令行中给出的选项 > 配置文件 [strategy.<name>] > defaults > 策略类默认值
+    :param defaults: 命令行的默认参数, 如实盘调优过的参数
+    """
+    params = dict(defaults or {})
+    params.update(config.get('strategy', {}).get(name, {}))
+    params.update({key: value for key, value in options.items() if value is not None})
+    return params
+
+
+def build_store(config):
+    exchange = config.get('exchange', {})
+    market = config['market']
+    data = config.get('data', {})
+    performance = config.get('performance', {})
+    symbol = market['symbol']
+    if market.get('type', OKXBroker.SPOT) == OKXBroker.SWAP:
+        symbol = f"{symbol}-{OKXBroker.SWAP}"
+    return CCXTStore(
+        api_key=exchange.get('api_key'),
+        api_secret=exchange.get('api_secret'),
+        password=exchange.get('password'),
+        exchange_name=exchange.get('name', 'okx'),
+        sandbox=exchange.get('sandbox', False),
+        rest_url=exchange.get('rest_url'),
+        ws_url=exchange.get('ws_url'),
+        symbol=symbol,
+        interval=market.get('interval', '1m'),
+        feed=data.get('feed', 'candle'),
+        bar_volume=data.get('bar_volume', 0),
+        websocket=data.get('websocket', True),
+        bus=data.get('bus', False),
+        stall_timeout=data.get('stall_timeout'),
+        order_concurrency=performance.get('order_concurrency', 1),
+    )
+
+
+def build_journal(config, strategy):
+    cache_dir = config.get('performance', {}).get('cache_dir')
+    if not cache_dir:
+        return None
+    cache_dir = os.path.expanduser(cache_dir)
+    os.makedirs(cache_dir, exist_ok=True)
+    path = os.path.join(cache_dir, f"{strategy.__name__}_{config['market']['symbol']}.journal")
+    logger.info(f"State journal: {path}")
+    return StateJournal(path)
+
+
+def build_history(config):
+    history_dir = config.get('performance', {}).get('history_dir')
+    if not history_dir:
+        return None
+    logger.info(f"Order history: {history_dir}")
+    return OrderHistory(history_dir)
+
+
+def build_broker(config, store, journal, history=None):
+    market = config['market']
+    broker = config.get('broker', {})
+    return OKXBroker(
+        store=store,
+        symbol=market['symbol'],
+        type=market.get('type', OKXBroker.SPOT),
+        cash=broker.get('cash', 1000.0),
+        leverage=broker.get('leverage', 3),
+        slippage=broker.get('slippage', 0.0),
+        stop_percent=broker.get('stop_percent', 0),
+        limit_percent=broker.get('limit_percent', 0),
+        book_channel=broker.get('book_channel'),
+        book_max_age=broker.get('book_max_age', 5),
+        account_channel=broker.get('account_channel', False),
+        journal=journal,
+        history=history,
+        workers=config.get('performance', {}).get('workers', 1),
+    )
+
+
+def load_history(config, store, journal, strategy):
+    """有指标快照时回放快照中的K线并补齐, 否则预加载 prefetch 根K线"""
+    state = journal.get(strategy.__name__) if journal is not None else None
+    bars = ((state or {}).get('indicators') or {}).get('bars')
+    if bars:
+        store.resume_data(bars)
+        return
+    prefetch = config.get('data', {}).get('prefetch', 0)
+    if prefetch:
+        store.pre_fetch_data(prefetch)
+
+
+def build_profiler(config):
+    """采样输出到 profile_dir, 注册 SIGUSR1 开关; profile = true 时立即开始"""
+    performance = config.get('performance', {})
+    profiler = Profiler(performance.get('profile_dir', '~/.cryptotrader/profile'),
+                        interval=performance.get('profile_interval', 0.01))
+    profiler.install_signal()
+    if performance.get('profile', False):
+        profiler.start()
+    return profiler
+
+
+def run(config, strategy, params):
+    """
+    :param config: toml 配置
+    :param strategy: 策略类
+    :param params: 策略参数
+    """
+    if 'log' in config:
+        path = config['log'].get('path')
+        log.setup(config['log'].get('level', 'INFO'), os.path.expanduser(path) if path else None,
+                  config['log'].get('enqueue', True))
+    profiler = build_profiler(config)
+    store = build_store(config)
+    journal = build_journal(config, strategy)
+    history = build_history(config)
+    broker = build_broker(config, store, journal, history)
+    load_history(config, store, journal, strategy)
+
+    if journal is not None and 'journal' in strategy.params._getkeys():
+        params = dict(params, journal=journal)
+    logger.info(f"Run {strategy.__name__}: {params}")
+
+    cerebro = bt.Cerebro()
+    cerebro.adddata(store)
+    for interval in config.get('data', {}).get('resample', []):
+        cerebro.adddata(store.resample(interval))
+    cerebro.setbroker(broker)
+    cerebro.addstrategy(strategy, **params)
+    cerebro.addanalyzer(ProfileHooks, profiler=profiler)
+    try:
+        return cerebro.run(exactbars=config.get('data', {}).get('exactbars', False))
+    finally:
+        profiler.stop(wait=True)
+        if history is not None:
+            history.close()
@@ -0,0 +1,54 @@
+import click
+
+STRATEGIES = {
+    'RSIReversal': 'strategy.RSIReversal',
+    'MartingaleLongStrategy': 'strategy.MartingaleStrategy',
+}
+
+
+@click.command()
+@click.option('--config', '-c', 'config', type=click.File('r'), default=None,
+              help='实盘配置文件, 使用其中的 [exchange] [market] [data], 见 cli/runner.py')
+@click.option('--strategy', '-s', type=click.Choice(list(STRATEGIES)), default='RSIReversal', show_default=True)
+@click.option('--param', '-p', 'params', multiple=True, help='参数网格, 可重复, 如 -p rsi_buy_signal=30,35,40')
+@click.option('--cash', type=float, default=1000.0, show_default=True)
+@click.option('--commission', type=float, default=0.001, show_default=True, help='模拟成交的手续费率')
+@click.option('--slippage', type=float, default=0.0, show_default=True, help='模拟成交的滑点百分比')
+@click.option('--output', '-o', default='shadow.bin', show_default=True, help='结果文件')
+@click.option('--summary', 'summary_only', is_flag=True, default=False, help='只汇总已有的结果文件, 不连接交易所')
+def shadow(config, strategy, params, cash, commission, slippage, output, summary_only):
+    """影子交易: 一路实盘行情驱动多组参数, 模拟成交, 逐根K线记录每组资产"""
+    import importlib
+    import os
+
+    import toml
+
+    from strategy.ShadowTrading import ShadowTrading, summarize
+    from strategy.WalkForward import parse_grid
+    from utils import log
+
+    if not summary_only:
+        if config is None:
+            raise click.BadParameter('required unless --summary', param_hint='--config')
+        config = toml.load(config)
+        strategy_class = getattr(importlib.import_module(STRATEGIES[strategy]), strategy)
+        try:
+            grid = parse_grid(strategy_class, params)
+        except ValueError as e:
+            raise click.BadParameter(str(e), param_hint='--param')
+
+        from cli.runner import build_store
+
+        # 每组参数的策略日志都会输出, 默认只保留 WARNING 以上
+        log_config = config.get('log', {})
+        path = log_config.get('path')
+        log.setup(log_config.get('level', 'WARNING'), os.path.expanduser(path) if path else None,
+                  log_config.get('enqueue', True))
+        store = build_store(config)
+        prefetch = config.get('data', {}).get('prefetch', 0)
+        if prefetch:
+            store.pre_fetch_data(prefetch)
+        ShadowTrading(strategy_class, grid, output, cash=cash, commission=commission, slippage=slippage).run(store)
+
+    report = summarize(output)
+    click.echo(report.sort_values('total_return', ascending=False).to_string())
@@ -0,0 +1,43 @@
+import click
+
+STRATEGIES = {
+    'RSIReversal': 'strategy.RSIReversal',
+    'MartingaleLongStrategy': 'strategy.MartingaleStrategy',
+    'SWAPStrategy': 'strategy.swap_rsi',
+}
+
+
+@click.command()
+@click.option('--data', '-d', required=True, help='K线数据: backtrader 格式的 csv 路径或数据集名称(见 utils/dataset.py)')
+@click.option('--strategy', '-s', type=click.Choice(list(STRATEGIES)), default='RSIReversal', show_default=True)
+@click.option('--param', '-p', 'params', multiple=True, help='参数网格, 可重复, 如 -p rsi_buy_signal=30,35,40')
+@click.option('--train', type=int, required=True, help='训练窗口K线数')
+@click.option('--test', type=int, required=True, help='测试窗口K线数')
+@click.option('--step', type=int, default=None, help='窗口滑动K线数, 默认等于 --test')
+@click.option('--warmup', type=int, default=None, help='窗口前回放的预热K线数, 默认按参数中的最大周期计算')
+@click.option('--cash', type=float, default=1000.0, show_default=True)
+@click.option('--workers', '-w', type=int, default=None, help='并行进程数, 默认 CPU 核数')
+@click.option('--cache-dir', default=None, help='指标磁盘缓存目录, 多次运行之间复用')
+@click.option('--metric', type=click.Choice(['return', 'calmar']), default='return', show_default=True,
+              help='训练窗口选参指标')
+@click.option('--output', '-o', default=None, help='结果另存为 csv')
+def walkforward(data, strategy, params, train, test, step, warmup, cash, workers, cache_dir, metric, output):
+    """走步优化: 滑动训练/测试窗口, 输出每个窗口的样本外表现"""
+    import importlib
+
+    from utils.dataset import load_dataset
+    from strategy.WalkForward import parse_grid, summary, walk_forward
+
+    strategy_class = getattr(importlib.import_module(STRATEGIES[strategy]), strategy)
+    try:
+        grid = parse_grid(strategy_class, params)
+    except ValueError as e:
+        raise click.BadParameter(str(e), param_hint='--param')
+
+    df = load_dataset(data)
+    report = walk_forward(df, strategy_class, grid, train, test, step=step, warmup=warmup, cash=cash,
+                          workers=workers, cache_path=cache_dir, metric=metric)
+    click.echo(report.to_string(index=False))
+    click.echo(summary(report))
+    if output:
+        report.to_csv(output, index=False)
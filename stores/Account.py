@@ -0,0 +1,103 @@
+import threading
+import time
+
+
+def _float(value):
+    return float(value) if value not in (None, '') else 0.0
+
+
+class Account:
+    """
+    账户和持仓的本地副本, 由 OKXAccountSocket 的 account / positions 频道推送更新
+    订阅后交易所先推送快照, 两个频道都收到快照后 ready 为 True; 重连期间 ready 为 False, 调用方应退回 REST 或本地记账
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.balances = {}  # 币种 -> {'cash': 余额, 'available': 可用, 'equity': 权益, 'frozen': 冻结, 'upl': 未实现盈亏, 'usd': 权益美元价值}
+        self.positions = {}  # instId -> {'size', 'price', 'margin', 'upl', 'mark'}
+        self.total_equity = 0.0  # 账户总权益(美元)
+        self.margin = 0.0  # 占用保证金(全仓 imr + 逐仓持仓保证金)
+        self._imr = 0.0
+        self.account_ready = False
+        self.positions_ready = False
+        self.updated = 0.0  # 最近一次推送的时间
+
+    @property
+    def ready(self):
+        return self.account_ready and self.positions_ready
+
+    def invalidate(self):
+        """连接断开, 等待重新订阅后的快照"""
+        self.account_ready = self.positions_ready = False
+
+    def apply_account(self, data):
+        """account 频道: 每次推送包含有变化的币种, 快照包含全部币种"""
+        with self._lock:
+            for detail in data.get('details', []):
+                self.balances[detail['ccy']] = {
+                    'cash': _float(detail.get('cashBal')),
+                    'available': _float(detail.get('availBal')),
+                    'equity': _float(detail.get('eq')),
+                    'frozen': _float(detail.get('frozenBal')),
+                    'upl': _float(detail.get('upl')),
+                    'usd': _float(detail.get('eqUsd')),
+                }
+            self.total_equity = _float(data.get('totalEq'))
+            self._update_margin(_float(data.get('imr')))
+            self.account_ready = True
+            self.updated = time.time()
+
+    def apply_positions(self, data, snapshot=False):
+        """positions 频道: 仓位为 0 的记录表示已平仓"""
+        with self._lock:
+            if snapshot:
+                self.positions.clear()
+            for position in data:
+                size = _float(position.get('pos'))
+                if size == 0:
+                    self.positions.pop(position['instId'], None)
+                    continue
+                self.positions[position['instId']] = {
+                    'size': size,
+                    'price': _float(position.get('avgPx')),
+                    'margin': _float(position.get('margin')),
+                    'upl': _float(position.get('upl')),
+                    'mark': _float(position.get('markPx')),
+                }
+            self._update_margin(None)
+            if snapshot:
+                self.positions_ready = True
+            self.updated = time.time()
+
+    def _update_margin(self, imr):
+        if imr is not None:
+            self._imr = imr
+        isolated = sum(position['margin'] for position in self.positions.values())
+        self.margin = self._imr + isolated
+
+    def available(self, ccy):
+        balance = self.balances.get(ccy)
+        return balance['available'] if balance else 0.0
+
+    def balance(self, ccy):
+        balance = self.balances.get(ccy)
+        return balance['cash'] if balance else 0.0
+
+    def equity(self, ccy):
+        balance = self.balances.get(ccy)
+        return balance['equity'] if balance else 0.0
+
+    def equity_usd(self, ccy):
+        balance = self.balances.get(ccy)
+        return balance['usd'] if balance else 0.0
+
+    def position(self, inst_id):
+        """:return: (数量, 均价), 无持仓为 (0.0, 0.0)"""
+        position = self.positions.get(inst_id)
+        return (position['size'], position['price']) if position else (0.0, 0.0)
+
+    def mark(self, inst_id):
+        """:return: 标记价格, 无持仓为 0.0"""
+        position = self.positions.get(inst_id)
+        return position['mark'] if position else 0.0
@@ -0,0 +1,95 @@
+from datetime import datetime
+
+
+class _Bar:
+    __slots__ = ('start', 'open', 'high', 'low', 'close', 'volume', 'quote_volume')
+
+    def __init__(self, start, price, size):
+        self.start = start
+        self.open = self.high = self.low = self.close = price
+        self.volume = size
+        self.quote_volume = price * size
+
+    def add(self, price, size):
+        if price > self.high:
+            self.high = price
+        elif price < self.low:
+            self.low = price
+        self.close = price
+        self.volume += size
+        self.quote_volume += price * size
+
+    def to_ohlcv(self):
+        # 与 OKX candle 频道的字段顺序一致: ts, o, h, l, c, vol, volCcy, volCcyQuote, confirm
+        return [datetime.fromtimestamp(self.start / 1000), self.open, self.high, self.low, self.close,
+                self.volume, self.volume, self.quote_volume, 1.0]
+
+
+class TimeBarBuilder:
+    def __init__(self, interval_ms):
+        """
+        按固定时间间隔把逐笔成交聚合成K线, 区间按 interval_ms 对齐
+        :param interval_ms: K线周期(毫秒)
+        """
+        self.interval_ms = interval_ms
+        self.bar = None
+        self.closed_until = 0  # 已完成K线的结束时间, 迟到的成交并入当前K线
+
+    def add_trade(self, ts, price, size):
+        """
+        :return: 本次成交导致完成的K线列表
+        """
+        start = max(ts - ts % self.interval_ms, self.closed_until)
+        bars = []
+        if self.bar is not None and start >= self.bar.start + self.interval_ms:
+            bars.append(self._close())
+        if self.bar is None:
+            self.bar = _Bar(start, price, size)
+        else:
+            self.bar.add(price, size)
+        return bars
+
+    def add_bar(self, ts, open_, high, low, close, volume):
+        """
+        把更小周期的K线合并进来
+        :return: 本次合并导致完成的K线列表
+        """
+        bars = self.add_trade(ts, open_, 0.0)
+        self.bar.add(high, 0.0)
+        self.bar.add(low, 0.0)
+        self.bar.add(close, volume)
+        return bars
+
+    def flush(self, now_ms):
+        """到达区间结束时间后, 不等下一笔成交直接完成当前K线"""
+        if self.bar is not None and now_ms >= self.bar.start + self.interval_ms:
+            return [self._close()]
+        return []
+
+    def _close(self):
+        bar, self.bar = self.bar, None
+        self.closed_until = bar.start + self.interval_ms
+        return bar.to_ohlcv()
+
+
+class VolumeBarBuilder:
+    def __init__(self, volume):
+        """
+        按成交量聚合K线, 累计成交量达到 volume 时完成一根K线
+        :param volume: 每根K线的成交量
+        """
+        self.threshold = volume
+        self.bar = None
+
+    def add_trade(self, ts, price, size):
+        if self.bar is None:
+            self.bar = _Bar(ts, price, size)
+        else:
+            self.bar.add(price, size)
+        if self.bar.volume >= self.threshold:
+            bar, self.bar = self.bar, None
+            return [bar.to_ohlcv()]
+        return []
+
+    def flush(self, now_ms):
+        return []
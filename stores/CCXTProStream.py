@@ -0,0 +1,203 @@
+"""
+OKX 以外交易所的行情和订单推送(ccxt.pro), 代替每秒一次的 REST 轮询
+
+- 后台线程运行 asyncio 事件循环, watch_ohlcv 推送K线, watch_orders 推送订单状态
+- ccxt 的K线没有 confirm 字段: 出现更新的K线时, 之前的K线视为已完成, 放入队列
+- 与 OKXKlineSocket 相同: 重复的K线丢弃, 时间不连续时用 fetch_ohlcv 补齐缺失的区间, 补齐的K线按时间顺序排在前面
+- 订单推送缓存最新状态, CCXTStore.fetch_order 优先读取缓存; 推送中断时清空缓存, 退回 REST 查询
+  已结束的订单被读取后移出缓存, 缓存最多保留 MAX_ORDERS 个订单(其他程序或手动下的单不会被读取)
+
+    stream = CCXTProStream('binance', {'apiKey': ..., 'secret': ...}, 'FIL/USDT', '1m', 60000, orders=True)
+    ohlcv = stream.get_ohlcv(timeout=130)  # [datetime, open, high, low, close, volume, confirm]
+"""
+import asyncio
+import collections
+import queue
+import threading
+from datetime import datetime
+
+import ccxt.pro
+from loguru import logger
+
+from utils import log
+
+
+def parse_ohlcv(ohlcv):
+    """ccxt K线 -> [datetime, open, high, low, close, volume, confirm], 与 OKXKlineSocket 的字段顺序一致(倒数第二个为成交量)"""
+    return [datetime.fromtimestamp(int(ohlcv[0] / 1000)), float(ohlcv[1]), float(ohlcv[2]), float(ohlcv[3]),
+            float(ohlcv[4]), float(ohlcv[5] or 0.0), 1.0]
+
+
+class CCXTProStream:
+    RECONNECT_DELAY = 1  # watch 出错后首次重试等待秒数, 之后每次翻倍
+    MAX_RECONNECT_DELAY = 60
+    MAX_ORDERS = 1000  # 订单缓存上限, 超出时淘汰最久没有推送的订单
+    FINAL_STATUSES = ('closed', 'canceled', 'rejected', 'expired')
+
+    def __init__(self, exchange_name, config, symbol, timeframe, interval_ms, orders=False, sandbox=False,
+                 urls=None):
+        """
+        :param config: ccxt 交易所配置, 如 apiKey / secret / password
+        :param interval_ms: K线周期毫秒数
+        :param orders: 是否订阅订单推送, 需要 API key
+        :param urls: 替换 exchange.urls['api'] 中的地址, 如 {'rest': ..., 'ws': ...}, 用于连接本地模拟服务
+        """
+        self.symbol = symbol
+        self.timeframe = timeframe
+        self.interval_ms = interval_ms
+        self.last_ts = None  # 最后一根放入队列的K线时间(ms)
+        self.ohlcv = queue.Queue()
+        self.orders = collections.OrderedDict()  # 订单ID -> 最新的订单推送, 按推送时间排序
+        self.orders_live = False  # 订单推送正常时才使用缓存
+        self._closed = False
+
+        self.exchange = getattr(ccxt.pro, exchange_name)(dict(config, enableRateLimit=True))
+        if sandbox:
+            self.exchange.set_sandbox_mode(True)
+        if urls:
+            self.exchange.urls['api'] = dict(self.exchange.urls['api'], **urls)
+
+        self._loop = asyncio.new_event_loop()
+        self._lock = asyncio.Lock()
+        self._thread = threading.Thread(target=self._loop.run_forever, name=f"ccxtpro-{exchange_name}", daemon=True)
+        self._thread.start()
+        self._tasks = [self._submit(self._watch_ohlcv())]
+        if orders:
+            self._tasks.append(self._submit(self._watch_orders()))
+
+    def _submit(self, coroutine):
+        return asyncio.run_coroutine_threadsafe(coroutine, self._loop)
+
+    async def _retry(self, name, delay, error):
+        logger.warning(f"{self.exchange.id} {name} {self.symbol} failed: {error}, retry in {delay}s")
+        await asyncio.sleep(delay)
+        return min(delay * 2, self.MAX_RECONNECT_DELAY)
+
+    async def _watch_ohlcv(self):
+        delay = self.RECONNECT_DELAY
+        while not self._closed:
+            try:
+                candles = await self.exchange.watch_ohlcv(self.symbol, self.timeframe)
+            except Exception as e:
+                if self._closed:
+                    return
+                delay = await self._retry('watch_ohlcv', delay, e)
+                continue
+            delay = self.RECONNECT_DELAY
+            current = candles[-1][0]  # 未完成的K线
+            async with self._lock:
+                for candle in candles:
+                    if candle[0] < current:
+                        await self._put(candle)
+
+    async def _put(self, candle):
+        ts = candle[0]
+        if self.last_ts is not None:
+            if ts <= self.last_ts:
+                return
+            if ts - self.last_ts > self.interval_ms:
+                await self._backfill(self.last_ts + self.interval_ms, ts)
+        self.ohlcv.put(parse_ohlcv(candle))
+        self.last_ts = ts
+        if log.enabled('DEBUG'):
+            logger.debug(f"Kline data: {candle}")
+
+    async def _backfill(self, from_ms, to_ms, limit=100):
+        missing = (to_ms - from_ms) // self.interval_ms
+        filled = 0
+        since = from_ms
+        try:
+            while since < to_ms:
+                rows = await self.exchange.fetch_ohlcv(self.symbol, self.timeframe, since=since, limit=limit)
+                rows = [row for row in rows if since <= row[0] < to_ms]
+                if not rows:
+                    break
+                for row in rows:
+                    if row[0] > self.last_ts:
+                        self.ohlcv.put(parse_ohlcv(row))
+                        self.last_ts = row[0]
+                        filled += 1
+                since = rows[-1][0] + 1
+        except Exception as e:
+            logger.error(f"Backfill {self.symbol} [{from_ms}, {to_ms}) failed: {e}")
+            return
+        if filled < missing:
+            logger.warning(f"Backfill {self.symbol} [{from_ms}, {to_ms}): {filled}/{missing} bars")
+        else:
+            logger.info(f"Backfill {self.symbol} [{from_ms}, {to_ms}): {filled} bars")
+
+    async def _watch_orders(self):
+        delay = self.RECONNECT_DELAY
+        while not self._closed:
+            try:
+                orders = await self.exchange.watch_orders(self.symbol)
+            except Exception as e:
+                if self._closed:
+                    return
+                # 断线期间可能漏掉订单变化, 缓存作废, 查询退回 REST
+                self.orders_live = False
+                self.orders.clear()
+                delay = await self._retry('watch_orders', delay, e)
+                continue
+            delay = self.RECONNECT_DELAY
+            self.orders_live = True
+            for order in orders:
+                self.orders[order['id']] = order
+                self.orders.move_to_end(order['id'])
+            while len(self.orders) > self.MAX_ORDERS:
+                self.orders.popitem(last=False)
+
+    def get_order(self, order_id):
+        """订单推送中的最新状态, 推送中断或尚未收到该订单时返回 None"""
+        if not self.orders_live:
+            return None
+        order = self.orders.get(order_id)
+        if order is not None and order.get('status') in self.FINAL_STATUSES:
+            # 已结束的订单不会再有推送, 交给调用方后不再缓存
+            self.orders.pop(order_id, None)
+        return order
+
+    def get_ohlcv(self, timeout=None):
+        """
+        :param timeout: 等待秒数, 超时返回 None
+        """
+        try:
+            return self.ohlcv.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+    def seed(self, last_ts):
+        """已通过 REST 加载到 last_ts 的K线, 之前的推送视为重复, 之后的缺失需要补齐"""
+        async def seed():
+            async with self._lock:
+                if self.last_ts is None or last_ts > self.last_ts:
+                    self.last_ts = last_ts
+        self._submit(seed()).result()
+
+    def fill_gap(self, now_ms, timeout=60):
+        """长时间没有收到K线时调用: 补齐最后一根K线到 now_ms 之间已经完成的K线"""
+        async def fill():
+            async with self._lock:
+                if self.last_ts is None:
+                    return
+                end = now_ms - now_ms % self.interval_ms
+                if end - self.last_ts > self.interval_ms:
+                    await self._backfill(self.last_ts + self.interval_ms, end)
+        self._submit(fill()).result(timeout)
+
+    def reconnect(self):
+        """关闭当前连接, 下一次 watch 时 ccxt 重新连接并订阅"""
+        logger.warning(f"{self.exchange.id} stream reconnecting")
+        self.orders_live = False
+        self.orders.clear()  # 断线期间的状态变化不会推送, 重连后不再使用旧缓存
+        self._submit(self.exchange.close())
+
+    def close(self):
+        self._closed = True
+        for task in self._tasks:
+            task.cancel()
+        try:
+            self._submit(self.exchange.close()).result(10)
+        finally:
+            self._loop.call_soon_threadsafe(self._loop.stop)
+            self._thread.join()
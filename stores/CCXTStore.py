@@ -1,18 +1,40 @@
 import json
 import sys
 import time
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta, timezone
 from decimal import Decimal, ROUND_DOWN
 
 import backtrader as bt
+import numpy as np
 import pandas as pd
 import ccxt
 from loguru import logger
 
-from .OKX_Data import OKXKlineSocket
+from utils import log
+
+from .OKX_Data import OKXKlineSocket, OKXTradeSocket, OKXOrderBookSocket, OKXAccountSocket
+from .BarBuilder import TimeBarBuilder, VolumeBarBuilder
+from .ResampledFeed import ResampledFeed
+from .MarketBus import MarketBusReader
 import asyncio
 
 
+def dates2num(dates):
+    """
+    批量版 bt.date2num, 运算顺序相同, 结果逐位一致
+    :param dates: naive datetime 列表
+    """
+    dts = np.array(dates, dtype='datetime64[us]')
+    days = dts.astype('datetime64[D]')
+    us = (dts - days).astype(np.int64)
+    hour, us = np.divmod(us, 3600 * 1000000)
+    minute, us = np.divmod(us, 60 * 1000000)
+    second, us = np.divmod(us, 1000000)
+    base = (days.astype(np.int64) + 719163).astype(np.float64)  # 1970-01-01 的 ordinal
+    return base + (hour / 24.0 + minute / 1440.0 + second / 86400.0 + us / 86400000000.0)
+
+
 def truncate_to_decimal_places(number, decimal_places):
     # 确保 decimal_places 是整数
     decimal_places = int(decimal_places)
@@ -39,14 +61,86 @@ class CCXTStore(bt.DataBase):
         ('sandbox', False),  # 是否为模拟盘交易
         ('symbol', None),
         ('interval', '1m'),
+        ('feed', 'candle'),  # candle: 交易所K线频道；trades: 订阅逐笔成交自行聚合, 支持 1s 以下周期
+        ('bar_volume', 0),  # feed=trades 时按成交量聚合K线, 0 表示按 interval 聚合
+        ('rest_url', None),  # 替换交易所 REST 地址, 如 http://127.0.0.1:8080, 用于连接本地模拟服务
+        ('ws_url', None),  # 替换 OKX websocket 地址前缀, 如 ws://127.0.0.1:8080/ws/v5; 其他交易所替换 ccxt.pro 的 ws 地址
+        ('websocket', True),  # False 时不订阅行情频道, 按 REST 轮询K线
+        ('bus', False),  # True 时从共享内存行情总线读取K线(cli bus 启动的行情进程), 不订阅交易所行情
+        ('order_concurrency', 1),  # 批量下单/撤单超过 BATCH_LIMIT 时同时提交的请求数
+        ('stall_timeout', None),  # 超过多少秒没有收到K线视为连接失效, 重连并补齐K线; None 为 2 个K线周期 + 10 秒
     )
 
     # 保证金模式：isolated：逐仓 ；cross：全仓
     ISOLATED = 'isolated'
     CROSS = 'cross'
 
+    # 批量下单/撤单单次请求的最大订单数
+    BATCH_LIMIT = 20
+
     def __init__(self):
         super(CCXTStore, self).__init__()
+        self._connect()
+
+        self.last_ts = 0
+        self._last_dt = 0.0  # 最后一根送入 lines 的K线时间(bt.date2num)
+        self.ohlcv = []
+        self._history = []  # 已转换好的历史K线 [datetime(num), open, high, low, close, volume]
+        self._history_idx = 0
+        self._resampled = []  # resample 创建的派生K线
+        self.kline_symbol = self.p.symbol
+        self.kline_interval = self.p.interval
+        logger.info(f"Set kline {self.kline_symbol} {self.kline_interval}")
+
+        self._gateway = None
+        if self.p.order_concurrency > 1:
+            self._gateway = ThreadPoolExecutor(max_workers=self.p.order_concurrency)
+
+        self.wsc = None
+        if self.p.bus:
+            self.wsc = MarketBusReader(self.p.symbol, self.p.interval)
+            logger.info(f"Read {self.p.symbol} {self.p.interval} from market bus {self.wsc.name}")
+        elif self.p.exchange_name == "okx" and self.p.websocket:
+            if self.p.feed == 'trades':
+                if self.p.bar_volume:
+                    builder = VolumeBarBuilder(self.p.bar_volume)
+                else:
+                    builder = TimeBarBuilder(self._interval_to_milliseconds(self.p.interval))
+                wsc = OKXTradeSocket(self.p.symbol, builder, self.p.sandbox, self.p.ws_url)
+            else:
+                wsc = OKXKlineSocket(self.p.symbol, self.p.interval, self.p.sandbox, self.p.ws_url,
+                                     interval_ms=self._interval_to_milliseconds(self.p.interval),
+                                     backfill=self.fetch_candles)
+            self.wsc = wsc
+            logger.info(f"Start {self.p.exchange_name} {self.p.feed} websocket success!")
+        elif self.p.websocket:
+            # 其他交易所使用 ccxt.pro 推送K线, 有 API key 时同时订阅订单推送; ccxt.pro 不支持的交易所按 REST 轮询
+            self.wsc = self._start_stream()
+
+    def _start_stream(self):
+        # ccxt.pro 导入约 0.3 秒, 只在需要时导入
+        import ccxt.pro
+
+        if not hasattr(ccxt.pro, self.p.exchange_name):
+            logger.warning(f"{self.p.exchange_name} is not supported by ccxt.pro, poll klines by REST")
+            return None
+        from .CCXTProStream import CCXTProStream
+
+        if self.p.feed != 'candle':
+            logger.warning(f"{self.p.exchange_name} only supports candle feed, ignore feed={self.p.feed}")
+        urls = {}
+        if self.p.rest_url:
+            urls['rest'] = self.p.rest_url
+        if self.p.ws_url:
+            urls['ws'] = self.p.ws_url
+        config = {'apiKey': self.p.api_key, 'secret': self.p.api_secret, 'password': self.p.password}
+        stream = CCXTProStream(self.p.exchange_name, config, self.p.symbol, self.p.interval,
+                               self._interval_to_milliseconds(self.p.interval), orders=bool(self.p.api_key),
+                               sandbox=self.p.sandbox, urls=urls)
+        logger.info(f"Start {self.p.exchange_name} ccxt.pro stream success!")
+        return stream
+
+    def _connect(self):
         exchange_class = getattr(ccxt, self.p.exchange_name)
         self.exchange = exchange_class({
             'apiKey': self.p.api_key,
@@ -61,6 +155,10 @@ class CCXTStore(bt.DataBase):
             logger.info("Switching to sandbox mode")
             self.exchange.set_sandbox_mode(True)
 
+        if self.p.rest_url:
+            logger.info(f"Using REST url {self.p.rest_url}")
+            self.exchange.urls['api'] = {'rest': self.p.rest_url}
+
         try:
             self.markets = self.exchange.load_markets()
 
@@ -68,16 +166,42 @@ class CCXTStore(bt.DataBase):
             logger.error(f"Failed to connect: {e}")
             sys.exit(1)
 
-        self.last_ts = 0
-        self.ohlcv = []
-        self.kline_symbol = self.p.symbol
-        self.kline_interval = self.p.interval
-        logger.info(f"Set kline {self.kline_symbol} {self.kline_interval}")
+    def start_order_book(self, symbol, channel='books5'):
+        """
+        订阅订单簿, 返回持续更新的 OrderBook
+        :param channel: books5 / books
+        """
+        self.book_socket = OKXOrderBookSocket(symbol, channel, self.p.sandbox, self.p.ws_url)
+        logger.info(f"Start {self.p.exchange_name} {channel} websocket success!")
+        return self.book_socket.book
 
-        if self.p.exchange_name == "okx":
-            wsc = OKXKlineSocket(self.p.symbol, self.p.interval, self.p.sandbox)
-            self.wsc = wsc
-            logger.info(f"Start {self.p.exchange_name} kline websocket success!")
+    def resample(self, interval):
+        """
+        由本数据的K线合成更大周期的K线, 与本数据一起加入 cerebro
+        :param interval: 如 5m / 15m / 1h, 须为 interval 的整数倍
+        :return: ResampledFeed
+        """
+        interval_ms = self._interval_to_milliseconds(interval)
+        if interval_ms % 60000:
+            timeframe, compression = bt.TimeFrame.Seconds, interval_ms // 1000
+        else:
+            timeframe, compression = bt.TimeFrame.Minutes, interval_ms // 60000
+        feed = ResampledFeed(interval_ms=interval_ms,
+                             base_interval_ms=self._interval_to_milliseconds(self.kline_interval),
+                             timeframe=timeframe, compression=compression, name=f"{self.kline_symbol}_{interval}")
+        self._resampled.append(feed)
+        logger.info(f"Resample {self.kline_symbol} {self.kline_interval} -> {interval}")
+        return feed
+
+    def start_account(self, inst_type='ANY'):
+        """
+        订阅私有 account / positions 频道, 返回持续更新的 Account
+        :param inst_type: positions 频道的产品类型, 如 SWAP
+        """
+        self.account_socket = OKXAccountSocket(self.p.api_key, self.p.api_secret, self.p.password, self.p.sandbox,
+                                               self.p.ws_url, inst_type)
+        logger.info(f"Start {self.p.exchange_name} account websocket success!")
+        return self.account_socket.account
 
     def set_Kline_symbol(self, symbol):
         self.kline_symbol = self.p.symbol = symbol
@@ -103,19 +227,28 @@ class CCXTStore(bt.DataBase):
             sys.exit(1)
 
     def create_order(self, symbol, side, order_type, amount, price=None, params={}):
-        logger.debug(f"[{self.p.exchange_name}] New order: {symbol}, {side}, {order_type}, amount:{amount}, price:{price}, {params}")
+        if log.enabled('DEBUG'):
+            logger.debug(f"[{self.p.exchange_name}] New order: {symbol}, {side}, {order_type}, amount:{amount}, price:{price}, {params}")
         try:
             order = self.exchange.create_order(symbol, order_type, side, amount, price, params)
-            logger.debug(f"[{self.p.exchange_name}] Order created: {json.dumps(order)}")
+            if log.enabled('DEBUG'):
+                logger.debug(f"[{self.p.exchange_name}] Order created: {json.dumps(order)}")
             return order
         except Exception as e:
             logger.error(f"[{self.p.exchange_name}] Failed to create order: {e}")
             raise e
 
     def fetch_order(self, order_id, symbol):
+        if hasattr(self.wsc, 'get_order'):
+            # ccxt.pro 订单推送中的最新状态, 不占用 REST 频率限制
+            order = self.wsc.get_order(order_id)
+            if order is not None:
+                return order
         try:
             order = self.exchange.fetch_order(order_id, symbol)
-            logger.info(f"Order details: {json.dumps(order)}")
+            # 每根K线都会查询未完成订单, 状态不变时每分钟只记录一次
+            log.throttled(('fetch_order', order_id, order.get('status'), order.get('filled')), 60, 'INFO',
+                          "Order details: {}", lambda: json.dumps(order))
             return order
         except Exception as e:
             logger.error(f"Failed to fetch order: {e}")
@@ -128,6 +261,52 @@ class CCXTStore(bt.DataBase):
         except Exception as e:
             logger.error(f"Failed to cancel order: {e}")
 
+    def _run_batches(self, func, items):
+        """按 BATCH_LIMIT 分批调用 func, order_concurrency > 1 时多批同时提交, 结果按原顺序拼接"""
+        batches = [items[i:i + self.BATCH_LIMIT] for i in range(0, len(items), self.BATCH_LIMIT)]
+        if self._gateway is None or len(batches) < 2:
+            results = [func(batch) for batch in batches]
+        else:
+            results = list(self._gateway.map(func, batches))
+        return [item for batch in results for item in batch]
+
+    def create_orders(self, orders):
+        """
+        批量下单, 按 BATCH_LIMIT 分批提交
+        :param orders: [{'symbol', 'type', 'side', 'amount', 'price', 'params'}, ...]
+        :return: 与 orders 一一对应的订单列表, 整批提交失败的位置为 None
+        """
+        def create(batch):
+            logger.debug(f"[{self.p.exchange_name}] New orders: {len(batch)}")
+            try:
+                created = self.exchange.create_orders(batch)
+                if log.enabled('DEBUG'):
+                    logger.debug(f"[{self.p.exchange_name}] Orders created: {json.dumps(created)}")
+            except Exception as e:
+                logger.error(f"[{self.p.exchange_name}] Failed to create orders: {e}")
+                created = [None] * len(batch)
+            return created
+
+        return self._run_batches(create, orders)
+
+    def cancel_orders(self, order_ids, symbol):
+        """
+        批量撤单, 按 BATCH_LIMIT 分批提交
+        :param order_ids: 订单ID列表
+        :param symbol:
+        :return: 与 order_ids 一一对应的结果列表, 整批撤单失败的位置为 None
+        """
+        def cancel(batch):
+            try:
+                cancelled = self.exchange.cancel_orders(batch, symbol)
+                logger.info(f"Orders cancelled: {cancelled}")
+            except Exception as e:
+                logger.error(f"Failed to cancel orders: {e}")
+                cancelled = [None] * len(batch)
+            return cancelled
+
+        return self._run_batches(cancel, order_ids)
+
     def handler_precision(self, symbol, price, value):
         price_precision = int(abs(Decimal(str(self.markets[symbol]['precision']['price'])).as_tuple().exponent))
         price = truncate_to_decimal_places(price, price_precision)
@@ -141,7 +320,7 @@ class CCXTStore(bt.DataBase):
         return positions[0]['info']
 
     def haslivedata(self):
-        if len(self.ohlcv) != 0:
+        if len(self.ohlcv) != 0 or self._history_idx < len(self._history):
             return True
         else:
             return False
@@ -149,58 +328,125 @@ class CCXTStore(bt.DataBase):
     def islive(self):
         return True
 
+    def _stage_history(self):
+        """
+        把排队中的历史K线(预加载/补数据)一次性转换为列数据, 之后 _load 按下标逐根读取
+        避免逐根 pop(0) 和 bt.date2num
+        """
+        rows, self.ohlcv = self.ohlcv, []
+        dts = dates2num([row[0] for row in rows])
+        values = np.array([row[1:6] for row in rows], dtype=np.float64)
+        self._history = np.column_stack((dts, values)).tolist()
+        self._history_idx = 0
+
+    def _next_history(self):
+        if self._history_idx >= len(self._history):
+            if not self.ohlcv:
+                return None
+            self._stage_history()
+        ohlc = self._history[self._history_idx]
+        self._history_idx += 1
+        return ohlc
+
+    def _set_lines(self, ohlc):
+        self._last_dt = ohlc[0]
+        self.lines.datetime[0] = ohlc[0]
+        self.lines.open[0] = ohlc[1]
+        self.lines.high[0] = ohlc[2]
+        self.lines.low[0] = ohlc[3]
+        self.lines.close[0] = ohlc[4]
+        self.lines.volume[0] = ohlc[5]
+        if self._resampled:
+            ts = round(bt.num2date(ohlc[0]).timestamp() * 1000)
+            for feed in self._resampled:
+                feed.add_bar(ohlc[0], ts, ohlc[1], ohlc[2], ohlc[3], ohlc[4], ohlc[5])
+
     def _load(self):
-        if self.wsc:
-            if self.ohlcv:
-                ohlc = self.ohlcv.pop(0)
-                ohlc[0] = bt.date2num(ohlc[0])
-                self.lines.datetime[0] = ohlc[0]
-                self.lines.open[0] = ohlc[1]
-                self.lines.high[0] = ohlc[2]
-                self.lines.low[0] = ohlc[3]
-                self.lines.close[0] = ohlc[4]
-                self.lines.volume[0] = ohlc[5]
-                return True
+        ohlc = self._next_history()
+        if ohlc is not None:
+            self._set_lines(ohlc)
+            return True
 
-            ohlc = self.wsc.get_ohlcv()
-            ohlc[0] = bt.date2num(ohlc[0])
-            self.lines.datetime[0] = ohlc[0]
-            self.lines.open[0] = ohlc[1]
-            self.lines.high[0] = ohlc[2]
-            self.lines.low[0] = ohlc[3]
-            self.lines.close[0] = ohlc[4]
-            self.lines.volume[0] = ohlc[-2]
+        if self.wsc:
+            while True:
+                ohlc = self.wsc.get_ohlcv(timeout=self._stall_timeout())
+                if ohlc is None:
+                    self._on_stall()
+                    continue
+                dt = bt.date2num(ohlc[0])
+                if dt > self._last_dt:  # 预加载/补数据中已有的K线不重复送入
+                    break
+            self._set_lines([dt, ohlc[1], ohlc[2], ohlc[3], ohlc[4], ohlc[-2]])
             return True
 
         try:
-            if not self.ohlcv:
-                while not self.ohlcv:
-                    time.sleep(1)
-                    to_ = self.fetch_time()
-                    if 60 - datetime.fromtimestamp(to_ / 1000).second > 10:
-                        continue
-                    from_ = to_ - self._interval_to_milliseconds(self.kline_interval)
-
-                    if self.is_same_minute(to_, self.last_ts):
-                        continue
-                    self.fetch_data(from_, to_)
-
-            if self.ohlcv:
-                ohlc = self.ohlcv.pop(0)
-                ohlc[0] = bt.date2num(ohlc[0])
-                self.lines.datetime[0] = ohlc[0]
-                self.lines.open[0] = ohlc[1]
-                self.lines.high[0] = ohlc[2]
-                self.lines.low[0] = ohlc[3]
-                self.lines.close[0] = ohlc[4]
-                self.lines.volume[0] = ohlc[5]
-
+            while not self.ohlcv:
+                time.sleep(1)
+                to_ = self.fetch_time()
+                if 60 - datetime.fromtimestamp(to_ / 1000).second > 10:
+                    continue
+                from_ = to_ - self._interval_to_milliseconds(self.kline_interval)
+
+                if self.is_same_minute(to_, self.last_ts):
+                    continue
+                self.fetch_data(from_, to_)
+
+            ohlc = self._next_history()
+            if ohlc is not None:
+                self._set_lines(ohlc)
                 return True
             else:
-                return False
+                return self._end()
         except Exception as e:
             logger.error(f"Error loading data: {e}")
-            return False
+            return self._end()
+
+    def _end(self):
+        for feed in self._resampled:
+            feed.end()
+        return False
+
+    def _stall_timeout(self):
+        if self.p.stall_timeout is not None:
+            return self.p.stall_timeout
+        if self.p.feed == 'trades' and self.p.bar_volume:
+            return None  # 成交量K线的间隔不固定
+        return self._interval_to_milliseconds(self.p.interval) * 2 / 1000 + 10
+
+    def _on_stall(self):
+        """长时间没有K线: 重连 websocket, 并按 REST 补齐这段时间已完成的K线"""
+        logger.warning(f"No kline for {self._stall_timeout()}s, reconnect websocket")
+        self.wsc.reconnect()
+        if hasattr(self.wsc, 'fill_gap'):
+            try:
+                self.wsc.fill_gap(self.fetch_time())
+            except Exception as e:
+                logger.error(f"Fill kline gap failed: {e}")
+
+    def fetch_candles(self, from_ms, to_ms, limit=100):
+        """
+        OKX 原始K线, 字段与 candle 频道相同, 用于补齐 websocket 断线期间缺失的K线
+        :return: [from_ms, to_ms) 内已确认的K线, 按时间升序
+        """
+        interval_ms = self._interval_to_milliseconds(self.kline_interval)
+        # market/candles 只提供最近 1440 根
+        if self.exchange.milliseconds() - from_ms < 1440 * interval_ms:
+            method = self.exchange.public_get_market_candles
+        else:
+            method = self.exchange.public_get_market_history_candles
+        rows = {}
+        after = to_ms  # 返回早于 after 的K线, 新的在前
+        while after > from_ms:
+            data = method({'instId': self.kline_symbol, 'bar': self.kline_interval, 'after': after,
+                           'before': from_ms - 1, 'limit': limit})['data']
+            if not data:
+                break
+            for row in data:
+                ts = int(row[0])
+                if from_ms <= ts < to_ms and row[-1] != '0':
+                    rows[ts] = row
+            after = min(int(row[0]) for row in data)
+        return [rows[ts] for ts in sorted(rows)]
 
     def is_same_minute(self, timestamp1, timestamp2):
         dt1 = datetime.fromtimestamp(timestamp1 / 1000, tz=timezone.utc) + timedelta(hours=8)
@@ -224,9 +470,38 @@ class CCXTStore(bt.DataBase):
     def pre_fetch_data(self, limit):
         """预加载数据"""
         logger.info(f"pre fetch data {limit}")
+        if isinstance(self.wsc, MarketBusReader):
+            rows = self.wsc.history(limit)
+            if rows:
+                # 行情进程的环形缓冲中已有最近的K线, 不请求交易所
+                for row in rows:
+                    self.last_ts = int(row[0].timestamp() * 1000)
+                    self.ohlcv.append(row[:6])
+                self._seed_socket()
+                return
         to_ = int(datetime.now(timezone.utc).timestamp()) * 1000
         from_ = to_ - self._interval_to_milliseconds(self.kline_interval) * limit
         self.fetch_data(from_, to_, limit=100)
+        self._seed_socket()
+
+    def _seed_socket(self):
+        if hasattr(self.wsc, 'seed') and self.last_ts:
+            self.wsc.seed(self.last_ts)
+
+    def resume_data(self, bars):
+        """
+        从指标快照恢复: 回放快照中的K线, 再补齐快照之后缺失的K线
+        :param bars: [[timestamp(ms), open, high, low, close, volume], ...]
+        """
+        logger.info(f"resume data from snapshot {len(bars)}")
+        for bar in bars:
+            ohlcv = list(bar)
+            self.last_ts = ohlcv[0]
+            ohlcv[0] = datetime.fromtimestamp(ohlcv[0] / 1000)
+            self.ohlcv.append(ohlcv)
+        to_ = int(datetime.now(timezone.utc).timestamp()) * 1000
+        self.fetch_data(self.last_ts + 1, to_, limit=100)
+        self._seed_socket()
 
     def fetch_data(self, from_timestamp, to_timestamp, limit=10):
         try:
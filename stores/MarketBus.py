@@ -0,0 +1,264 @@
+"""
+共享内存行情总线: 一个行情进程订阅交易所, 多个策略进程读取同一份K线
+
+    python -m cli.cli bus -s FIL-USDT -i 1m                                # 行情进程, 见 cli/bus.py
+    store = CCXTStore(symbol='FIL-USDT', interval='1m', bus=True, ...)    # 策略进程
+
+每个 (交易对, 周期) 一块共享内存, 存放最近 capacity 根K线的环形缓冲:
+
+    header  int64[8]: magic, capacity, interval_ms, count(已写入总数), heartbeat(ms)
+    slots   capacity 个 (seq, ts, open, high, low, close, volume)
+
+- 单写多读, 不加锁: 第 n 根K线写入 slots[n % capacity], 写之前 seq 加 1(奇数表示正在写), 写完再加 1, 最后更新 count
+- 读者读取前后两次 seq 相同且等于 2 * (n // capacity + 1) 时数据有效; 小于说明未写完, 大于说明已被覆盖(读者落后超过 capacity)
+- 读者轮询 count, 不经过内核通知, 延迟为轮询间隔(50us 起, 空闲时逐步放大到 POLL_MAX)
+  单核机器 3 个读者: POLL_MAX=1ms 时延迟中位数约 0.55ms, 0.1ms 时约 0.09ms(空闲 CPU 占用相应增加)
+- 行情进程重启后沿用已有的共享内存和 count, 读者无需重新连接
+"""
+import re
+import time
+from datetime import datetime
+from multiprocessing import resource_tracker, shared_memory
+
+import numpy as np
+from loguru import logger
+
+from .OKX_Data import parse_candle
+
+MAGIC = 0x43545042  # 'CTPB'
+HEADER = 8
+MAGIC_I, CAPACITY_I, INTERVAL_I, COUNT_I, HEARTBEAT_I = range(5)
+SLOT = np.dtype([('seq', '<u8'), ('ts', '<i8'), ('open', '<f8'), ('high', '<f8'), ('low', '<f8'),
+                 ('close', '<f8'), ('volume', '<f8')])
+
+
+def segment_name(symbol, interval, prefix='cryptotrader'):
+    return re.sub(r'[^A-Za-z0-9_.-]', '_', f"{prefix}-{symbol}-{interval}")
+
+
+def _untrack(shm):
+    # resource_tracker 在进程退出时删除登记过的共享内存(Python 3.13 之前 attach 也会登记)
+    # 行情进程重启、读者进程退出都不能删除, 共享内存一直保留到手动删除(/dev/shm)
+    resource_tracker.unregister(shm._name, 'shared_memory')
+
+
+class CandleRing:
+    def __init__(self, shm):
+        self.shm = shm
+        self.header = np.ndarray((HEADER,), dtype='<i8', buffer=shm.buf)
+        capacity = int(self.header[CAPACITY_I])
+        self.slots = np.ndarray((capacity,), dtype=SLOT, buffer=shm.buf, offset=HEADER * 8)
+        self.seqs = self.slots['seq']
+        self.capacity = capacity
+
+    @classmethod
+    def create(cls, name, capacity, interval_ms):
+        """行情进程调用: 新建共享内存; 已存在且格式相同时沿用"""
+        size = HEADER * 8 + capacity * SLOT.itemsize
+        try:
+            shm = shared_memory.SharedMemory(name, create=True, size=size)
+        except FileExistsError:
+            shm = shared_memory.SharedMemory(name)
+            header = np.ndarray((HEADER,), dtype='<i8', buffer=shm.buf)
+            if header[MAGIC_I] == MAGIC and header[CAPACITY_I] == capacity and header[INTERVAL_I] == interval_ms:
+                logger.info(f"Reuse market bus {name}: {int(header[COUNT_I])} candles")
+                del header
+                _untrack(shm)
+                return cls(shm)
+            del header
+            shm.close()
+            shm.unlink()  # 同时取消登记, 不能先 _untrack, 否则 resource_tracker 重复取消时报 KeyError
+            shm = shared_memory.SharedMemory(name, create=True, size=size)
+        _untrack(shm)
+        header = np.ndarray((HEADER,), dtype='<i8', buffer=shm.buf)
+        header[:] = 0
+        header[CAPACITY_I] = capacity
+        header[INTERVAL_I] = interval_ms
+        header[MAGIC_I] = MAGIC  # 最后写入, 读者看到 magic 时其他字段已就绪
+        del header
+        return cls(shm)
+
+    @classmethod
+    def attach(cls, name):
+        """策略进程调用: 共享内存不存在或未初始化时返回 None"""
+        try:
+            shm = shared_memory.SharedMemory(name)
+        except FileNotFoundError:
+            return None
+        _untrack(shm)
+        if np.ndarray((1,), dtype='<i8', buffer=shm.buf)[0] != MAGIC:
+            shm.close()
+            return None
+        return cls(shm)
+
+    @property
+    def count(self):
+        return int(self.header[COUNT_I])
+
+    @property
+    def interval_ms(self):
+        return int(self.header[INTERVAL_I])
+
+    @property
+    def heartbeat(self):
+        return int(self.header[HEARTBEAT_I])
+
+    @property
+    def last_ts(self):
+        count = self.count
+        return int(self.slots['ts'][(count - 1) % self.capacity]) if count else None
+
+    def write(self, ts, open_, high, low, close, volume):
+        """只能由一个线程调用"""
+        n = int(self.header[COUNT_I])
+        k = n % self.capacity
+        seq = self.seqs[k]
+        self.seqs[k] = seq + 1
+        self.slots[k] = (seq + 1, ts, open_, high, low, close, volume)
+        self.seqs[k] = seq + 2
+        self.header[COUNT_I] = n + 1
+
+    def beat(self):
+        self.header[HEARTBEAT_I] = int(time.time() * 1000)
+
+    def read(self, n):
+        """
+        第 n 根K线
+        :return: (ts, open, high, low, close, volume); 已被覆盖返回 False; 正在写入返回 None
+        """
+        k = n % self.capacity
+        expected = 2 * (n // self.capacity + 1)
+        seq = self.seqs[k]
+        if seq < expected:
+            return None
+        row = self.slots[k].item()
+        if seq != expected or self.seqs[k] != seq:
+            return False if seq > expected else None
+        return row[1:]
+
+    def close(self):
+        del self.header, self.slots, self.seqs
+        self.shm.close()
+
+
+def publish(store, ring, prefetch=0, stop=None):
+    """
+    行情进程中每个 (交易对, 周期) 一个线程: 把 store 的 websocket K线写入 ring, 只有这个线程写 ring
+    启动时先补齐 ring 中最后一根K线之后的缺失(ring 为空时预加载 prefetch 根), 断线、补数据由 store 处理
+    :param store: CCXTStore, feed=candle
+    :param stop: threading.Event, 设置后退出
+    """
+    interval_ms = ring.interval_ms
+    now = store.fetch_time()
+    end = now - now % interval_ms
+    start = ring.last_ts + interval_ms if ring.last_ts is not None else end - prefetch * interval_ms
+    if start < end:
+        rows = store.fetch_candles(start, end)
+        for row in rows:
+            ohlcv = parse_candle(row)
+            ring.write(int(row[0]), ohlcv[1], ohlcv[2], ohlcv[3], ohlcv[4], ohlcv[-2])
+        logger.info(f"Market bus {store.kline_symbol} {store.kline_interval}: {len(rows)} history candles")
+    last_ts = ring.last_ts
+    if last_ts is not None:
+        store.wsc.seed(last_ts)
+
+    timeout = store._stall_timeout()
+    silence = 0.0
+    while stop is None or not stop.is_set():
+        ring.beat()
+        ohlcv = store.wsc.get_ohlcv(timeout=1)
+        if ohlcv is None:
+            silence += 1
+            if timeout is not None and silence >= timeout:
+                store._on_stall()
+                silence = 0.0
+            continue
+        silence = 0.0
+        ts = int(ohlcv[0].timestamp() * 1000)
+        if last_ts is not None and ts <= last_ts:
+            continue
+        ring.write(ts, ohlcv[1], ohlcv[2], ohlcv[3], ohlcv[4], ohlcv[-2])
+        last_ts = ts
+
+
+class MarketBusReader:
+    """
+    从共享内存读取K线, 接口与 OKXKlineSocket 相同(get_ohlcv / seed / reconnect / close)
+    行情进程还没有启动时持续等待
+    """
+    POLL_MIN = 0.00005
+    POLL_MAX = 0.001  # 分钟K线不需要更低的延迟
+
+    def __init__(self, symbol, interval, prefix='cryptotrader'):
+        self.name = segment_name(symbol, interval, prefix)
+        self.ring = None
+        self.cursor = None  # 下一根要读取的K线序号
+        self.last_ts = None
+        self._attach()
+
+    def _attach(self):
+        if self.ring is None:
+            self.ring = CandleRing.attach(self.name)
+            if self.ring is not None:
+                self.cursor = self.ring.count  # 只读取之后发布的K线, 历史K线见 history
+                logger.info(f"Attach market bus {self.name}: {self.cursor} candles")
+        return self.ring
+
+    def history(self, limit):
+        """环形缓冲中最近 limit 根K线, 用于预加载, 不请求交易所"""
+        if self._attach() is None:
+            return []
+        count = self.ring.count
+        rows = []
+        for n in range(max(0, count - min(limit, self.ring.capacity)), count):
+            row = self.ring.read(n)
+            if row:
+                rows.append(self._ohlcv(row))
+        return rows
+
+    @staticmethod
+    def _ohlcv(row):
+        # 与 OKXKlineSocket 的字段顺序一致, 倒数第二个为成交量
+        return [datetime.fromtimestamp(row[0] / 1000), row[1], row[2], row[3], row[4], row[5], 1.0]
+
+    def seed(self, last_ts):
+        if self.last_ts is None or last_ts > self.last_ts:
+            self.last_ts = last_ts
+
+    def get_ohlcv(self, timeout=None):
+        """
+        :param timeout: 等待秒数, 超时返回 None
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        poll = self.POLL_MIN
+        while True:
+            if self._attach() is not None and self.cursor < self.ring.count:
+                row = self.ring.read(self.cursor)
+                if row is False:
+                    skip_to = self.ring.count - self.ring.capacity + 1
+                    logger.warning(f"Market bus {self.name} overrun, skip {skip_to - self.cursor} candles")
+                    self.cursor = skip_to
+                    continue
+                if row is not None:
+                    self.cursor += 1
+                    if self.last_ts is not None and row[0] <= self.last_ts:
+                        continue
+                    self.last_ts = row[0]
+                    return self._ohlcv(row)
+            if deadline is not None and time.monotonic() >= deadline:
+                return None
+            time.sleep(poll)
+            poll = min(poll * 2, self.POLL_MAX)
+
+    def reconnect(self):
+        """K线长时间没有更新: 检查行情进程是否存活"""
+        if self.ring is None:
+            logger.warning(f"Market bus {self.name} not found, is the bus daemon running?")
+            return
+        age = time.time() - self.ring.heartbeat / 1000
+        logger.warning(f"Market bus {self.name}: last candle {self.ring.last_ts}, heartbeat {age:.0f}s ago")
+
+    def close(self):
+        if self.ring is not None:
+            self.ring.close()
+            self.ring = None
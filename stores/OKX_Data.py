@@ -1,3 +1,6 @@
+import base64
+import hashlib
+import hmac
 import time
 from datetime import datetime
 import json
@@ -6,45 +9,102 @@ import threading
 import queue
 import websocket
 
+from utils import log
+from .Account import Account
+from .OrderBook import OrderBook
 
-class OKXKlineSocket:
-    def __init__(self, symbol, interval, sandbox):
-        if sandbox:
-            self.url = "wss://wspap.okx.com:8443/ws/v5/business"
-        else:
-            self.url = "wss://ws.okx.com:8443/ws/v5/business"
 
-        self.symbol = symbol
-        self.interval = interval
-        self.ohlcv = queue.Queue()
+class OKXWebSocket:
+    """
+    OKX websocket 公共部分: 连接、定时 ping、订阅, 子类实现 _args 和 _handle_data
+    连接断开后按指数退避自动重连并重新订阅, 超过两个 ping 周期没有任何消息视为连接失效, 主动断开重连
+    """
+    ENDPOINT = 'business'
+    RECONNECT_DELAY = 1  # 首次重连等待秒数, 之后每次翻倍
+    MAX_RECONNECT_DELAY = 60
+
+    def __init__(self, sandbox, base_url=None):
+        """
+        :param sandbox: 是否连接模拟盘
+        :param base_url: 替换默认地址前缀, 如 ws://127.0.0.1:8080/ws/v5
+        """
+        if base_url:
+            self.url = f"{base_url}/{self.ENDPOINT}"
+        elif sandbox:
+            self.url = f"wss://wspap.okx.com:8443/ws/v5/{self.ENDPOINT}"
+        else:
+            self.url = f"wss://ws.okx.com:8443/ws/v5/{self.ENDPOINT}"
 
         self.ping_interval = 29  # 定时器间隔时间（秒）
         self.ping_message = 'ping'  # ping 消息
         self.timer = None
+        self.last_message = time.time()
+        self.connects = 0  # 成功建立连接的次数, 大于 1 表示发生过重连
+        self._closed = False
 
+        self.ws = self._create()
+        self.ws_thread = threading.Thread(target=self._run_forever)
+        self.ws_thread.daemon = True
+        self.ws_thread.start()
 
-        self.ws = websocket.WebSocketApp(
+    def _create(self):
+        ws = websocket.WebSocketApp(
             self.url,
             on_message=self._receive_message,
             on_error=self._on_error,
             on_close=self._on_close,
         )
+        ws.on_open = self._subscribe
+        return ws
 
-        self.ws.on_open = self._subscribe
-        self.ws_thread = threading.Thread(target=self.ws.run_forever)
-        self.ws_thread.daemon = True
-        self.ws_thread.start()
+    def _run_forever(self):
+        delay = self.RECONNECT_DELAY
+        while True:
+            connects = self.connects
+            # ping_timeout 只作为等待消息的超时, 否则从其他线程 close 后可能一直阻塞在 select
+            self.ws.run_forever(ping_timeout=1)
+            if self._closed:
+                return
+            if self.connects != connects:
+                delay = self.RECONNECT_DELAY  # 上次连接成功过, 退避时间重新计算
+            logger.warning(f"WebSocket {self.url} disconnected, reconnect in {delay}s")
+            time.sleep(delay)
+            delay = min(delay * 2, self.MAX_RECONNECT_DELAY)
+            if self._closed:
+                return
+            self.ws = self._create()
+
+    def reconnect(self):
+        """断开当前连接, 由 _run_forever 重新连接"""
+        logger.warning(f"WebSocket {self.url} reconnecting")
+        self.ws.close()
+
+    def close(self):
+        """关闭连接, 不再重连"""
+        self._closed = True
+        if self.timer:
+            self.timer.cancel()
+        self.ws.close()
 
     def _start_timer(self):
         if self.timer:
             self.timer.cancel()  # 取消之前的定时器
         self.timer = threading.Timer(self.ping_interval, self._send_ping)
+        self.timer.daemon = True  # 不阻止进程退出
         self.timer.start()
 
     def _send_ping(self):
+        if time.time() - self.last_message > self.ping_interval * 2:
+            # 上次 ping 之后没有收到 pong, 连接已失效但未触发 on_close
+            logger.warning(f"WebSocket {self.url} no response for {time.time() - self.last_message:.0f}s")
+            self.reconnect()
+            return
         if self.ws:
             print("Sending ping to server...")
-            self.ws.send(str(self.ping_message))
+            try:
+                self.ws.send(str(self.ping_message))
+            except websocket.WebSocketException as e:
+                logger.warning(f"Send ping failed: {e}")
         self._start_timer()  # 重启定时器
 
     def _on_error(self, ws, error):
@@ -55,43 +115,310 @@ class OKXKlineSocket:
         if self.timer:
             self.timer.cancel()  # WebSocket 关闭时取消定时器
 
+    def _args(self):
+        raise NotImplementedError
+
     def _subscribe(self, ws):
         subscribe_message = {
             "op": "subscribe",
-            "args": [{
-                "channel": "candle" + self.interval,
-                "instId": self.symbol
-            }]
+            "args": self._args(),
         }
         ws.send(json.dumps(subscribe_message))
         logger.info(f"Sent: {subscribe_message}")
+        self.last_message = time.time()
+        self.connects += 1
+        if self.connects > 1:
+            self._on_reconnect()
         self._start_timer()  # 连接建立后启动定时器
 
+    def _on_reconnect(self):
+        """重连并重新订阅后调用, 子类处理断线期间丢失的数据"""
+        pass
+
     def _receive_message(self, ws, message):
+        self.last_message = time.time()
         self._start_timer()  # 重置定时器
+        if message == 'pong':
+            return
         self._handle_message(message)
 
     def _handle_message(self, message):
         message_data = json.loads(message)
-        if "event" in message_data and message_data["event"] == "subscribe":
+        if "event" in message_data and message_data["event"] in ("subscribe", "unsubscribe"):
             logger.info(message_data)
         elif "arg" in message_data and "data" in message_data:
-            self._handle_kline_data(message_data)
+            self._handle_data(message_data)
         else:
             logger.warning(f"Unhandled message: {message_data}")
 
+    def _handle_data(self, message):
+        raise NotImplementedError
+
+
+def parse_candle(kline_data):
+    """candle 频道/REST 原始K线 -> [datetime, open, high, low, close, vol, volCcy, volCcyQuote, confirm]"""
+    ohlcv = [float(v) for v in kline_data]
+    ohlcv[0] = datetime.fromtimestamp(int(ohlcv[0] / 1000))
+    return ohlcv
+
+
+class OKXKlineSocket(OKXWebSocket):
+    """
+    K线频道, 只推送已确认的K线
+    记录最后一根K线的时间: 重连后重复推送的K线直接丢弃; 发现时间不连续时调用 backfill
+    按 REST 补齐缺失的区间, 补齐的K线按时间顺序插在当前K线之前
+    """
+
+    def __init__(self, symbol, interval, sandbox, base_url=None, interval_ms=None, backfill=None):
+        """
+        :param interval_ms: K线周期毫秒数, None 时不检查缺失
+        :param backfill: backfill(from_ms, to_ms) 返回 [from_ms, to_ms) 内的原始K线(字段同 candle 频道), 按时间升序
+        """
+        self.symbol = symbol
+        self.interval = interval
+        self.interval_ms = interval_ms
+        self.backfill = backfill
+        self.last_ts = None  # 最后一根放入队列的K线时间(ms)
+        self.ohlcv = queue.Queue()
+        self._lock = threading.Lock()
+        super(OKXKlineSocket, self).__init__(sandbox, base_url)
+
+    def _args(self):
+        return [{
+            "channel": "candle" + self.interval,
+            "instId": self.symbol
+        }]
+
+    def _handle_data(self, message):
+        self._handle_kline_data(message)
+
     def _handle_kline_data(self, message):
         kline_data = message["data"][0]
         # print(kline_data)
         if int(kline_data[-1]) != 0:
-            logger.info(f"Kline data: {kline_data}")
-            ohlcv = [float(v) for v in kline_data]
-            ohlcv[0] = datetime.fromtimestamp(int(ohlcv[0] / 1000))
-            self.ohlcv.put(ohlcv)
+            with self._lock:
+                ts = int(kline_data[0])
+                if self.last_ts is not None:
+                    if ts <= self.last_ts:
+                        return  # 重连后重复推送
+                    if self.interval_ms and ts - self.last_ts > self.interval_ms:
+                        self._backfill(self.last_ts + self.interval_ms, ts)
+                self.ohlcv.put(parse_candle(kline_data))
+                self.last_ts = ts
+            # 每根K线一条, 重连后重复推送的不记录
+            if log.enabled('DEBUG'):
+                logger.debug(f"Kline data: {kline_data}")
+
+    def seed(self, last_ts):
+        """已通过 REST 加载到 last_ts 的K线, 之前的推送视为重复, 之后的缺失需要补齐"""
+        with self._lock:
+            if self.last_ts is None or last_ts > self.last_ts:
+                self.last_ts = last_ts
+
+    def fill_gap(self, now_ms):
+        """长时间没有收到K线时调用: 补齐最后一根K线到 now_ms 之间已经完成的K线"""
+        if not self.interval_ms:
+            return
+        with self._lock:
+            if self.last_ts is None:
+                return
+            end = now_ms - now_ms % self.interval_ms  # 当前未完成K线的开始时间
+            if end - self.last_ts > self.interval_ms:
+                self._backfill(self.last_ts + self.interval_ms, end)
+
+    def _backfill(self, from_ms, to_ms):
+        missing = (to_ms - from_ms) // self.interval_ms
+        if self.backfill is None:
+            logger.warning(f"Kline gap {self.symbol}: {missing} bars missing from {from_ms}")
+            return
+        try:
+            rows = self.backfill(from_ms, to_ms)
+        except Exception as e:
+            logger.error(f"Backfill {self.symbol} [{from_ms}, {to_ms}) failed: {e}")
+            return
+        filled = 0
+        for row in rows:
+            ts = int(row[0])
+            if from_ms <= ts < to_ms and ts > self.last_ts:
+                self.ohlcv.put(parse_candle(row))
+                self.last_ts = ts
+                filled += 1
+        if filled < missing:
+            logger.warning(f"Backfill {self.symbol} [{from_ms}, {to_ms}): {filled}/{missing} bars")
+        else:
+            logger.info(f"Backfill {self.symbol} [{from_ms}, {to_ms}): {filled} bars")
+
+    def get_ohlcv(self, timeout=None):
+        """
+        :param timeout: 等待秒数, 超时返回 None
+        """
+        try:
+            return self.ohlcv.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
 
-    def get_ohlcv(self):
-        return self.ohlcv.get()
+class OKXTradeSocket(OKXWebSocket):
+    """
+    订阅逐笔成交(trades 频道), 用 builder 聚合成任意周期的K线
+    OKX 没有 1s 以下的K线频道, 且K线频道要等交易所推送 confirm, 自行聚合延迟更低
+    """
+    ENDPOINT = 'public'
+
+    def __init__(self, symbol, builder, sandbox, base_url=None):
+        """
+        :param builder: TimeBarBuilder / VolumeBarBuilder
+        """
+        self.symbol = symbol
+        self.builder = builder
+        self.ohlcv = queue.Queue()
+        self._lock = threading.Lock()
+        super(OKXTradeSocket, self).__init__(sandbox, base_url)
+
+        # 时间K线在区间结束时即使没有新成交也要及时完成
+        if getattr(builder, 'interval_ms', None):
+            self.flush_thread = threading.Thread(target=self._flush_forever)
+            self.flush_thread.daemon = True
+            self.flush_thread.start()
+
+    def _args(self):
+        return [{
+            "channel": "trades",
+            "instId": self.symbol
+        }]
+
+    def _handle_data(self, message):
+        with self._lock:
+            for trade in message["data"]:
+                bars = self.builder.add_trade(int(trade["ts"]), float(trade["px"]), float(trade["sz"]))
+                for bar in bars:
+                    self.ohlcv.put(bar)
+
+    def _on_reconnect(self):
+        # 逐笔成交无法按 REST 补齐, 断线期间的K线只包含重连前后的成交
+        logger.warning(f"Trades {self.symbol} resubscribed, trades during disconnection are missing")
+
+    def _flush_forever(self):
+        interval = self.builder.interval_ms
+        while True:
+            now = int(time.time() * 1000)
+            time.sleep((interval - now % interval) / 1000)
+            with self._lock:
+                for bar in self.builder.flush(int(time.time() * 1000)):
+                    self.ohlcv.put(bar)
+
+    def get_ohlcv(self, timeout=None):
+        try:
+            return self.ohlcv.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+
+class OKXOrderBookSocket(OKXWebSocket):
+    """
+    维护本地 L2 订单簿
+    books5: 每次推送完整的 5 档；books: 首次推送快照, 之后为增量, 用 checksum 校验, 不一致时重新订阅
+    """
+    ENDPOINT = 'public'
+
+    def __init__(self, symbol, channel, sandbox, base_url=None):
+        self.symbol = symbol
+        self.channel = channel
+        self.book = OrderBook(depth=5 if channel == 'books5' else None)
+        super(OKXOrderBookSocket, self).__init__(sandbox, base_url)
+
+    def _args(self):
+        return [{
+            "channel": self.channel,
+            "instId": self.symbol
+        }]
+
+    def _on_reconnect(self):
+        # 重新订阅后交易所会先推送快照
+        self.book.invalidate()
+
+    def _handle_data(self, message):
+        data = message["data"][0]
+        # 在订单簿的锁内校验, 校验失败的订单簿不会被 cerebro 线程读到
+        if message.get("action", "snapshot") == "snapshot":
+            valid = self.book.apply_snapshot(data["bids"], data["asks"], data["ts"], data.get("checksum"))
+        elif self.book.valid:
+            valid = self.book.apply_update(data["bids"], data["asks"], data["ts"], data.get("checksum"))
+        else:
+            return
+
+        if not valid:
+            logger.warning(f"Order book checksum mismatch {self.symbol}, resubscribe")
+            self.ws.send(json.dumps({"op": "unsubscribe", "args": self._args()}))
+            self.ws.send(json.dumps({"op": "subscribe", "args": self._args()}))
+
+
+class OKXAccountSocket(OKXWebSocket):
+    """
+    私有频道 account / positions: 登录后订阅, 推送的余额、权益、保证金和持仓写入 Account
+    每次(重新)订阅后的第一次推送为快照, 之前 Account.ready 为 False
+    """
+    ENDPOINT = 'private'
+
+    def __init__(self, api_key, secret, passphrase, sandbox, base_url=None, inst_type='ANY'):
+        self.api_key = api_key
+        self.secret = secret
+        self.passphrase = passphrase
+        self.inst_type = inst_type
+        self.account = Account()
+        self._snapshot = set()  # 已收到快照的频道
+        super(OKXAccountSocket, self).__init__(sandbox, base_url)
+
+    def _args(self):
+        return [{"channel": "account"}, {"channel": "positions", "instType": self.inst_type}]
+
+    def _login_args(self):
+        timestamp = str(int(time.time()))
+        digest = hmac.new(self.secret.encode(), f"{timestamp}GET/users/self/verify".encode(), hashlib.sha256).digest()
+        return {"apiKey": self.api_key, "passphrase": self.passphrase, "timestamp": timestamp,
+                "sign": base64.b64encode(digest).decode()}
+
+    def _subscribe(self, ws):
+        # 先登录, 收到登录成功后再订阅
+        self._snapshot.clear()
+        self.account.invalidate()
+        ws.send(json.dumps({"op": "login", "args": [self._login_args()]}))
+        self.last_message = time.time()
+        self._start_timer()
+
+    def reconnect(self):
+        # 连接失效(如长时间没有 pong)时立即作废, 不等 on_close
+        self.account.invalidate()
+        super(OKXAccountSocket, self).reconnect()
+
+    def _on_close(self, ws, close_status_code, close_msg):
+        # 断开后到重新订阅收到快照之前(含重连退避时间), 调用方退回 REST 或本地记账
+        self.account.invalidate()
+        super(OKXAccountSocket, self)._on_close(ws, close_status_code, close_msg)
+
+    def _handle_message(self, message):
+        message_data = json.loads(message)
+        event = message_data.get("event")
+        if event == "login":
+            if message_data.get("code") == "0":
+                logger.info("OKX private websocket login success")
+                super(OKXAccountSocket, self)._subscribe(self.ws)
+            else:
+                logger.error(f"OKX private websocket login failed: {message_data}")
+        elif event == "error":
+            logger.error(f"OKX private websocket error: {message_data}")
+        else:
+            super(OKXAccountSocket, self)._handle_message(message)
 
+    def _handle_data(self, message):
+        channel = message["arg"]["channel"]
+        snapshot = channel not in self._snapshot
+        self._snapshot.add(channel)
+        if channel == "account":
+            for data in message["data"]:
+                self.account.apply_account(data)
+        elif channel == "positions":
+            self.account.apply_positions(message["data"], snapshot=snapshot)
 
 
 if __name__ == "__main__":
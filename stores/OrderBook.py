@@ -0,0 +1,144 @@
+import threading
+import time
+import zlib
+from bisect import bisect_left
+
+
+class _BookSide:
+    """订单簿一侧, 按价格排序的平行数组; 保留原始字符串用于校验和"""
+
+    def __init__(self, descending):
+        self.descending = descending
+        self.keys = []  # 排序键: 卖盘为价格, 买盘为负价格
+        self.prices = []
+        self.sizes = []
+        self.raw = []  # (价格字符串, 数量字符串)
+
+    def clear(self):
+        self.keys.clear()
+        self.prices.clear()
+        self.sizes.clear()
+        self.raw.clear()
+
+    def update(self, px, sz):
+        price = float(px)
+        size = float(sz)
+        key = -price if self.descending else price
+        i = bisect_left(self.keys, key)
+        exists = i < len(self.keys) and self.keys[i] == key
+        if size == 0:
+            if exists:
+                del self.keys[i], self.prices[i], self.sizes[i], self.raw[i]
+        elif exists:
+            self.sizes[i] = size
+            self.raw[i] = (px, sz)
+        else:
+            self.keys.insert(i, key)
+            self.prices.insert(i, price)
+            self.sizes.insert(i, size)
+            self.raw.insert(i, (px, sz))
+
+    def truncate(self, depth):
+        del self.keys[depth:], self.prices[depth:], self.sizes[depth:], self.raw[depth:]
+
+    def fill_price(self, size):
+        """吃掉 size 数量需要挂到的价格, 深度不足时返回 None"""
+        total = 0.0
+        for price, level in zip(self.prices, self.sizes):
+            total += level
+            if total >= size:
+                return price
+        return None
+
+
+class OrderBook:
+    # OKX 校验和取买卖各前 25 档
+    CHECKSUM_DEPTH = 25
+
+    def __init__(self, depth=None):
+        """
+        L2 订单簿本地副本, websocket 线程写入, cerebro 线程读取, 读写都持有锁
+        :param depth: 保留的最大档位数, None 表示不限制
+        """
+        self.depth = depth
+        self.bids = _BookSide(descending=True)
+        self.asks = _BookSide(descending=False)
+        self.ts = 0  # 交易所时间戳(毫秒)
+        self.updated = 0  # 本地接收时间(秒)
+        self.valid = False
+        self._lock = threading.Lock()
+
+    def apply_snapshot(self, bids, asks, ts, checksum=None):
+        """
+        :param checksum: 交易所推送的校验和, 不一致时订单簿失效
+        :return: 订单簿是否有效
+        """
+        with self._lock:
+            self.bids.clear()
+            self.asks.clear()
+            self._apply(bids, asks, ts)
+            self.valid = self._verify(checksum)
+            return self.valid
+
+    def apply_update(self, bids, asks, ts, checksum=None):
+        with self._lock:
+            self._apply(bids, asks, ts)
+            if not self._verify(checksum):
+                self.valid = False
+            return self.valid
+
+    def invalidate(self):
+        """等待下一次快照"""
+        with self._lock:
+            self.valid = False
+
+    def _apply(self, bids, asks, ts):
+        for level in bids:
+            self.bids.update(level[0], level[1])
+        for level in asks:
+            self.asks.update(level[0], level[1])
+        if self.depth:
+            self.bids.truncate(self.depth)
+            self.asks.truncate(self.depth)
+        self.ts = int(ts)
+        self.updated = time.time()
+
+    def _verify(self, checksum):
+        return checksum is None or self._checksum() == int(checksum)
+
+    def checksum(self):
+        """OKX 校验和: 买卖前 25 档交替拼接 price:size, crc32 后转为有符号 32 位整数"""
+        with self._lock:
+            return self._checksum()
+
+    def _checksum(self):
+        parts = []
+        for i in range(self.CHECKSUM_DEPTH):
+            if i < len(self.bids.raw):
+                parts.extend(self.bids.raw[i])
+            if i < len(self.asks.raw):
+                parts.extend(self.asks.raw[i])
+        crc = zlib.crc32(':'.join(parts).encode())
+        return crc - (1 << 32) if crc >= (1 << 31) else crc
+
+    def best_bid(self):
+        with self._lock:
+            return self.bids.prices[0] if self.bids.prices else None
+
+    def best_ask(self):
+        with self._lock:
+            return self.asks.prices[0] if self.asks.prices else None
+
+    def age(self):
+        return time.time() - self.updated
+
+    def fill_price(self, is_buy, size):
+        """
+        按深度计算限价单价格: 买单沿卖盘累加, 卖单沿买盘累加, 直到数量足够
+        :return: 价格, 订单簿无效或深度不足时返回 None
+        """
+        with self._lock:
+            if not self.valid:
+                return None
+            side = self.asks if is_buy else self.bids
+            return side.fill_price(size)
@@ -0,0 +1,287 @@
+"""
+订单历史: 每次订单状态变化和每笔成交追加写入按列存储的分区文件, 用于事后的订单分析
+
+    <path>/orders/<symbol>/<YYYYMMDD>/<块>.npz   订单状态变化, 每列一个数组
+    <path>/fills/<symbol>/<YYYYMMDD>/<块>.npz    成交
+
+- 交易线程只把记录放入内存缓冲, 后台线程每 flush_interval 秒或缓冲达到 batch_size 条时批量写出
+- 每次写出新建一个块文件(先写临时文件再改名), 已有文件从不修改; 过去日期的多个块由后台线程合并为一个
+- 按交易对、日期分区, 查询时只读取时间范围内的分区
+
+    history = OrderHistory('~/.cryptotrader/orders')
+    broker = OKXBroker(store=store, history=history, ...)
+    history.report(start='2024-01-01', end='2024-04-01')
+"""
+import itertools
+import os
+import threading
+import time
+from datetime import datetime, timezone
+
+import backtrader as bt
+import numpy as np
+import pandas as pd
+from loguru import logger
+
+from utils import analytics
+
+# 表名 -> 列名, symbol 是分区键, 不作为列保存
+TABLES = {
+    'orders': ('ts', 'order_id', 'side', 'exectype', 'status', 'size', 'price', 'signal_price',
+               'filled', 'average', 'fee'),
+    'fills': ('ts', 'order_id', 'side', 'size', 'price', 'fee', 'signal_price'),
+}
+
+# 订单不再变化的状态
+FINAL_STATUS = (bt.Order.Completed, bt.Order.Canceled, bt.Order.Expired, bt.Order.Margin, bt.Order.Rejected)
+
+
+def _ms(value):
+    """datetime / 日期字符串 / 毫秒时间戳 -> 毫秒时间戳, naive datetime 按 UTC"""
+    if value is None or isinstance(value, (int, np.integer)):
+        return value
+    ts = pd.Timestamp(value)
+    if ts.tzinfo is None:
+        ts = ts.tz_localize('UTC')
+    return int(ts.timestamp() * 1000)
+
+
+def _day(ts):
+    return datetime.fromtimestamp(ts / 1000, tz=timezone.utc).strftime('%Y%m%d')
+
+
+def _float(value):
+    return float('nan') if value is None else float(value)
+
+
+class OrderHistory:
+    def __init__(self, path, flush_interval=1.0, batch_size=1000):
+        """
+        :param path: 存储目录
+        :param flush_interval: 后台线程写出间隔(秒)
+        :param batch_size: 缓冲记录数达到该值时立即写出
+        """
+        self.path = os.path.expanduser(path)
+        self.flush_interval = flush_interval
+        self.batch_size = batch_size
+        self._lock = threading.Lock()
+        self._buffer = {}  # (表名, symbol, 日期) -> [行, ...]
+        self._pending = 0
+        self._seq = itertools.count()
+        self._compacted = None  # 最近一次合并时的日期
+        self._wakeup = threading.Event()
+        self._closed = False
+        os.makedirs(self.path, exist_ok=True)
+        self._thread = threading.Thread(target=self._run, name='OrderHistory', daemon=True)
+        self._thread.start()
+
+    def _append(self, table, symbol, row):
+        key = (table, symbol, _day(row[0]))
+        with self._lock:
+            self._buffer.setdefault(key, []).append(row)
+            self._pending += 1
+            full = self._pending >= self.batch_size
+        if full:
+            self._wakeup.set()
+
+    @staticmethod
+    def _order_id(order):
+        # 被拒绝的订单可能没有交易所订单号, 用本地编号区分
+        return str((order.ccxt_order or {}).get('id') or f"ref{order.ref}")
+
+    def record_order(self, symbol, order, status=None, ts=None):
+        """
+        :param order: CCXTOrder
+        :param status: 记录的状态, 默认为订单当前状态
+        :param ts: 毫秒时间戳, 默认为当前时间
+        """
+        self._append('orders', symbol, (
+            ts or int(time.time() * 1000),
+            self._order_id(order),
+            order.ordtype,
+            order.exectype if order.exectype is not None else -1,
+            order.status if status is None else status,
+            _float(order.size),
+            _float(order.price),
+            _float(order.signal_price),
+            _float(order.executed.size or 0.0),
+            _float(order.executed.price or 0.0),
+            _float(order.executed.comm or 0.0),
+        ))
+
+    def record_fill(self, symbol, order, size, price, fee, ts=None):
+        """
+        :param size: 本次成交数量, 买入为正、卖出为负
+        :param ts: 毫秒时间戳, 默认取交易所最近成交时间, 没有时为当前时间
+        """
+        ccxt_order = order.ccxt_order or {}
+        self._append('fills', symbol, (
+            ts or ccxt_order.get('lastTradeTimestamp') or int(time.time() * 1000),
+            self._order_id(order),
+            order.ordtype,
+            abs(_float(size)),
+            _float(price),
+            _float(fee),
+            _float(order.signal_price),
+        ))
+
+    def _run(self):
+        while not self._closed:
+            self._wakeup.wait(self.flush_interval)
+            self._wakeup.clear()
+            try:
+                self.flush()
+                self._compact_past()
+            except Exception as e:
+                logger.error(f"Write order history failed: {e}")
+
+    def flush(self):
+        """把缓冲中的记录写出, 返回后之前记录的数据都可以查询到"""
+        with self._lock:
+            buffer, self._buffer, self._pending = self._buffer, {}, 0
+        for (table, symbol, day), rows in buffer.items():
+            columns = zip(*rows)
+            self._write(os.path.join(self.path, table, symbol, day),
+                        {name: np.array(values) for name, values in zip(TABLES[table], columns)})
+
+    def _write(self, directory, columns, name=None):
+        os.makedirs(directory, exist_ok=True)
+        if name is None:
+            name = f"{int(time.time() * 1000)}-{os.getpid()}-{next(self._seq)}"
+        file = os.path.join(directory, f"{name}.npz")
+        tmp = f"{file}.tmp"
+        with open(tmp, 'wb') as f:
+            np.savez(f, **columns)
+        os.replace(tmp, file)
+        return file
+
+    def _compact_past(self):
+        today = _day(time.time() * 1000)
+        if self._compacted == today:
+            return
+        self._compacted = today
+        for table in TABLES:
+            for symbol, day in self._partitions(table):
+                if day < today:
+                    self.compact(table, symbol, day)
+
+    def compact(self, table, symbol, day):
+        """把一个分区的多个块合并为一个, 读取时少打开文件"""
+        directory = os.path.join(self.path, table, symbol, day)
+        files = self._chunks(directory)
+        if len(files) < 2:
+            return
+        merged = self._write(directory, self._load(files, TABLES[table]), name=f"merged-{int(time.time() * 1000)}")
+        for file in files:
+            if file != merged:
+                os.remove(file)
+        logger.debug(f"Compact order history {directory}: {len(files)} chunks")
+
+    def _partitions(self, table):
+        root = os.path.join(self.path, table)
+        if not os.path.isdir(root):
+            return []
+        return [(symbol, day) for symbol in sorted(os.listdir(root))
+                for day in sorted(os.listdir(os.path.join(root, symbol)))]
+
+    @staticmethod
+    def _chunks(directory):
+        return sorted(os.path.join(directory, name) for name in os.listdir(directory) if name.endswith('.npz'))
+
+    @staticmethod
+    def _load(files, names):
+        parts = {name: [] for name in names}
+        for file in files:
+            with np.load(file) as chunk:
+                for name in names:
+                    parts[name].append(chunk[name])
+        return {name: np.concatenate(arrays) for name, arrays in parts.items()}
+
+    def read(self, table, symbol=None, start=None, end=None):
+        """
+        :param table: orders 或 fills
+        :param symbol: 交易对, None 为全部
+        :param start: 起始时间(含), datetime、日期字符串或毫秒时间戳
+        :param end: 结束时间(不含)
+        :return: DataFrame, 按时间排序, 含 symbol 列
+        """
+        start, end = _ms(start), _ms(end)
+        first = _day(start) if start is not None else None
+        last = _day(end) if end is not None else None
+        names = TABLES[table]
+        frames = []
+        for part_symbol, day in self._partitions(table):
+            if symbol is not None and part_symbol != symbol:
+                continue
+            if (first is not None and day < first) or (last is not None and day > last):
+                continue
+            files = self._chunks(os.path.join(self.path, table, part_symbol, day))
+            if not files:
+                continue
+            columns = self._load(files, names)
+            mask = np.ones(len(columns['ts']), dtype=bool)
+            if start is not None:
+                mask &= columns['ts'] >= start
+            if end is not None:
+                mask &= columns['ts'] < end
+            frame = pd.DataFrame({name: values[mask] for name, values in columns.items()})
+            frame.insert(0, 'symbol', part_symbol)
+            frames.append(frame)
+        if not frames:
+            return pd.DataFrame(columns=('symbol',) + names)
+        df = pd.concat(frames, ignore_index=True)
+        return df.sort_values('ts', kind='stable', ignore_index=True)
+
+    def report(self, symbol=None, start=None, end=None):
+        """
+        按交易对汇总:
+        orders       订单数
+        completed / canceled / rejected  各最终状态的订单数
+        fill_ratio   已结束订单的成交数量 / 委托数量
+        fills        成交笔数
+        notional     成交额
+        slippage_bps 成交价相对信号价格的滑点(万分之一), 按成交额加权, 正值为不利
+        fees         手续费合计(交易所返回的手续费币种, 现货买入通常为基础币)
+        trades / win_rate / profit_factor  按成交还原的逐笔交易(仓位归零为一笔, 不含手续费), 见 analytics.trades_from_fills
+        :return: DataFrame, 每个交易对一行
+        """
+        orders = self.read('orders', symbol, start, end)
+        fills = self.read('fills', symbol, start, end)
+        rows = {}
+        if len(orders):
+            final = orders.groupby(['symbol', 'order_id'], sort=False).tail(1)
+            for name, group in final.groupby('symbol'):
+                done = group[group['status'].isin(FINAL_STATUS)]
+                size = done['size'].sum()
+                rows[name] = {
+                    'orders': len(group),
+                    'completed': int((group['status'] == bt.Order.Completed).sum()),
+                    'canceled': int((group['status'] == bt.Order.Canceled).sum()),
+                    'rejected': int((group['status'] == bt.Order.Rejected).sum()),
+                    'fill_ratio': done['filled'].sum() / size if size else np.nan,
+                }
+        if len(fills):
+            notional = fills['size'] * fills['price']
+            # 买入成交价高于信号价、卖出低于信号价为不利滑点
+            direction = np.where(fills['side'] == bt.Order.Buy, 1.0, -1.0)
+            slippage = direction * (fills['price'] / fills['signal_price'] - 1)
+            fills = fills.assign(notional=notional, weighted=slippage * notional,
+                                 signed=fills['signal_price'].notna() * notional)
+            for name, group in fills.groupby('symbol'):
+                signed = group['signed'].sum()
+                rows.setdefault(name, {}).update({
+                    'fills': len(group),
+                    'notional': group['notional'].sum(),
+                    'slippage_bps': group['weighted'].sum() / signed * 1e4 if signed else np.nan,
+                    'fees': group['fee'].sum(),
+                })
+                sizes = np.where(group['side'] == bt.Order.Buy, group['size'], -group['size'])
+                stats = analytics.trade_stats(analytics.trades_from_fills(sizes, group['price']))
+                rows[name].update({key: stats[key] for key in ('trades', 'win_rate', 'profit_factor')})
+        return pd.DataFrame.from_dict(rows, orient='index').rename_axis('symbol')
+
+    def close(self):
+        self._closed = True
+        self._wakeup.set()
+        self._thread.join()
+        self.flush()
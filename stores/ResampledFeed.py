@@ -0,0 +1,69 @@
+"""
+由 CCXTStore 的基础K线增量合成的更大周期K线, 不额外订阅或请求交易所
+
+    store = CCXTStore(symbol='FIL-USDT', interval='1m', ...)
+    m15 = store.resample('15m')
+    cerebro.adddata(store)
+    cerebro.adddata(m15)       # 策略中为 self.datas[1]
+
+- 区间按 interval 对 UTC 时间戳取整对齐, 与 _interval_to_milliseconds 一致, 如 15m 为 00/15/30/45 分
+- 区间最后一根基础K线送入时完成, 不等下一根; 缺失基础K线时由下一个区间的第一根K线触发完成
+- 时间取触发完成的基础K线时间, 与基础K线在同一次 next 中送达策略; 区间起点见 bar_start
+- 预加载、快照恢复的历史K线和 websocket 实时K线都经过 CCXTStore._set_lines, 合成方式相同
+"""
+import collections
+
+import backtrader as bt
+
+from .BarBuilder import TimeBarBuilder
+
+
+class ResampledFeed(bt.DataBase):
+    params = (
+        ('interval_ms', 15 * 60 * 1000),  # 合成周期(毫秒), 须为基础周期的整数倍
+        ('base_interval_ms', 60 * 1000),  # 基础K线周期(毫秒)
+    )
+
+    def __init__(self):
+        super(ResampledFeed, self).__init__()
+        if self.p.interval_ms % self.p.base_interval_ms:
+            raise ValueError(f"Interval {self.p.interval_ms}ms is not a multiple of {self.p.base_interval_ms}ms")
+        self.builder = TimeBarBuilder(self.p.interval_ms)
+        self.bars = collections.deque()  # 已完成、等待送入 lines 的K线
+        self.bar_start = None  # 最近送入 lines 的K线的区间起点(datetime)
+        self._ended = False
+
+    def add_bar(self, dt, ts, open_, high, low, close, volume):
+        """
+        送入一根基础K线
+        :param dt: 基础K线时间(bt.date2num), 作为完成的K线的时间
+        :param ts: 基础K线起点的毫秒时间戳, 用于区间对齐
+        """
+        bars = self.builder.add_bar(ts, open_, high, low, close, volume)
+        bars.extend(self.builder.flush(ts + self.p.base_interval_ms))
+        for bar in bars:
+            self.bars.append((dt, bar))
+
+    def end(self):
+        """基础数据结束"""
+        self._ended = True
+
+    def haslivedata(self):
+        return bool(self.bars)
+
+    def islive(self):
+        return True
+
+    def _load(self):
+        if not self.bars:
+            # 没有完成的K线: 实时模式返回 None 等待下一根, 基础数据结束时返回 False
+            return False if self._ended else None
+        dt, bar = self.bars.popleft()
+        self.bar_start = bar[0]
+        self.lines.datetime[0] = dt
+        self.lines.open[0] = bar[1]
+        self.lines.high[0] = bar[2]
+        self.lines.low[0] = bar[3]
+        self.lines.close[0] = bar[4]
+        self.lines.volume[0] = bar[5]
+        return True
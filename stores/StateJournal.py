@@ -0,0 +1,92 @@
+import json
+import os
+import threading
+import time
+
+from loguru import logger
+
+
+class StateJournal:
+    def __init__(self, path, compact_every=1000, fsync=True):
+        """
+        追加写入的状态日志, 每行一条记录 {"key": ..., "ts": ..., "state": ...}, 同一个 key 以最后一条为准
+        记录数达到 compact_every 后压缩为每个 key 一条
+        :param path: 日志文件路径
+        :param compact_every: 压缩阈值
+        :param fsync: 每次写入后是否落盘, 关闭后崩溃时可能丢失最后几条记录
+        """
+        self.path = path
+        self.compact_every = compact_every
+        self.fsync = fsync
+        self._lock = threading.Lock()
+        self._states = {}
+        self._last = {}  # key -> 最后一次写入的序列化结果, 未变化时不重复写入
+        self._records = self._replay()
+        self._file = open(self.path, 'a')
+
+    def _replay(self):
+        records = 0
+        if not os.path.exists(self.path):
+            return records
+
+        valid = 0  # 最后一条完整记录的结束位置
+        with open(self.path, 'rb') as f:
+            for line in f:
+                try:
+                    if not line.endswith(b'\n'):
+                        raise ValueError
+                    record = json.loads(line)
+                except ValueError:
+                    # 崩溃时最后一行可能只写了一半
+                    logger.warning(f"Skip broken journal record: {line[:100]}")
+                    break
+                self._states[record['key']] = record['state']
+                valid += len(line)
+                records += 1
+
+        # 截掉不完整的尾部, 否则后续记录会接在半行之后
+        if valid != os.path.getsize(self.path):
+            with open(self.path, 'r+b') as f:
+                f.truncate(valid)
+        logger.info(f"Load state journal {self.path}: {records} records, keys: {list(self._states)}")
+        return records
+
+    def get(self, key, default=None):
+        return self._states.get(key, default)
+
+    def append(self, key, state):
+        data = json.dumps(state, sort_keys=True)
+        with self._lock:
+            if self._last.get(key) == data:
+                return
+            self._last[key] = data
+            self._states[key] = state
+            self._write(key, data)
+            self._records += 1
+            if self._records >= self.compact_every:
+                self._compact()
+
+    def _write(self, key, data, f=None):
+        f = f or self._file
+        f.write(f'{{"key": {json.dumps(key)}, "ts": {int(time.time() * 1000)}, "state": {data}}}\n')
+        f.flush()
+        if self.fsync:
+            os.fsync(f.fileno())
+
+    def compact(self):
+        with self._lock:
+            self._compact()
+
+    def _compact(self):
+        tmp = f"{self.path}.tmp"
+        with open(tmp, 'w') as f:
+            for key, state in self._states.items():
+                self._write(key, self._last.get(key) or json.dumps(state, sort_keys=True), f)
+        self._file.close()
+        os.replace(tmp, self.path)
+        self._file = open(self.path, 'a')
+        self._records = len(self._states)
+
+    def close(self):
+        with self._lock:
+            self._file.close()
@@ -0,0 +1,215 @@
+import collections
+import math
+
+import backtrader as bt
+
+
+class WilderRSI:
+    def __init__(self, period):
+        """
+        增量计算 RSI, 与 bt.indicators.RSI 一致(SMMA, 以前 period 个值的 SMA 作为初始值)
+        :param period: RSI周期
+        """
+        self.period = period
+        self.prev = None  # 上一根收盘价
+        self.count = 0  # 已累计的涨跌幅个数
+        self.avg_up = 0.0
+        self.avg_down = 0.0
+
+    def ready(self):
+        return self.count >= self.period
+
+    def remaining(self):
+        """距离产生第一个 RSI 值还需要的K线数量"""
+        return max(self.period - self.count, 0) + (1 if self.prev is None else 0)
+
+    def update(self, close):
+        if self.prev is None:
+            self.prev = close
+            return None
+
+        delta = close - self.prev
+        self.prev = close
+        up = delta if delta > 0 else 0.0
+        down = -delta if delta < 0 else 0.0
+
+        if self.count < self.period:
+            # 预热阶段累加, 满 period 个后取平均
+            self.avg_up += up
+            self.avg_down += down
+            self.count += 1
+            if self.count < self.period:
+                return None
+            self.avg_up /= self.period
+            self.avg_down /= self.period
+        else:
+            alpha = 1.0 / self.period
+            self.avg_up = self.avg_up * (1.0 - alpha) + up * alpha
+            self.avg_down = self.avg_down * (1.0 - alpha) + down * alpha
+
+        return self.value()
+
+    def value(self):
+        if self.avg_down == 0:
+            return 100.0
+        rs = self.avg_up / self.avg_down
+        return 100.0 - 100.0 / (1.0 + rs)
+
+    def state(self):
+        return {
+            'period': self.period,
+            'prev': self.prev,
+            'count': self.count,
+            'avg_up': self.avg_up,
+            'avg_down': self.avg_down,
+        }
+
+    @classmethod
+    def from_state(cls, state):
+        rsi = cls(state['period'])
+        rsi.prev = state['prev']
+        rsi.count = state['count']
+        rsi.avg_up = state['avg_up']
+        rsi.avg_down = state['avg_down']
+        return rsi
+
+
+class RollingBollinger:
+    # 每累计 period 次滚动更新后用 fsum 重新求和, 避免浮点误差累积
+    def __init__(self, period, devfactor, window=None):
+        """
+        增量计算布林带, 与 bt.indicators.BollingerBands 一致(SMA 中轨, 总体标准差)
+        :param period: 周期
+        :param devfactor: 标准差倍数
+        :param window: 最近 period 个收盘价
+        """
+        self.period = period
+        self.devfactor = devfactor
+        self.window = collections.deque(window or [], maxlen=period)
+        self._resum()
+
+    def _resum(self):
+        self.sum = math.fsum(self.window)
+        self.sumsq = math.fsum(v * v for v in self.window)
+        self.updates = 0
+
+    def ready(self):
+        return len(self.window) >= self.period
+
+    def remaining(self):
+        return self.period - len(self.window)
+
+    def update(self, close):
+        if len(self.window) == self.period:
+            old = self.window[0]
+            self.sum -= old
+            self.sumsq -= old * old
+        self.window.append(close)
+        self.sum += close
+        self.sumsq += close * close
+
+        self.updates += 1
+        if self.updates >= self.period:
+            self._resum()
+
+        if not self.ready():
+            return None
+        return self.value()
+
+    def value(self):
+        mid = self.sum / self.period
+        variance = self.sumsq / self.period - mid * mid
+        dev = self.devfactor * math.sqrt(variance if variance > 0 else 0.0)
+        return mid, mid + dev, mid - dev
+
+    def state(self):
+        return {
+            'period': self.period,
+            'devfactor': self.devfactor,
+            'window': list(self.window),
+        }
+
+    @classmethod
+    def from_state(cls, state):
+        return cls(state['period'], state['devfactor'], state['window'])
+
+
+class CheckpointRSI(bt.Indicator):
+    """
+    可从快照恢复的 RSI, 恢复后不需要重放 period 根历史K线
+    history: 保留最近多少根K线之前的状态, 用于 snapshot(ago)
+    """
+    lines = ('rsi',)
+    params = (
+        ('period', 14),
+        ('state', None),
+        ('history', 0),
+    )
+
+    def __init__(self):
+        if self.p.state:
+            self._rsi = WilderRSI.from_state(self.p.state)
+        else:
+            self._rsi = WilderRSI(self.p.period)
+        self._states = collections.deque([self._rsi.state()], maxlen=self.p.history + 1)
+        self.addminperiod(max(self._rsi.remaining(), 1))
+
+    def _update(self):
+        value = self._rsi.update(self.data[0])
+        self._states.append(self._rsi.state())
+        return value
+
+    def prenext(self):
+        self._update()
+
+    def next(self):
+        value = self._update()
+        self.lines.rsi[0] = value if value is not None else float('nan')
+
+    def snapshot(self, ago=0):
+        """返回 ago 根K线之前的状态, ago 不能超过 history"""
+        return self._states[-1 - ago]
+
+
+class CheckpointBollinger(bt.Indicator):
+    """可从快照恢复的布林带, 线名与 bt.indicators.BollingerBands 相同"""
+    lines = ('mid', 'top', 'bot',)
+    params = (
+        ('period', 20),
+        ('devfactor', 2.0),
+        ('state', None),
+        ('history', 0),
+    )
+
+    def __init__(self):
+        if self.p.state:
+            self._boll = RollingBollinger.from_state(self.p.state)
+        else:
+            self._boll = RollingBollinger(self.p.period, self.p.devfactor)
+        # 保留 period + history 个收盘价即可还原 history 根K线之前的窗口
+        self._closes = collections.deque(self._boll.window, maxlen=self.p.period + self.p.history)
+        self.addminperiod(max(self._boll.remaining(), 1))
+
+    def _update(self):
+        self._closes.append(self.data[0])
+        return self._boll.update(self.data[0])
+
+    def prenext(self):
+        self._update()
+
+    def next(self):
+        value = self._update()
+        if value is None:
+            value = (float('nan'),) * 3
+        self.lines.mid[0], self.lines.top[0], self.lines.bot[0] = value
+
+    def snapshot(self, ago=0):
+        closes = list(self._closes)
+        if ago:
+            closes = closes[:-ago]
+        return {
+            'period': self.p.period,
+            'devfactor': self.p.devfactor,
+            'window': closes[-self.p.period:],
+        }
+
@@ -0,0 +1,232 @@
+"""
+参数优化时共享的指标缓存: 同一段K线上相同指标、相同周期的结果只计算一次
+
+缓存键由K线数据的内容哈希、指标名和参数组成, 数据相同即命中, 与数据源对象无关
+两级缓存: 内存(按字节数 LRU 淘汰) + 磁盘目录(.npy 文件, 按修改时间 LRU 淘汰, 多进程共享)
+只改变 rsi_buy_signal、stop_loss 等阈值的参数组合直接从缓存读取指标, 不再重新计算
+
+    cache = IndicatorCache('~/.cache/cryptotrader/indicators')
+    cerebro.optstrategy(RSIReversal, rsi_buy_signal=range(20, 50, 5), indicator_cache=cache)
+
+只在数据已预加载(cerebro 默认 preload=True)时使用缓存, 实盘逐根推送的数据回退到 backtrader 指标
+"""
+import array
+import collections
+import hashlib
+import os
+
+import backtrader as bt
+import numpy as np
+from loguru import logger
+
+from . import VectorIndicators
+
+
+class _CachedLines(bt.Indicator):
+    """把预先算好的数组填入指标的 line, runonce 模式在 once 中整段复制, next 模式逐根读取"""
+    params = (
+        ('values', None),  # 每条 line 对应的 numpy 数组
+        ('warmup', 1),  # 与对应 backtrader 指标相同的 minperiod
+    )
+
+    def __init__(self):
+        self.addminperiod(self.p.warmup)
+
+    def next(self):
+        i = len(self) - 1
+        for line, values in zip(self.lines, self.p.values):
+            line[0] = values[i]
+
+    def once(self, start, end):
+        for line, values in zip(self.lines, self.p.values):
+            line.array[start:end] = array.array('d', values[start:end].tolist())
+
+
+class CachedRSI(_CachedLines):
+    lines = ('rsi',)
+
+
+class CachedBollinger(_CachedLines):
+    lines = ('mid', 'top', 'bot',)
+
+
+class CachedEMA(_CachedLines):
+    lines = ('ema',)
+
+
+def _digest(values):
+    return hashlib.blake2b(np.ascontiguousarray(values, dtype=np.float64).tobytes(), digest_size=16).hexdigest()
+
+
+def data_hash(line):
+    """
+    K线数据线的内容哈希
+    :param line: backtrader 的数据线, 如 data.close
+    """
+    return _digest(np.frombuffer(line.array, dtype=np.float64)[:line.buflen()])
+
+
+class IndicatorCache:
+    # 指标名 -> (计算函数, 输出 line 数)
+    INDICATORS = {
+        'rsi': (VectorIndicators.rsi, 1),
+        'bollinger': (VectorIndicators.bollinger, 3),
+        'ema': (VectorIndicators.ema, 1),
+    }
+
+    def __init__(self, path=None, max_memory=256 * 1024 * 1024, max_disk=None):
+        """
+        :param path: 磁盘缓存目录, None 时只使用内存
+        :param max_memory: 内存缓存上限(字节)
+        :param max_disk: 磁盘缓存上限(字节), None 不限制
+        """
+        self.path = os.path.expanduser(path) if path else None
+        self.max_memory = max_memory
+        self.max_disk = max_disk
+        self._memory = collections.OrderedDict()  # key -> 数组, 按最近使用排序
+        self._memory_size = 0
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self._windows = {}  # 窗口数据哈希 -> (完整历史, 完整历史哈希, 起点, 终点)
+        if self.path:
+            os.makedirs(self.path, exist_ok=True)
+
+    def __getstate__(self):
+        # 多进程优化时随策略参数序列化, 不复制内存中的数组, 子进程从磁盘读取
+        state = self.__dict__.copy()
+        state['_memory'] = collections.OrderedDict()
+        state['_memory_size'] = 0
+        state['_windows'] = {}
+        return state
+
+    def add_window(self, values, start, end):
+        """
+        登记完整历史中的一段数据: 这段数据上的指标从完整历史的计算结果中截取,
+        窗口起点的指标已经过完整预热, 相互重叠的窗口共用同一次计算
+        :param values: 完整历史的一列数据, 如全部收盘价
+        """
+        values = np.ascontiguousarray(values, dtype=np.float64)
+        if start == 0 and end >= len(values):
+            return
+        self._windows[_digest(values[start:end])] = (values, _digest(values), start, end)
+
+    @staticmethod
+    def key(digest, name, **params):
+        return '_'.join([digest, name] + [f"{k}{v}" for k, v in sorted(params.items())])
+
+    def get(self, name, values, digest=None, **params):
+        """
+        :param name: 指标名, 见 INDICATORS
+        :param values: 输入数组
+        :param digest: values 的内容哈希, 为 None 时现算
+        :return: 二维数组, 每行一条 line
+        """
+        if digest is None:
+            digest = _digest(values)
+        window = self._windows.get(digest)
+        if window is not None:
+            values, digest, start, end = window
+            return self.get(name, values, digest, **params)[:, start:end]
+
+        key = self.key(digest, name, **params)
+        result = self._memory.get(key)
+        if result is not None:
+            self._memory.move_to_end(key)
+            self.hits += 1
+            return result
+
+        result = self._load(key)
+        if result is not None:
+            self.disk_hits += 1
+        else:
+            self.misses += 1
+            func, count = self.INDICATORS[name]
+            result = func(values, **params)
+            result = np.array(result if count > 1 else [result], dtype=np.float64)
+            self._save(key, result)
+        self._remember(key, result)
+        return result
+
+    def _remember(self, key, result):
+        self._memory[key] = result
+        self._memory_size += result.nbytes
+        while self._memory_size > self.max_memory and len(self._memory) > 1:
+            _, evicted = self._memory.popitem(last=False)
+            self._memory_size -= evicted.nbytes
+
+    def _file(self, key):
+        return os.path.join(self.path, f"{key}.npy")
+
+    def _load(self, key):
+        if not self.path:
+            return None
+        file = self._file(key)
+        try:
+            result = np.load(file)
+        except (OSError, ValueError):
+            return None
+        os.utime(file)  # 记录最近使用时间
+        return result
+
+    def _save(self, key, result):
+        if not self.path:
+            return
+        file = self._file(key)
+        tmp = f"{file}.{os.getpid()}.tmp"
+        # 先写临时文件再改名, 多个进程同时写同一个键也不会读到不完整的文件
+        with open(tmp, 'wb') as f:
+            np.save(f, result)
+        os.replace(tmp, file)
+        if self.max_disk is not None:
+            self._evict_disk()
+
+    def _evict_disk(self):
+        files = []
+        for entry in os.scandir(self.path):
+            if entry.name.endswith('.npy'):
+                stat = entry.stat()
+                files.append((stat.st_mtime, stat.st_size, entry.path))
+        total = sum(size for _, size, _ in files)
+        for _, size, path in sorted(files):
+            if total <= self.max_disk:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                continue
+            total -= size
+
+    def clear(self):
+        self._memory.clear()
+        self._memory_size = 0
+        self._windows.clear()
+
+    def stats(self):
+        return {'hits': self.hits, 'disk_hits': self.disk_hits, 'misses': self.misses,
+                'memory_items': len(self._memory), 'memory_bytes': self._memory_size}
+
+    def _indicator(self, cls, fallback, name, line, warmup, **params):
+        if not isinstance(line.array, array.array) or line.buflen() == 0:
+            # 数据未预加载(实盘或 exactbars), 无法整段计算
+            return fallback()
+        values = np.frombuffer(line.array, dtype=np.float64)[:line.buflen()]
+        result = self.get(name, values, digest=data_hash(line), **params)
+        logger.debug(f"Indicator cache {name} {params}: {self.stats()}")
+        return cls(line, values=result, warmup=warmup)
+
+    def rsi(self, line, period):
+        """与 bt.indicators.RSI(line, period=period) 相同"""
+        return self._indicator(CachedRSI, lambda: bt.indicators.RSI(line, period=period),
+                               'rsi', line, period + 1, period=period)
+
+    def bollinger(self, line, period, devfactor):
+        """与 bt.indicators.BollingerBands(line, period=period, devfactor=devfactor) 相同"""
+        return self._indicator(CachedBollinger,
+                               lambda: bt.indicators.BollingerBands(line, period=period, devfactor=devfactor),
+                               'bollinger', line, period, period=period, devfactor=devfactor)
+
+    def ema(self, line, period):
+        """与 bt.indicators.EMA(line, period=period) 相同"""
+        return self._indicator(CachedEMA, lambda: bt.indicators.ExponentialMovingAverage(line, period=period),
+                               'ema', line, period, period=period)
@@ -0,0 +1,31 @@
+import backtrader as bt
+
+
+def _indicators(lineiterator):
+    for ind in getattr(lineiterator, '_lineiterators', {}).get(bt.LineIterator.IndType, []):
+        yield ind
+        yield from _indicators(ind)
+
+
+def max_lookback(strategy, extra=0):
+    """
+    策略运行需要保留的最大K线数: 指标树中最大的 minperiod, 与策略自身回看长度取大
+    :param extra: 策略直接访问 line[-i] 时需要的回看长度, backtrader 无法自动计算
+    """
+    periods = [ind._minperiod for ind in _indicators(strategy)]
+    return max(periods + [strategy._minperiod, extra, 1])
+
+
+def bound_buffers(strategy, extra=0):
+    """
+    在 cerebro.run(exactbars=1) 的基础上, 保证数据和指标的每条 line 至少保留 max_lookback 个值
+    必须在 qbuffer 之后、第一根K线之前调用, 见 Strategy.qbuffer
+    """
+    size = max_lookback(strategy, extra)
+    for data in strategy.datas:
+        for line in data.lines:
+            line.minbuffer(size)
+    for ind in _indicators(strategy):
+        for line in ind.lines:
+            line.minbuffer(size)
+    return size
@@ -1,5 +1,8 @@
+import numpy as np
 from loguru import logger
 
+from broker.PositionLedger import PositionLedger
+
 class MartinPositionManager:
     def __init__(self, factor, max_steps):
         """
@@ -13,8 +16,7 @@ class MartinPositionManager:
         self.cash_distribution = []  # 存储每次分配的资金
 
         self.count = 0
-        self.size = 0
-        self.transaction_cost = 0
+        self.ledger = PositionLedger()  # 持仓数量和加权成本, reset 不清空, 保留累计的已实现盈亏和手续费
         self.set_position_count = 0
         self.last_price = 0
 
@@ -54,27 +56,37 @@ class MartinPositionManager:
 
     def set_transaction_cost(self, price, size):
         """
-        设置价格和持仓
+        记录一笔完整成交的买单
         :return:
         """
-        if self.transaction_cost == 0:
-            self.transaction_cost = price
-        else:
-            self.transaction_cost += price
-            self.transaction_cost = self.transaction_cost / 2
-
-        self.size += size
+        self.ledger.add_fill(size, price)
         self.set_position_count += 1
 
+    def add_fill(self, key, size, price, fee=0.0, completed=True):
+        """
+        按订单累计成交记账, 部分成交可多次调用, 只记入新增部分
+        :param key: 订单标识, 如 order.ref
+        :param size: 累计成交数量, 买入为正, 卖出为负
+        :param price: 成交均价
+        :param fee: 累计手续费
+        :param completed: 订单是否已全部成交, 买单全部成交后才计入已成交次数
+        """
+        fill = self.ledger.order_fill(key, size, price, fee)
+        if completed:
+            self.ledger.close_order(key)
+            if size > 0:
+                self.set_position_count += 1
+        return fill
+
     def get_transaction_cost(self):
         """
-        获取成本
+        获取成本: 按成交数量加权的持仓均价
         :return:
         """
-        return self.transaction_cost
+        return self.ledger.price
 
     def get_position(self):
-        return self.size
+        return self.ledger.size
 
     def reset(self, cash):
         if cash <= 0:
@@ -85,8 +97,6 @@ class MartinPositionManager:
                 cash += v
         logger.info(f"Init Set position cash: {cash} {self.count} {self.set_position_count} {len(self.cash_distribution), self.cash_distribution[self.count:]}")
         self.count = 0
-        self.size = 0
-        self.transaction_cost = 0
         self.cash_distribution = []
         self.set_position_count = 0
         self.last_price = 0
@@ -102,6 +112,119 @@ class MartinPositionManager:
     def stop_loss(self):
         return self.count == self.max_steps and self.set_position_count == self.max_steps
 
+    def get_state(self):
+        return {
+            'cash_distribution': self.cash_distribution,
+            'count': self.count,
+            'ledger': self.ledger.get_state(),
+            'set_position_count': self.set_position_count,
+            'last_price': self.last_price,
+        }
+
+    def set_state(self, state):
+        self.cash_distribution = list(state['cash_distribution'])
+        self.count = state['count']
+        if 'ledger' in state:
+            self.ledger.set_state(state['ledger'])
+        else:
+            # 旧版本状态只有数量和成本
+            self.ledger.size = state['size']
+            self.ledger.price = state['transaction_cost']
+        self.set_position_count = state['set_position_count']
+        self.last_price = state['last_price']
+
+
+class MartinPositionArray:
+    def __init__(self, factor, max_steps):
+        """
+        同时管理多组参数的马丁仓位, 每个属性是一个数组, 一行对应一组参数, 运算与 MartinPositionManager 逐位一致
+        方法的 rows 为布尔数组, 只更新对应的行
+        :param factor: 各组的因子
+        :param max_steps: 各组的最大次数
+        """
+        self.factor = np.asarray(factor, dtype=np.float64)
+        self.max_steps = np.asarray(max_steps, dtype=np.int64)
+        n = len(self.max_steps)
+
+        self.cash_distribution = np.full((n, self.max_steps.max()), np.inf)  # 超出 max_steps 的位置为 inf
+        self.length = np.zeros(n, dtype=np.int64)  # 对应 len(cash_distribution), reset 之前为 0
+        self.count = np.zeros(n, dtype=np.int64)
+        # PositionLedger 的数组版本
+        self.size = np.zeros(n)
+        self.transaction_cost = np.zeros(n)
+        self.realized = np.zeros(n)
+        self.set_position_count = np.zeros(n, dtype=np.int64)
+        self.last_price = np.zeros(n)
+
+    def _calculate_cash_distribution(self, total, rows):
+        factor = self.factor[rows]
+        max_steps = self.max_steps[rows]
+        steps = np.arange(self.cash_distribution.shape[1])
+        with np.errstate(divide='ignore', invalid='ignore'):
+            n = total * (1 - factor) / (1 - factor ** max_steps)
+            distribution = np.where((factor == 1)[:, None], (total / max_steps)[:, None],
+                                    n[:, None] * factor[:, None] ** steps)
+        distribution[steps >= max_steps[:, None]] = np.inf
+        self.cash_distribution[rows] = np.sort(distribution, axis=1)
+        self.length[rows] = max_steps
+
+    def get_size(self, price, rows):
+        """
+        :return: (数量, 实际开仓的行), 未开仓的行数量为 nan
+        """
+        rows = rows & ~((self.last_price != 0) & (price >= self.last_price)) & (self.count < self.length)
+        size = np.full(len(rows), np.nan)
+        index = np.flatnonzero(rows)
+        size[index] = self.cash_distribution[index, self.count[index]] / price[index]
+        self.count[rows] += 1
+        self.last_price[rows] = price[rows]
+        return size, rows
+
+    def add_fill(self, size, price, rows):
+        """
+        一笔完整成交, 与 MartinPositionManager.add_fill(completed=True) 一致
+        :param size: 买入为正, 卖出为负
+        """
+        position = self.size[rows]
+        cost = self.transaction_cost[rows]
+        size = size[rows]
+        price = price[rows]
+        new = position + size
+        same = (position != 0) & ((position > 0) == (size > 0))
+        reduce = (position != 0) & ~same
+        with np.errstate(divide='ignore', invalid='ignore'):
+            average = (cost * position + price * size) / new
+        closed = np.where(np.abs(size) <= np.abs(position), -size, position)
+        self.realized[rows] += np.where(reduce, (price - cost) * closed, 0.0)
+        self.transaction_cost[rows] = np.where(position == 0, price, np.where(
+            same, average, np.where(new == 0, 0.0, np.where((new > 0) != (position > 0), price, cost))))
+        self.size[rows] = new
+        self.set_position_count[rows] += size > 0
+
+    def reset(self, cash, rows):
+        """
+        :return: 资金用完(cash <= 0)的行, 对应 MartinPositionManager.reset 抛出异常, 这些行不再更新
+        """
+        exhausted = rows & (cash <= 0)
+        rows = rows & ~exhausted
+        cash = np.where(rows, cash, 0.0)
+        # 逐个累加未使用的资金, 与 MartinPositionManager.reset 的求和顺序一致
+        for i in range(self.cash_distribution.shape[1]):
+            unused = rows & (i >= self.count) & (i < self.length)
+            cash[unused] += self.cash_distribution[unused, i]
+
+        self.count[rows] = 0
+        self.set_position_count[rows] = 0
+        self.last_price[rows] = 0
+        self._calculate_cash_distribution(cash[rows], rows)
+        return exhausted
+
+    def is_completion(self):
+        return (self.set_position_count == self.count) & (self.set_position_count != 0)
+
+    def stop_loss(self):
+        return (self.count == self.max_steps) & (self.set_position_count == self.max_steps)
+
 
 if __name__ == '__main__':
     manager = MartinPositionManager(2, 5)
@@ -0,0 +1,269 @@
+"""
+MartingaleLongStrategy 的向量化回测: 一次遍历K线, 同时计算成千上万组参数
+
+成交规则与 cerebro 默认的 BackBroker 一致(无手续费、无滑点):
+在第 t 根K线提交的限价单, 从第 t+1 根开始撮合, 买单 open <= 限价时以 open 成交, 否则 low <= 限价时以限价成交,
+卖单反之; 未成交的订单一直挂着; 提交时按当前资金预演成交, 资金不足的订单被拒绝(Margin)
+信号、止盈止损和仓位管理与 MartingaleLongStrategy / MartinPositionManager 一致, 结果与 cerebro.run() 逐位相同
+
+    params = param_grid(factor=[2, 3, 4], max_steps=[3, 5, 8], take_profit=[0.01, 0.02], rsi_period=[14, 30])
+    report = simulate(df, params, cash=1000)
+    report = simulate(df, params, cash=1000, stats=True)  # 附加回撤、夏普等绩效列, 见 utils.analytics
+"""
+import itertools
+
+import numpy as np
+import pandas as pd
+
+from utils import analytics
+
+from .MartinPositionManager import MartinPositionArray
+from .MartingaleStrategy import MartingaleLongStrategy
+from .VectorIndicators import rsi
+
+PARAMS = ('max_steps', 'factor', 'take_profit', 'stop_loss', 'rsi_period', 'rsi_downward')
+
+
+def param_grid(**values):
+    """
+    参数笛卡尔积, 未给出的参数使用 MartingaleLongStrategy 的默认值
+    :return: {参数名: 数组}
+    """
+    defaults = dict(MartingaleLongStrategy.params._getitems())
+    names = list(PARAMS)
+    grid = list(itertools.product(*[values.get(name, [defaults[name]]) for name in names]))
+    return {name: np.array([combo[i] for combo in grid]) for i, name in enumerate(names)}
+
+
+def _round2(values):
+    """与内置 round(x, 2) 一致; np.round 先乘 100, 恰好在 0.5 附近时可能与之不同, 这些值单独处理"""
+    rounded = np.round(values, 2)
+    with np.errstate(invalid='ignore'):
+        scaled = values * 100
+        close_to_half = np.abs(scaled - np.floor(scaled) - 0.5) < 1e-6
+    for i in np.flatnonzero(close_to_half):
+        rounded[i] = round(float(values[i]), 2)
+    return rounded
+
+
+def _signals(close, periods, downwards):
+    """
+    每组 (rsi_period, rsi_downward) 的开仓信号, 与 MartingaleLongStrategy._signal 一致
+    runonce 模式下 rsi[-i] 越过起点时会取到数组末尾, np.roll 保持同样的行为
+    :return: (信号矩阵, 每组参数对应信号矩阵的行)
+    """
+    pairs = sorted(set(zip(periods.tolist(), downwards.tolist())))
+    rsis = {period: rsi(close, period) for period in set(periods.tolist())}
+    signals = np.zeros((len(pairs), len(close)), dtype=bool)
+    for row, (period, downward) in enumerate(pairs):
+        value = rsis[period]
+        rounded = _round2(value)
+        previous = [np.roll(rounded, i) for i in range(1, downward)]
+        with np.errstate(invalid='ignore'):
+            signal = (value < 30) & (rounded > previous[0])
+            for newer, older in zip(previous, previous[1:]):
+                signal &= (older - newer >= 0)
+        signals[row] = signal
+    index = {pair: row for row, pair in enumerate(pairs)}
+    return signals, np.array([index[pair] for pair in zip(periods.tolist(), downwards.tolist())])
+
+
+class _Broker:
+    """多组参数的 BackBroker 资金、持仓和挂单队列, 挂单按提交顺序排列"""
+
+    def __init__(self, n, cash, capacity):
+        self.cash = np.full(n, float(cash))
+        self.position = np.zeros(n)
+        self.price = np.zeros(n)  # 持仓均价
+        self.side = np.zeros((n, capacity), dtype=np.int8)  # 1 买 -1 卖 0 空
+        self.limit = np.zeros((n, capacity))
+        self.size = np.zeros((n, capacity))
+        self.pending = np.zeros(n, dtype=np.int64)
+
+        # 本根K线提交、下一根K线检查资金后进入挂单队列
+        self.submitted = np.zeros(n, dtype=np.int8)
+        self.submitted_limit = np.zeros(n)
+        self.submitted_size = np.zeros(n)
+
+    def submit(self, side, limit, size, rows):
+        self.submitted[rows] = side
+        self.submitted_limit[rows] = limit[rows]
+        self.submitted_size[rows] = size[rows]
+
+    @staticmethod
+    def _update(position, pprice, size, price):
+        """Position.update 的数组版本, 返回 (新持仓, 新均价, opened, closed)"""
+        new = position + size
+        same = (position > 0) & (size > 0) | (position < 0) & (size < 0)
+        keep = ~same & (position != 0) & ((position > 0) & (new > 0) | (position < 0) & (new < 0))
+        with np.errstate(divide='ignore', invalid='ignore'):
+            average = (pprice * position + size * price) / new
+        opened = np.where(new == 0, 0.0, np.where(position == 0, size, np.where(same, size, np.where(keep, 0.0, new))))
+        closed = np.where(new == 0, size, np.where((position == 0) | same, 0.0, np.where(keep, size, -position)))
+        pprice = np.where(new == 0, 0.0, np.where(position == 0, price,
+                                                  np.where(same, average, np.where(keep, pprice, price))))
+        return new, pprice, opened, closed
+
+    @staticmethod
+    def _execute(cash, pprice_orig, opened, closed, price, pnl):
+        """
+        BackBroker._execute 的资金变化(shortcash=True, 杠杆 1, 无手续费)
+        开仓后资金为负时开仓部分不执行
+        :return: (成交后资金, 实际开仓数量, 按原数量开仓后的资金)
+        """
+        closedvalue = -closed * pprice_orig
+        cash = np.where(closed != 0, cash + (closedvalue + pnl), cash)
+        open_cash = cash - opened * price
+        opened = np.where(open_cash < 0.0, 0.0, opened)
+        return np.where(opened != 0, open_cash, cash), opened, open_cash
+
+    def check_submitted(self):
+        """资金检查: 以委托价预演成交, 成交后资金为负的订单被拒绝"""
+        rows = self.submitted != 0
+        if not rows.any():
+            return
+        size = self.submitted * self.submitted_size
+        _, _, opened, closed = self._update(self.position, self.price, size, self.submitted_limit)
+        cash, _, open_cash = self._execute(self.cash, self.submitted_limit, opened, closed, self.submitted_limit, 0.0)
+        cash = np.where(opened != 0, open_cash, cash)
+        accepted = rows & (cash >= 0.0)
+
+        if accepted.any() and self.pending[accepted].max() >= self.side.shape[1]:
+            grow = self.side.shape[1]
+            self.side = np.pad(self.side, ((0, 0), (0, grow)))
+            self.limit = np.pad(self.limit, ((0, 0), (0, grow)))
+            self.size = np.pad(self.size, ((0, 0), (0, grow)))
+        index = np.flatnonzero(accepted)
+        slot = self.pending[index]
+        self.side[index, slot] = self.submitted[index]
+        self.limit[index, slot] = self.submitted_limit[index]
+        self.size[index, slot] = self.submitted_size[index]
+        self.pending[index] += 1
+        self.submitted[:] = 0
+
+    def execute(self, slot, open_, high, low):
+        """
+        撮合第 slot 个挂单, 触及价格的订单都会移出队列, 资金不足无法开仓的订单状态为 Margin
+        :return: (移出队列的行, 全部成交的行, 成交价, 带方向的数量)
+        """
+        side = self.side[:, slot]
+        limit = self.limit[:, slot]
+        buy = side == 1
+        sell = side == -1
+        at_open = buy & (limit >= open_) | sell & (limit <= open_)
+        at_limit = ~at_open & (buy & (limit >= low) | sell & (limit <= high))
+        touched = at_open | at_limit
+        price = np.where(at_open, open_, limit)
+        size = side * self.size[:, slot]
+
+        _, _, opened, closed = self._update(self.position, self.price, size, price)
+        pnl = -closed * (price - self.price)
+        cash, executed_open, _ = self._execute(self.cash, self.price, opened, closed, price, pnl)
+        execsize = closed + executed_open
+        new, pprice, _, _ = self._update(self.position, self.price, execsize, price)
+
+        executed = touched & (execsize != 0)
+        self.cash = np.where(executed, cash, self.cash)
+        self.position = np.where(executed, new, self.position)
+        self.price = np.where(executed, pprice, self.price)
+        self.side[touched, slot] = 0
+        return touched, touched & (executed_open == opened), price, size
+
+    def compact(self, rows):
+        """移除已成交的挂单, 保持剩余挂单的顺序"""
+        order = np.argsort(self.side[rows] == 0, axis=1, kind='stable')
+        self.side[rows] = np.take_along_axis(self.side[rows], order, axis=1)
+        self.limit[rows] = np.take_along_axis(self.limit[rows], order, axis=1)
+        self.size[rows] = np.take_along_axis(self.size[rows], order, axis=1)
+        self.pending[rows] = (self.side[rows] != 0).sum(axis=1)
+
+    def value(self, close):
+        """与 BackBroker.getvalue 一致(shortcash=True): 多头先扣除再加回浮动盈亏"""
+        value = self.position * close
+        unrealized = self.position * (close - self.price) * 1.0
+        return self.cash + np.where(value > 0, (value - unrealized) + unrealized, value)
+
+
+def simulate(df, params, cash=1000.0, stats=False, periods_per_year=analytics.YEAR_SECONDS / 60):
+    """
+    :param df: 含 open/high/low/close 列的 DataFrame
+    :param params: {参数名: 数组}, 见 param_grid
+    :param cash: 初始资金
+    :param stats: 逐根K线累计绩效(analytics.EquityTracker), 结果追加到报告; 每笔卖出成交的已实现盈亏计为一笔交易
+    :param periods_per_year: 年化用的每年K线数, 默认按 1 分钟K线
+    :return: DataFrame, 每组参数一行: 参数、最终资金、持仓、总资产、成交次数、买卖次数、已实现盈亏, failed 表示资金用完(策略会抛出异常)
+    """
+    defaults = dict(MartingaleLongStrategy.params._getitems())
+    n = len(next(iter(params.values())))
+    p = {name: np.asarray(params.get(name, [defaults[name]] * n)) for name in PARAMS}
+
+    open_ = df['open'].to_numpy(dtype=np.float64)
+    high = df['high'].to_numpy(dtype=np.float64)
+    low = df['low'].to_numpy(dtype=np.float64)
+    close = df['close'].to_numpy(dtype=np.float64)
+    signals, signal_rows = _signals(close, p['rsi_period'], p['rsi_downward'])
+
+    manager = MartinPositionArray(p['factor'], p['max_steps'])
+    manager.reset(np.full(n, float(cash)), np.ones(n, dtype=bool))
+    broker = _Broker(n, cash, int(p['max_steps'].max()) + 2)
+    failed = np.zeros(n, dtype=bool)
+    buys = np.zeros(n, dtype=np.int64)
+    sells = np.zeros(n, dtype=np.int64)
+    start = p['rsi_period']  # RSI 的 minperiod 为 period + 1
+    tracker = analytics.EquityTracker(n, periods_per_year) if stats else None
+
+    for t in range(len(close)):
+        # BackBroker.next: 检查上一根K线提交的订单, 再按顺序撮合挂单, 成交通知按撮合顺序更新仓位管理
+        broker.check_submitted()
+        if broker.pending.any():
+            touched = np.zeros(n, dtype=bool)
+            for slot in range(int(broker.pending.max())):
+                removed, filled, price, size = broker.execute(slot, open_[t], high[t], low[t])
+                touched |= removed
+                if not filled.any():
+                    continue
+                bought = filled & (size > 0) & ~failed
+                sold = filled & (size < 0) & ~failed
+                manager.add_fill(size, price, bought)
+                realized = manager.realized.copy() if tracker is not None else None
+                manager.add_fill(size, price, sold)
+                if tracker is not None:
+                    tracker.add_trades(manager.realized - realized, sold)
+                failed |= manager.reset(price * -size, sold)
+                buys += bought
+                sells += sold
+            if touched.any():
+                broker.compact(touched)
+
+        if tracker is not None:
+            tracker.update(broker.value(close[t]), broker.position)
+
+        # MartingaleLongStrategy.next
+        active = ~failed & (t >= start)
+        if not active.any():
+            continue
+        price = np.full(n, close[t])
+        cost = manager.transaction_cost
+        stop = active & manager.stop_loss() & (price <= cost * (1 - p['stop_loss']))
+        profit = active & ~stop & manager.is_completion() & (cost != 0) & (price >= cost * (1 + p['take_profit']))
+        exit_ = stop | profit
+        broker.submit(-1, price, manager.size.copy(), exit_)
+
+        entry = active & ~exit_ & signals[signal_rows, t]
+        if entry.any():
+            size, opened = manager.get_size(price, entry)
+            broker.submit(1, price, size, opened)
+
+    report = pd.DataFrame(p)
+    report['cash'] = broker.cash
+    report['position'] = broker.position
+    report['value'] = broker.value(close[-1])
+    report['orders'] = buys + sells
+    report['buys'] = buys
+    report['sells'] = sells
+    report['realized'] = manager.realized
+    report['failed'] = failed
+    if tracker is not None:
+        for name, values in tracker.summary().items():
+            report[name] = values
+    return report
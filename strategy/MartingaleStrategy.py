@@ -2,6 +2,7 @@ import backtrader as bt
 import numpy as np
 
 from .MartinPositionManager import MartinPositionManager
+from .LineBuffers import bound_buffers
 from loguru import logger
 
 
@@ -13,10 +14,16 @@ class MartingaleLongStrategy(bt.Strategy):
         ('stop_loss', 0.2),  # 止损百分比
         ('rsi_period', 60),  # RSI周期
         ('rsi_downward', 6),  # RSI周期
+        ('journal', None),  # StateJournal, 用于崩溃后恢复
+        ('checkpoint_interval', 1),  # 每隔多少根K线写一次状态
+        ('indicator_cache', None),  # IndicatorCache, 参数优化时共享指标计算结果
     )
 
     def __init__(self):
-        self.rsi_close = bt.indicators.RSI(self.data.close, period=self.params.rsi_period)
+        if self.p.indicator_cache is not None:
+            self.rsi_close = self.p.indicator_cache.rsi(self.data.close, self.params.rsi_period)
+        else:
+            self.rsi_close = bt.indicators.RSI(self.data.close, period=self.params.rsi_period)
         self.martingale_position = MartinPositionManager(self.p.factor, self.p.max_steps)
         cash = self.broker.getcash()
         logger.info(f"Set init cash:{cash}")
@@ -25,6 +32,39 @@ class MartingaleLongStrategy(bt.Strategy):
         self.commission = 0
         self.count = 0
 
+    def qbuffer(self, savemem=0, replaying=False):
+        # cerebro.run(exactbars=1) 时只保留回看所需的K线, _signal 回看 rsi_downward 根
+        super(MartingaleLongStrategy, self).qbuffer(savemem=savemem, replaying=replaying)
+        if savemem > 0:
+            bound_buffers(self, self.p.rsi_downward)
+
+    def start(self):
+        if self.p.journal is None:
+            return
+        state = self.p.journal.get(self.__class__.__name__)
+        if state:
+            logger.info(f"Restore state: {state}")
+            self.set_state(state)
+        broker_state = self.p.journal.get('broker')
+        if broker_state and hasattr(self.broker, 'reattach_orders'):
+            self.broker.reattach_orders(self, self.data)
+
+    def get_state(self):
+        return {
+            'position': self.martingale_position.get_state(),
+            'commission': self.commission,
+            'count': self.count,
+        }
+
+    def set_state(self, state):
+        self.martingale_position.set_state(state['position'])
+        self.commission = state['commission']
+        self.count = state['count']
+
+    def checkpoint(self):
+        if self.p.journal is not None:
+            self.p.journal.append(self.__class__.__name__, self.get_state())
+
     def _signal(self):
         current_time = self.datas[0].datetime.datetime(0)
         rsis = np.array([round(self.rsi_close[-i], 2) for i in range(1, self.p.rsi_downward)])
@@ -36,6 +76,8 @@ class MartingaleLongStrategy(bt.Strategy):
                 return bt.SIGNAL_LONG
 
     def next(self):
+        if len(self) % self.p.checkpoint_interval == 0:
+            self.checkpoint()
         price = self.data.close[0]
         current_time = self.datas[0].datetime.datetime(0)
         cost = self.martingale_position.get_transaction_cost()
@@ -75,23 +117,38 @@ class MartingaleLongStrategy(bt.Strategy):
         )
         logger.info(order_info)
 
-        if order.status in [order.Completed]:
+        # 全部成交, 或部分成交后被取消/过期/拒绝, 都是订单的最终状态
+        done = not order.alive()
+        if order.executed.size and (order.status == order.Partial or done):
+            # 部分成交按增量记账, 持仓成本按成交数量加权
+            # BackBroker 卖单成交数量为负, OKXBroker 为交易所的 filled(始终为正), 按买卖方向确定符号
+            size = abs(order.executed.size) if order.isbuy() else -abs(order.executed.size)
+            self.martingale_position.add_fill(order.ref, size, order.executed.price, order.executed.comm, done)
+
+        if done and order.executed.size:
             price = order.executed.price
             size = order.executed.size
             commission = order.executed.comm
             self.commission += commission
             if order.isbuy():
-                logger.info(f"set_transaction_cost:{price} {size}")
-                self.martingale_position.set_transaction_cost(price, size)
-            else:
-                cash = price * (size * -1) - commission
+                # 部分成交的买单也算一次加仓, 与 get_size 计入的次数一致
+                logger.info(f"transaction cost:{self.martingale_position.get_transaction_cost()} {price} {size}")
+            elif order.status == order.Completed:
+                cash = price * abs(size) - commission
                 logger.info(f"cash:{cash} {price} {size}")
                 self.martingale_position.reset(cash)
+            else:
+                # 卖单只成交了一部分, 保留剩余持仓和加仓记录, 下一根K线继续止盈/止损
+                logger.warning(f"sell {order.getstatusname()} after partial fill {size}, "
+                               f"position:{self.martingale_position.get_position()}")
 
             self.count += 1
+            self.checkpoint()
 
     def stop(self):
-        logger.info(f"手续费:{self.commission} 交易完成次数:{self.count}")
+        ledger = self.martingale_position.ledger
+        logger.info(f"手续费:{self.commission} 交易完成次数:{self.count} 已实现盈亏:{ledger.realized} "
+                    f"浮动盈亏:{ledger.unrealized(self.data.close[0])}")
 
 
 if __name__ == '__main__':
@@ -1,7 +1,14 @@
+import array
+import math
+
 import backtrader as bt
 from loguru import logger
 import numpy as np
 
+from utils import analytics, log
+from .IncrementalIndicators import CheckpointRSI, CheckpointBollinger
+from .LineBuffers import bound_buffers
+
 
 class RSIReversal(bt.Strategy):
     params = (
@@ -11,13 +18,38 @@ class RSIReversal(bt.Strategy):
         ('rsi_buy_signal', 40),  # 中期RSI周期
         ('rsi_downward_period', 4),  # 连续下降或横盘周期
         ('stop_loss', 0.1),  # 止损百分比
+        ('indicator_state', None),  # 从快照恢复指标, 见 indicator_snapshot; {} 表示从头计算但可生成快照
+        ('journal', None),  # StateJournal, 保存策略和指标状态用于崩溃后恢复
+        ('checkpoint_interval', 1),  # 每隔多少根K线写一次状态
+        ('indicator_cache', None),  # IndicatorCache, 参数优化时共享指标计算结果
     )
 
     def __init__(self):
         self.dataclose = self.datas[0].close
-        self.rsi = bt.indicators.RSI(self.data.close, period=self.params.rsi_period)
-        self.boll = bt.indicators.BollingerBands(self.data.close, period=self.params.boll_period,
-                                                 devfactor=self.params.boll_dev)
+        # 回看的最大K线数: rsi[-i], volume[-5], close[-1]
+        self._lookback = max(self.p.rsi_downward_period, 6)
+        self._warmup = max(self.params.boll_period, self.params.rsi_period)
+        indicator_state = self.p.indicator_state
+        if self.p.journal is not None and indicator_state is None:
+            indicator_state = (self.p.journal.get(self.__class__.__name__) or {}).get('indicators')
+        if self.p.journal is not None or indicator_state is not None:
+            state = indicator_state or {}
+            self.rsi = CheckpointRSI(self.data.close, period=self.params.rsi_period,
+                                     state=state.get('rsi'), history=self._lookback)
+            self.boll = CheckpointBollinger(self.data.close, period=self.params.boll_period,
+                                            devfactor=self.params.boll_dev,
+                                            state=state.get('boll'), history=self._lookback)
+            if state:
+                # 快照中的K线重放完即恢复到快照时刻, 最后一根在快照前已处理过, 从下一根开始交易
+                self._warmup = len(state['bars']) + 1
+        elif self.p.indicator_cache is not None:
+            self.rsi = self.p.indicator_cache.rsi(self.data.close, self.params.rsi_period)
+            self.boll = self.p.indicator_cache.bollinger(self.data.close, self.params.boll_period,
+                                                         self.params.boll_dev)
+        else:
+            self.rsi = bt.indicators.RSI(self.data.close, period=self.params.rsi_period)
+            self.boll = bt.indicators.BollingerBands(self.data.close, period=self.params.boll_period,
+                                                     devfactor=self.params.boll_dev)
 
         self.buy_signal = False
         self.sell_signal = False
@@ -28,13 +60,62 @@ class RSIReversal(bt.Strategy):
         self.TotalProfit = 0
         self.TotalLoss = 0
         self.StopLoss = 0
+        # 绩效统计: 每根K线的总资产和是否持仓, 每笔卖出的盈亏; 每根K线 9 字节, exactbars 时也保留
+        self._equity = array.array('d')
+        self._exposed = array.array('b')
+        self._trade_pnl = array.array('d')
+        self._first_dt = self._last_dt = None
 
         self._op = bt.Order.Buy
         self._buy_price = 0
         self._open_order = None
 
+    def qbuffer(self, savemem=0, replaying=False):
+        # cerebro.run(exactbars=1) 时只保留回看所需的K线, 长期运行内存不再增长
+        super(RSIReversal, self).qbuffer(savemem=savemem, replaying=replaying)
+        if savemem > 0:
+            size = bound_buffers(self, self._lookback)
+            logger.info(f"Bounded line buffers: {size}")
+
     def start(self):
         logger.info("策略开始运行, 等待行情数据...")
+        if self.p.journal is None:
+            return
+        state = self.p.journal.get(self.__class__.__name__)
+        if state:
+            self.set_state(state)
+            logger.info(f"Restore state: op:{self._op} buy_price:{self._buy_price} open_order:{self._open_order}")
+        if self.p.journal.get('broker') and hasattr(self.broker, 'reattach_orders'):
+            self.broker.reattach_orders(self, self.data)
+
+    def get_state(self):
+        return {
+            'op': self._op,
+            'buy_price': self._buy_price,
+            'open_order': self._open_order,
+            'commission': self.commission,
+            'WinningTrades': self.WinningTrades,
+            'LosingTrades': self.LosingTrades,
+            'TotalProfit': self.TotalProfit,
+            'TotalLoss': self.TotalLoss,
+            'StopLoss': self.StopLoss,
+            'indicators': self.indicator_snapshot(),
+        }
+
+    def set_state(self, state):
+        self._op = state['op']
+        self._buy_price = state['buy_price']
+        self._open_order = state['open_order']
+        self.commission = state['commission']
+        self.WinningTrades = state['WinningTrades']
+        self.LosingTrades = state['LosingTrades']
+        self.TotalProfit = state['TotalProfit']
+        self.TotalLoss = state['TotalLoss']
+        self.StopLoss = state['StopLoss']
+
+    def checkpoint(self):
+        if self.p.journal is not None:
+            self.p.journal.append(self.__class__.__name__, self.get_state())
 
     def stop(self):
         report = self.generate_combinations_report()
@@ -58,6 +139,7 @@ class RSIReversal(bt.Strategy):
                 # logger.debug(
                 #     f"卖出订单. {self.datas[0].datetime.datetime(0)} 买入价:{self._buy_price} 成交价格:{order.executed.price} 成交量:{order.executed.size:.8f} 盈亏:{():.4f}")
                 profit = (order.executed.price - self._buy_price) * (order.executed.size * -1)
+                self._trade_pnl.append(profit)
                 if profit < 0:
                     self.LosingTrades += 1
                     self.TotalLoss -= profit
@@ -78,10 +160,19 @@ class RSIReversal(bt.Strategy):
             self.commission += commission
 
             logger.info(f"position:{position:.8f} cach:{cash:.4f} commission:{commission}")
+            self.checkpoint()
 
     def next(self):
-        if len(self.datas[0]) < max(self.params.boll_period, self.params.rsi_period):
-            logger.debug(f"time:{self.datas[0].datetime.datetime(0)} close price:{self.datas[0].close[0]}")
+        self._equity.append(self.broker.getvalue())
+        self._exposed.append(self._op == bt.Order.Sell)
+        self._last_dt = self.data.datetime[0]
+        if self._first_dt is None:
+            self._first_dt = self._last_dt
+        if len(self) % self.p.checkpoint_interval == 0:
+            self.checkpoint()
+        if len(self.datas[0]) < self._warmup:
+            if log.enabled('DEBUG'):
+                logger.debug(f"time:{self.datas[0].datetime.datetime(0)} close price:{self.datas[0].close[0]}")
             return
         # logger.debug(f"[{self.data.datetime.datetime(0)}], "
         #              f"收盘价: {self.data.close[0]}, "
@@ -95,16 +186,43 @@ class RSIReversal(bt.Strategy):
         self.risk_management()
         self.handle_oscillating_market()
 
+    def indicator_snapshot(self):
+        """
+        指标快照: 最近 _lookback 根K线, 以及这些K线之前的指标状态
+        恢复时先回放这些K线, 使 rsi[-i]、volume[-i] 等回看值完整
+        """
+        tail = min(self._lookback, len(self.data))
+        bars = []
+        for ago in range(tail - 1, -1, -1):
+            dt = bt.num2date(self.data.datetime[-ago])
+            bars.append([int(dt.timestamp() * 1000), self.data.open[-ago], self.data.high[-ago],
+                         self.data.low[-ago], self.data.close[-ago], self.data.volume[-ago]])
+        return {
+            'rsi': self.rsi.snapshot(tail),
+            'boll': self.boll.snapshot(tail),
+            'bars': bars,
+        }
+
     def _sumit_buy_order(self, price, size, exectype, **kwargs):
         order = self.buy(price=price, size=size, exectype=exectype, **kwargs)
         self._open_order = True
+        self.checkpoint()
         return order
 
     def _sumit_sell_order(self, price, size, exectype, **kwargs):
         order = self.sell(price=price, size=size, exectype=exectype, **kwargs)
         self._open_order = True
+        self.checkpoint()
         return order
 
+    def performance(self):
+        """资产曲线和逐笔盈亏的绩效统计, 见 utils.analytics.summary"""
+        bars = len(self._equity)
+        seconds = (self._last_dt - self._first_dt) * 86400 / (bars - 1) if bars > 1 else 0
+        return analytics.summary(np.array(self._equity), trades=np.array(self._trade_pnl),
+                                 positions=np.array(self._exposed),
+                                 periods_per_year=analytics.periods_per_year(seconds))
+
     def generate_combinations_report(self):
         avg_loss = 0
         avg_profit = 0
@@ -137,10 +255,38 @@ class RSIReversal(bt.Strategy):
             "净利润": float(f"{net_profit:.2f}"),
             "收益率": f"{return_rate:.4f}%",
             "止损次数": self.StopLoss,
+            **self._performance_report(),
+        }
+
+    def _performance_report(self):
+        if not self._equity:
+            return {}
+        stats = self.performance()
+
+        def value(name, digits=4):
+            # nan 转为 None, 报告可以直接比较是否相同
+            v = float(stats[name])
+            return round(v, digits) if math.isfinite(v) else None
+
+        return {
+            "最大回撤": value('max_drawdown'),
+            "最长回撤(K线)": int(stats['max_drawdown_duration']),
+            "夏普": value('sharpe', 2),
+            "索提诺": value('sortino', 2),
+            "卡玛": value('calmar', 2),
+            "持仓时间占比": value('exposure'),
+            "盈利因子": value('profit_factor', 2),
+            "最大连续亏损": int(stats['max_consecutive_losses']),
+            "单笔盈亏(中位数)": value('median') if 'median' in stats else None,
         }
 
     def _get_buy_size(self, price):
-        return self.broker._calculate_open_number(price)
+        if hasattr(self.broker, 'calculate_open_number'):
+            return self.broker.calculate_open_number(price, bt.Order.Buy)
+        # BackBroker: 留出按全部现金估算的手续费, 否则设置了手续费率时订单因现金不足被拒(Margin)
+        cash = self.broker.getcash()
+        commission = self.broker.getcommissioninfo(self.data).getcommission(cash / price, price)
+        return (cash - commission) / price
 
     def handle_oscillating_market(self):
         if self._open_order:  # 有未完成订单
@@ -157,14 +303,15 @@ class RSIReversal(bt.Strategy):
         # 成交量
         volume = np.array([self.data.volume[-i] for i in range(1, 6)])
 
-        logger.debug(f"{current_time} close:{current_close} RSI:{self.rsi[0]} 是否连续下降趋势:{is_rsi_downward}")
+        if log.enabled('DEBUG'):
+            logger.debug(f"{current_time} close:{current_close} RSI:{self.rsi[0]} 是否连续下降趋势:{is_rsi_downward}")
         # logger.debug(f"收盘价:{close_values} 连续上升:{close_trend}")
 
         if self._op == bt.Order.Buy:
             if self.rsi[0] < self.p.rsi_buy_signal:  # rsi 阈值
                 if is_rsi_downward:  # rsi连续下降
                     if current_close > self.data.close[-1]:  # rsi 底部价格和rsi背离
-                        size = self._get_buy_size()
+                        size = self._get_buy_size(current_close)
                         order = self._sumit_buy_order(current_close, size, bt.Order.Limit)
                         if order:
                             self.buy_signal = False
@@ -173,7 +320,7 @@ class RSIReversal(bt.Strategy):
                             return
 
             if self.rsi[0] < 10: # 超卖，反转
-                size = self._get_buy_size()
+                size = self._get_buy_size(current_close)
                 order = self._sumit_buy_order(current_close, size, bt.Order.Limit)
                 if order:
                     self.buy_signal = False
@@ -0,0 +1,210 @@
+"""
+影子交易: 一路实盘行情同时驱动成百上千组策略参数, 成交由 BackBroker 模拟, 不向交易所下单
+
+    store = CCXTStore(symbol='FIL-USDT', interval='1m', ...)          # 或 bus=True 读取行情总线
+    shadow = ShadowTrading(RSIReversal, param_grid, 'shadow.bin', cash=100, commission=0.001)
+    shadow.run(store)                                                 # 直到行情结束或 Ctrl+C
+    summarize('shadow.bin')
+
+- 主 cerebro 只加载行情(预加载、websocket、补数据与实盘相同), 每根K线分发给所有参数组
+- 每组参数一个线程运行自己的 cerebro(实时模式)和 BackBroker, 限价单在下一根K线按 open/high/low 撮合,
+  可设置手续费和滑点; 策略代码与实盘相同
+- 每根K线所有参数组处理完后, 追加写入每组的 (时间, 编号, 总资产, 现金, 持仓, 订单数), 定长记录, 随时可读
+- 参数组抛出异常(如马丁策略资金用完)后停止, 之后不再写入该组的记录
+"""
+import itertools
+import json
+import queue
+import threading
+
+import backtrader as bt
+import numpy as np
+import pandas as pd
+from loguru import logger
+
+from utils import analytics
+
+RECORD = np.dtype([('ts', '<i8'), ('variant', '<u4'), ('value', '<f8'), ('cash', '<f8'), ('position', '<f8'),
+                   ('orders', '<u4')])
+
+
+def expand_grid(grid):
+    """
+    :param grid: {参数名: [取值, ...]}, 见 WalkForward.parse_grid
+    :return: [{参数名: 取值}, ...], 笛卡尔积
+    """
+    names = list(grid)
+    return [dict(zip(names, values)) for values in itertools.product(*grid.values())]
+
+
+class ShadowFeed(bt.DataBase):
+    """参数组 cerebro 的数据: 从队列逐根读取主 cerebro 分发的K线, 读取下一根前上报当前K线处理完后的账户"""
+    params = (
+        ('variant', None),
+    )
+
+    def __init__(self):
+        super(ShadowFeed, self).__init__()
+        self._loaded = False
+
+    def islive(self):
+        return True
+
+    def haslivedata(self):
+        return not self.p.variant.bars.empty()
+
+    def _load(self):
+        variant = self.p.variant
+        if self._loaded:
+            variant.report()
+        bar = variant.bars.get()
+        if bar is None:
+            return False
+        self._loaded = True
+        self.lines.datetime[0] = bar[0]
+        self.lines.open[0] = bar[1]
+        self.lines.high[0] = bar[2]
+        self.lines.low[0] = bar[3]
+        self.lines.close[0] = bar[4]
+        self.lines.volume[0] = bar[5]
+        return True
+
+
+class _Variant:
+    def __init__(self, index, strategy, params, cash, commission, slippage, done):
+        self.index = index
+        self.params = params
+        self.bars = queue.Queue()
+        self.done = done
+        self.alive = True
+        self.ts = 0
+        self.cerebro = bt.Cerebro(stdstats=False)
+        self.cerebro.broker.setcash(cash)
+        if commission:
+            self.cerebro.broker.setcommission(commission=commission)
+        if slippage:
+            self.cerebro.broker.set_slippage_perc(slippage)
+        self.cerebro.adddata(ShadowFeed(variant=self))
+        self.cerebro.addstrategy(strategy, **params)
+        self.thread = threading.Thread(target=self._run, name=f"shadow-{index}", daemon=True)
+
+    def _run(self):
+        try:
+            self.cerebro.run(exactbars=1)
+        except Exception as e:
+            logger.warning(f"Shadow variant {self.index} {self.params} stopped: {e!r}")
+        finally:
+            self.alive = False
+            self.done.put(None)
+
+    def report(self):
+        broker = self.cerebro.broker
+        data = self.cerebro.datas[0]
+        self.done.put((self.ts, self.index, broker.getvalue(), broker.getcash(), broker.getposition(data).size,
+                       len(broker.orders)))
+
+
+class _FanOut(bt.Strategy):
+    """主 cerebro 的策略: 把每根K线分发给各参数组, 等它们处理完后写出结果"""
+    params = (
+        ('shadow', None),
+    )
+
+    def next(self):
+        data = self.data
+        self.p.shadow.dispatch(data.datetime[0], data.open[0], data.high[0], data.low[0], data.close[0],
+                               data.volume[0])
+
+
+class ShadowTrading:
+    def __init__(self, strategy, variants, path, cash=1000.0, commission=0.0, slippage=0.0):
+        """
+        :param strategy: 策略类, 如 RSIReversal / MartingaleLongStrategy
+        :param variants: [{参数名: 取值}, ...] 或 {参数名: [取值, ...]}(按笛卡尔积展开)
+        :param path: 结果文件, 同目录写 <path>.json 记录参数组
+        :param commission: 手续费率
+        :param slippage: 滑点百分比, 如 0.001
+        """
+        if isinstance(variants, dict):
+            variants = expand_grid(variants)
+        self.path = path
+        self.done = queue.Queue()
+        self.variants = [_Variant(i, strategy, params, cash, commission, slippage, self.done)
+                         for i, params in enumerate(variants)]
+        self.bars = 0
+        with open(f"{path}.json", 'w') as f:
+            json.dump({'strategy': strategy.__name__, 'cash': cash, 'commission': commission, 'slippage': slippage,
+                       'variants': variants}, f, ensure_ascii=False, default=str)
+        self._file = open(path, 'wb')
+
+    def dispatch(self, dt, open_, high, low, close, volume):
+        """分发一根K线, 所有存活的参数组处理完后追加写入结果"""
+        ts = round(bt.num2date(dt).timestamp() * 1000)
+        alive = [variant for variant in self.variants if variant.alive]
+        for variant in alive:
+            variant.ts = ts
+            variant.bars.put((dt, open_, high, low, close, volume))
+        records = []
+        waiting = len(alive)
+        while waiting:
+            record = self.done.get()
+            waiting -= 1
+            if record is not None:
+                records.append(record)
+        self.bars += 1
+        if records:
+            np.array(records, dtype=RECORD).tofile(self._file)
+            self._file.flush()
+
+    def run(self, store):
+        """
+        :param store: 行情数据, 如 CCXTStore
+        """
+        for variant in self.variants:
+            variant.thread.start()
+        logger.info(f"Shadow trading {len(self.variants)} variants -> {self.path}")
+        cerebro = bt.Cerebro(stdstats=False)
+        cerebro.adddata(store)
+        cerebro.addstrategy(_FanOut, shadow=self)
+        try:
+            cerebro.run(exactbars=1)
+        except KeyboardInterrupt:
+            pass
+        finally:
+            self.close()
+
+    def close(self):
+        for variant in self.variants:
+            variant.bars.put(None)
+        for variant in self.variants:
+            variant.thread.join()
+        self._file.close()
+
+
+def read_results(path):
+    """
+    :return: (记录 DataFrame, 参数组 DataFrame), 记录的 ts 为毫秒时间戳
+    """
+    records = pd.DataFrame(np.fromfile(path, dtype=RECORD))
+    with open(f"{path}.json") as f:
+        meta = json.load(f)
+    return records, pd.DataFrame(meta['variants']).rename_axis('variant')
+
+
+def summarize(path, periods_per_year=analytics.YEAR_SECONDS / 60):
+    """
+    每组参数的绩效, 参数组停止后资产按最后一次记录计
+    :return: DataFrame, 每组参数一行: 参数、最终资产、收益、最大回撤、夏普等(见 analytics.summary)
+    """
+    records, variants = read_results(path)
+    equity = records.pivot_table(index='variant', columns='ts', values='value')
+    equity = equity.reindex(variants.index).ffill(axis=1)
+    positions = records.pivot_table(index='variant', columns='ts', values='position').reindex(variants.index)
+    stats = analytics.summary(equity.to_numpy(), positions=positions.fillna(0.0).to_numpy(),
+                              periods_per_year=periods_per_year)
+    report = variants.copy()
+    report['value'] = equity.iloc[:, -1] if equity.shape[1] else np.nan
+    report['orders'] = records.groupby('variant')['orders'].last().reindex(variants.index)
+    for name in ('total_return', 'max_drawdown', 'sharpe', 'sortino', 'calmar', 'exposure'):
+        report[name] = stats[name]
+    return report
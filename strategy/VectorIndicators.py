@@ -0,0 +1,81 @@
+"""
+整段K线一次性计算的指标, 运算顺序与 backtrader 对应指标的 once 实现一致, 结果逐位相同
+未满周期的位置为 nan
+"""
+import math
+
+import numpy as np
+
+
+def mean(values, period):
+    """与 bt.indicators.SMA 一致: 每个窗口 math.fsum 求和后除以 period"""
+    out = np.full(len(values), np.nan)
+    data = values.tolist()
+    for i in range(period - 1, len(data)):
+        out[i] = math.fsum(data[i - period + 1:i + 1]) / period
+    return out
+
+
+def smoothed(values, period, start, alpha=None):
+    """
+    与 bt.indicators.SMMA / EMA 一致: 以 values[start-period+1:start+1] 的算术平均为种子, 之后按 alpha 指数平滑
+    :param start: 第一个有效值的下标
+    :param alpha: 平滑系数, 默认 1/period (SMMA)
+    """
+    out = np.full(len(values), np.nan)
+    if len(values) <= start:
+        return out
+    if alpha is None:
+        alpha = 1.0 / period
+    alpha1 = 1.0 - alpha
+    prev = math.fsum(values[start - period + 1:start + 1]) / period
+    out[start] = prev
+    data = values.tolist()
+    for i in range(start + 1, len(data)):
+        out[i] = prev = prev * alpha1 + data[i] * alpha
+    return out
+
+
+def rsi(close, period):
+    """
+    与 bt.indicators.RSI 一致(safediv=False); 平均跌幅为 0 时 backtrader 会抛出除零异常, 这里取 100
+    :param close: 收盘价数组
+    """
+    close = np.asarray(close, dtype=np.float64)
+    delta = np.empty(len(close))
+    delta[0] = np.nan
+    delta[1:] = close[1:] - close[:-1]
+    up = np.maximum(delta, 0.0)
+    down = np.maximum(-delta, 0.0)
+
+    maup = smoothed(up, period, period)
+    madown = smoothed(down, period, period)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        rs = maup / madown
+        return 100.0 - 100.0 / (1.0 + rs)
+
+
+def _pow(values, exponent):
+    return np.array([pow(v, exponent) for v in values.tolist()], dtype=np.float64)
+
+
+def ema(values, period):
+    """与 bt.indicators.EMA 一致: alpha = 2 / (1 + period), 第 period 个值为种子"""
+    values = np.asarray(values, dtype=np.float64)
+    return smoothed(values, period, period - 1, 2.0 / (1.0 + period))
+
+
+def bollinger(close, period, devfactor):
+    """
+    与 bt.indicators.BollingerBands 一致: SMA 中轨, StdDev(safepow=True) 为 sqrt(|mean(x^2) - mean^2|)
+    :return: (mid, top, bot)
+    """
+    close = np.asarray(close, dtype=np.float64)
+    mid = mean(close, period)
+    # 与 backtrader 一样用 Python 的 pow 计算平方和开方, numpy 的 x ** 2 (x * x) 个别值会差一个最低位
+    meansq = mean(_pow(close, 2), period)
+    with np.errstate(invalid='ignore'):
+        variance = np.abs(meansq - _pow(mid, 2))
+    stddev = _pow(variance, 0.5)
+    dev = devfactor * stddev
+    return mid, mid + dev, mid - dev
@@ -0,0 +1,220 @@
+"""
+走步优化(walk-forward): 在长历史上滑动训练/测试窗口, 训练窗口网格搜索参数,
+用最优参数回测紧随其后的测试窗口, 输出每个窗口的样本外表现
+
+- 指标在完整历史上只计算一次(IndicatorCache.add_window), 重叠的窗口直接截取, 窗口起点的指标已完整预热
+- 每个窗口前多回放 warmup 根K线, 指标的预热和回看在窗口起点前完成; 预热期间策略不下单, 收益只统计窗口内的部分
+- 窗口之间相互独立, 用进程池并行, 指标的磁盘缓存在进程间共享
+
+    grid = parse_grid(RSIReversal, ['rsi_buy_signal=30,35,40', 'stop_loss=0.05,0.1'])
+    report = walk_forward(df, RSIReversal, grid, train=4 * 10080, test=10080, workers=4)
+"""
+import itertools
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor
+
+import backtrader as bt
+import numpy as np
+import pandas as pd
+from loguru import logger
+
+from utils import log
+
+from .IndicatorCache import IndicatorCache
+
+COLUMNS = ('open', 'high', 'low', 'close', 'volume')
+
+
+def parse_grid(strategy, specs):
+    """
+    :param specs: ['name=v1,v2,...', ...], 取值按策略参数默认值的类型转换
+    :return: {参数名: [取值, ...]}
+    """
+    defaults = dict(strategy.params._getitems())
+    grid = {}
+    for spec in specs:
+        name, _, values = spec.partition('=')
+        name = name.strip()
+        if name not in defaults:
+            raise ValueError(f"{strategy.__name__} has no param {name}")
+        cast = type(defaults[name]) if defaults[name] is not None else float
+        grid[name] = [cast(value) for value in values.split(',') if value.strip()]
+    return grid
+
+
+def default_warmup(strategy, grid):
+    """窗口前回放的K线数: 最大周期 + 最长的连续下降回看"""
+    values = dict(strategy.params._getitems())
+    values.update({name: max(options) for name, options in grid.items()})
+    periods = [v for k, v in values.items() if k.endswith('period') and isinstance(v, (int, float))]
+    lookbacks = [v for k, v in values.items() if 'downward' in k and isinstance(v, (int, float))]
+    return int(max(periods, default=0) + max(lookbacks, default=0) + 1)
+
+
+def windows(length, train, test, step=None, warmup=0):
+    """
+    :return: [(训练起点, 训练终点/测试起点, 测试终点), ...], 下标为左闭右开
+    """
+    step = step or test
+    result = []
+    start = warmup
+    while start + train + test <= length:
+        result.append((start, start + train, start + train + test))
+        start += step
+    return result
+
+
+class WindowReturn(bt.Analyzer):
+    """
+    只统计 start 之后的收益和最大回撤, 之前的K线用于预热
+    预热期间不调用策略的 next, 指标照常计算但不下单, 窗口的起始资产不含预热期间开的仓
+    """
+    params = (
+        ('start', None),  # 窗口起点, bt.date2num
+    )
+
+    def start(self):
+        self.start_value = None
+        self.peak = None
+        self.max_drawdown = 0.0
+        self.bars = 0
+        strategy_next = self.strategy.next
+
+        def next_in_window():
+            if self.data.datetime[0] >= self.p.start:
+                strategy_next()
+
+        self.strategy.next = next_in_window
+
+    def next(self):
+        if self.data.datetime[0] < self.p.start:
+            return
+        value = self.strategy.broker.getvalue()
+        if self.start_value is None:
+            self.start_value = self.peak = value
+        self.peak = max(self.peak, value)
+        if self.peak > 0:
+            self.max_drawdown = max(self.max_drawdown, 1 - value / self.peak)
+        self.bars += 1
+
+    def stop(self):
+        # optreturn 时策略不随结果返回, 在 stop 中算好结果
+        end_value = self.strategy.broker.getvalue()
+        start_value = self.start_value or end_value
+        self.rets['return'] = end_value / start_value - 1 if start_value else 0.0
+        self.rets['max_drawdown'] = self.max_drawdown
+        self.rets['value'] = end_value
+        self.rets['bars'] = self.bars
+
+
+def score(analysis, metric):
+    if metric == 'calmar':
+        return analysis['return'] / analysis['max_drawdown'] if analysis['max_drawdown'] else analysis['return']
+    return analysis['return']
+
+
+# 工作进程内共享的数据和缓存, 由 _init_worker 设置
+_context = {}
+
+
+def _init_worker(df, strategy, grid, warmup, cash, cache_path, log_level=None):
+    if log_level is not None:
+        logger.remove()
+        logger.add(sys.stderr, level=log_level)
+        log.set_level(log_level)
+    _context.update(df=df, strategy=strategy, grid=grid, warmup=warmup, cash=cash,
+                    cache=IndicatorCache(cache_path))
+
+
+def _backtest(start, end, grid):
+    """
+    回测 [start, end) 区间, 前面多回放 warmup 根K线
+    :param grid: {参数名: [取值, ...]}, 多组参数在同一个 cerebro 中依次运行, 数据只加载一次
+    :return: [(参数, WindowReturn 结果), ...]
+    """
+    df, cache = _context['df'], _context['cache']
+    first = start - _context['warmup']
+    for column in COLUMNS:
+        cache.add_window(df[column].to_numpy(), first, end)
+
+    cerebro = bt.Cerebro(stdstats=False, optreturn=True, maxcpus=1)
+    cerebro.adddata(bt.feeds.PandasData(dataname=df.iloc[first:end]))
+    cerebro.broker.set_cash(_context['cash'])
+    cerebro.addanalyzer(WindowReturn, _name='window', start=bt.date2num(df.index[start].to_pydatetime()))
+    cerebro.optstrategy(_context['strategy'], indicator_cache=[cache], **grid)
+    results = []
+    for strategies in cerebro.run():
+        result = strategies[0]
+        params = {name: getattr(result.params, name) for name in grid}
+        results.append((params, result.analyzers.window.get_analysis()))
+    return results
+
+
+def _run_window(index, bounds, metric):
+    train_start, test_start, test_end = bounds
+    trained = _backtest(train_start, test_start, _context['grid'])
+    best, train = max(trained, key=lambda item: score(item[1], metric))
+    (_, test), = _backtest(test_start, test_end, {name: [value] for name, value in best.items()})
+
+    df = _context['df']
+    logger.info(f"Window {index}: {best} train:{train['return']:.4f} test:{test['return']:.4f}")
+    return {
+        'window': index,
+        'train_start': df.index[train_start],
+        'test_start': df.index[test_start],
+        'test_end': df.index[test_end - 1],
+        **best,
+        'train_return': train['return'],
+        'train_max_drawdown': train['max_drawdown'],
+        'test_return': test['return'],
+        'test_max_drawdown': test['max_drawdown'],
+        'test_value': test['value'],
+    }
+
+
+def walk_forward(df, strategy, grid, train, test, step=None, warmup=None, cash=1000.0, workers=None,
+                 cache_path=None, metric='return', log_level='WARNING'):
+    """
+    :param df: 含 open/high/low/close/volume 列、datetime 索引的 DataFrame
+    :param strategy: 支持 indicator_cache 参数的策略类
+    :param grid: {参数名: [取值, ...]}, 见 parse_grid
+    :param train: 训练窗口K线数
+    :param test: 测试窗口K线数
+    :param step: 窗口滑动的K线数, 默认等于 test
+    :param warmup: 窗口前回放的K线数, 默认见 default_warmup
+    :param workers: 并行进程数, 1 时在当前进程运行, None 为 CPU 核数
+    :param cache_path: 指标磁盘缓存目录, 多进程共享
+    :param metric: 训练窗口选参的指标, return 或 calmar(收益/最大回撤)
+    :param log_level: 工作进程的日志级别
+    :return: DataFrame, 每个窗口一行: 窗口区间、最优参数、训练和测试(样本外)收益及最大回撤
+    """
+    if warmup is None:
+        warmup = default_warmup(strategy, grid)
+    bounds = windows(len(df), train, test, step, warmup)
+    if not bounds:
+        raise ValueError(f"Not enough bars: {len(df)} < warmup {warmup} + train {train} + test {test}")
+    workers = min(workers or os.cpu_count() or 1, len(bounds))
+    logger.info(f"Walk forward: {len(bounds)} windows, {len(list(itertools.product(*grid.values())))} "
+                f"param sets, warmup:{warmup} workers:{workers}")
+
+    initargs = (df, strategy, grid, warmup, cash, cache_path, log_level)
+    if workers == 1:
+        _init_worker(*initargs[:-1])
+        rows = [_run_window(i, b, metric) for i, b in enumerate(bounds)]
+    else:
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=initargs) as pool:
+            rows = list(pool.map(_run_window, range(len(bounds)), bounds, [metric] * len(bounds)))
+    return pd.DataFrame(rows)
+
+
+def summary(report):
+    """样本外汇总: 各测试窗口收益复利累计"""
+    returns = report['test_return'].to_numpy()
+    return {
+        'windows': len(report),
+        'oos_return': float(np.prod(1 + returns) - 1),
+        'oos_mean_return': float(returns.mean()),
+        'oos_win_windows': int((returns > 0).sum()),
+        'oos_max_drawdown': float(report['test_max_drawdown'].max()),
+    }
@@ -3,13 +3,22 @@ import sys
 import backtrader as bt
 from loguru import logger
 
+from utils import log
+
 
 class SWAPStrategy(bt.Strategy):
     params = (
         ('rsi_period', 5),  # RSI周期
+        ('indicator_cache', None),  # IndicatorCache, 参数优化时共享指标计算结果
     )
 
     def __init__(self):
+        cache = self.p.indicator_cache
+        if cache is not None:
+            self.rsi = cache.rsi(self.data.close, self.params.rsi_period)
+            self.rsi_high = cache.rsi(self.data.high, self.params.rsi_period)
+            self.ema = cache.ema(self.data.close, self.params.rsi_period)
+            return
         self.rsi = bt.indicators.RSI(self.data.close, period=self.params.rsi_period)
         self.rsi_high = bt.indicators.RSI(self.data.high, period=self.params.rsi_period)
         self.ema = bt.indicators.ExponentialMovingAverage(self.data, period=self.params.rsi_period)
@@ -31,14 +40,15 @@ class SWAPStrategy(bt.Strategy):
 
     def next(self):
         current_close = self.data.close[0]
-        current_time = self.datas[0].datetime.datetime(0)
         # position = self.broker.getposition(self.data)
         # getcash = self.broker.getcash()
         data = self.datas[0]
-        logger.info(
-            f"{data.datetime.datetime()}, Open: {data.open[0]}, High: {data.high[0]}, Low: {data.low[0]}, Close: {data.close[0]}, Volume: {data.volume[0]:.2f}",
-        )
-        logger.info(f"{current_time} {current_close} RSI:{self.rsi[0]:2f} EMA:{self.ema[0]}")
+        if log.enabled('INFO'):
+            current_time = data.datetime.datetime(0)
+            logger.info(
+                f"{current_time}, Open: {data.open[0]}, High: {data.high[0]}, Low: {data.low[0]}, Close: {data.close[0]}, Volume: {data.volume[0]:.2f}",
+            )
+            logger.info(f"{current_time} {current_close} RSI:{self.rsi[0]:2f} EMA:{self.ema[0]}")
 
         return
         if len(self.broker.orders) != 0:
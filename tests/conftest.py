@@ -0,0 +1,5 @@
+import os
+import sys
+
+# 仓库根目录有 __init__.py, pytest 不会把它加入 sys.path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,108 @@
+import json
+from types import SimpleNamespace
+
+import pytest
+
+from broker.OKXBroker import OKXBroker
+from broker.PositionLedger import PositionLedger
+from stores.Account import Account
+from stores.OKX_Data import OKXAccountSocket
+
+
+def account_message(usdt_available, fil='0'):
+    return {'arg': {'channel': 'account'}, 'data': [{
+        'totalEq': '9250', 'imr': '2',
+        'details': [{'ccy': 'USDT', 'cashBal': '9000', 'availBal': usdt_available, 'eq': '9000'},
+                    {'ccy': 'FIL', 'cashBal': fil, 'eq': fil}],
+    }]}
+
+
+def positions_message(*positions):
+    return {'arg': {'channel': 'positions'}, 'data': [
+        {'instId': inst_id, 'pos': pos, 'avgPx': '30', 'margin': '1.5', 'markPx': '55'} for inst_id, pos in positions]}
+
+
+class FakeWebSocket:
+    def __init__(self):
+        self.sent = []
+
+    def send(self, message):
+        self.sent.append(json.loads(message))
+
+
+def make_socket():
+    # 不建立连接, 只测试推送处理
+    socket = OKXAccountSocket.__new__(OKXAccountSocket)
+    socket.api_key, socket.secret, socket.passphrase = 'key', 'secret', 'passphrase'
+    socket.account = Account()
+    socket._snapshot = set()
+    socket.timer = None
+    socket.ping_interval = 3600
+    return socket
+
+
+def test_ready_after_both_snapshots():
+    socket = make_socket()
+    socket._handle_data(account_message('8000'))
+    assert not socket.account.ready
+    socket._handle_data(positions_message(('FIL-USDT-SWAP', '10'), ('BTC-USDT-SWAP', '1')))
+    assert socket.account.ready
+    assert socket.account.available('USDT') == 8000.0
+    assert socket.account.margin == pytest.approx(2 + 1.5 * 2)  # 全仓 imr + 逐仓保证金
+
+    # 之后的推送是增量: 未出现的持仓保留, 数量为 0 的表示已平仓
+    socket._handle_data(positions_message(('BTC-USDT-SWAP', '0')))
+    assert socket.account.position('FIL-USDT-SWAP') == (10.0, 30.0)
+    assert socket.account.position('BTC-USDT-SWAP') == (0.0, 0.0)
+
+
+def test_invalidate_until_next_snapshot():
+    socket = make_socket()
+    socket._handle_data(account_message('8000'))
+    socket._handle_data(positions_message(('FIL-USDT-SWAP', '10')))
+
+    socket._on_close(None, None, None)
+    assert not socket.account.ready
+
+    ws = FakeWebSocket()
+    socket._subscribe(ws)  # 重新登录后再订阅
+    socket.timer.cancel()
+    assert ws.sent[0]['op'] == 'login'
+    socket._handle_data(account_message('7000'))
+    assert not socket.account.ready
+    # 重新订阅后的第一次持仓推送是快照, 断线期间平掉的持仓不再保留
+    socket._handle_data(positions_message(('BTC-USDT-SWAP', '1')))
+    assert socket.account.ready
+    assert socket.account.position('FIL-USDT-SWAP') == (0.0, 0.0)
+    assert socket.account.available('USDT') == 7000.0
+
+
+def make_broker(account, type_, leverage=1):
+    broker = OKXBroker.__new__(OKXBroker)
+    broker.p = SimpleNamespace(symbol='FIL-USDT', type=type_, leverage=leverage)
+    broker.store = SimpleNamespace(close=[50.0])
+    broker.cash = 100.0
+    broker.contract_size = 0.1
+    broker.ledger = PositionLedger()
+    broker.ledger.add_fill(2, 40.0)
+    broker.account = account
+    return broker
+
+
+def test_broker_reports_own_position_and_value():
+    socket = make_socket()
+    socket._handle_data(account_message('9000', fil='5'))
+    socket._handle_data(positions_message(('FIL-USDT-SWAP', '10')))
+
+    spot = make_broker(socket.account, OKXBroker.SPOT)
+    assert spot.getposition(None).size == 2.0  # 账户有 5 FIL, 本策略只买了 2
+    assert spot.getcash() == 100.0
+    assert spot.getvalue() == pytest.approx(100 + 2 * 50)
+    assert spot.get_account_equity() == 9250.0
+
+    swap = make_broker(socket.account, OKXBroker.SWAP, leverage=5)
+    # 保证金 2 * 0.1 * 40 / 5 + 按标记价格的浮动盈亏 (55 - 40) * 2 * 0.1
+    assert swap.getvalue() == pytest.approx(100 + 1.6 + 3.0)
+
+    spot.ledger.add_fill(4, 40.0)  # 本地记账超过交易所余额时以余额为准
+    assert spot.getposition(None).size == 5.0
@@ -0,0 +1,50 @@
+from datetime import datetime
+
+from stores.BarBuilder import TimeBarBuilder, VolumeBarBuilder
+
+
+def test_time_bars_aligned_to_interval():
+    builder = TimeBarBuilder(1000)
+    assert builder.add_trade(1200, 10.0, 1.0) == []
+    assert builder.add_trade(1500, 12.0, 2.0) == []
+    assert builder.add_trade(1900, 9.0, 1.0) == []
+    bars = builder.add_trade(2100, 11.0, 1.0)
+    assert len(bars) == 1
+    assert bars[0][:6] == [datetime.fromtimestamp(1), 10.0, 12.0, 9.0, 9.0, 4.0]
+    assert bars[0][7] == 10.0 + 24.0 + 9.0
+
+
+def test_late_trade_joins_current_bar():
+    builder = TimeBarBuilder(1000)
+    builder.add_trade(1200, 10.0, 1.0)
+    builder.add_trade(2100, 11.0, 1.0)
+    assert builder.add_trade(1900, 8.0, 1.0) == []  # 迟到的成交并入 [2000, 3000)
+    bars = builder.flush(3000)
+    assert bars[0][0] == datetime.fromtimestamp(2)
+    assert bars[0][3] == 8.0
+    assert bars[0][5] == 2.0
+
+
+def test_flush_waits_for_window_end():
+    builder = TimeBarBuilder(1000)
+    builder.add_trade(1200, 10.0, 1.0)
+    assert builder.flush(1999) == []
+    assert len(builder.flush(2000)) == 1
+    assert builder.flush(5000) == []
+
+
+def test_merge_smaller_bars():
+    builder = TimeBarBuilder(3000)
+    for i, (o, h, l, c) in enumerate([(10, 11, 9, 10.5), (10.5, 13, 10, 12), (12, 12.5, 8, 9)]):
+        assert builder.add_bar(i * 1000, o, h, l, c, 1.0) == []
+    bar = builder.flush(3000)[0]
+    assert bar[1:6] == [10, 13, 8, 9, 3.0]
+
+
+def test_volume_bars():
+    builder = VolumeBarBuilder(3.0)
+    assert builder.add_trade(1, 10.0, 2.0) == []
+    bars = builder.add_trade(2, 11.0, 1.5)
+    assert len(bars) == 1
+    assert bars[0][5] == 3.5
+    assert builder.add_trade(3, 12.0, 1.0) == []
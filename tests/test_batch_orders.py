@@ -0,0 +1,101 @@
+import collections
+from concurrent.futures import ThreadPoolExecutor
+from types import SimpleNamespace
+
+import backtrader as bt
+
+import broker.OKXBroker as okx_broker
+from broker.OKXBroker import OKXBroker
+from stores.CCXTStore import CCXTStore
+
+
+class FakeExchange:
+    def __init__(self, fail_batch=None):
+        self.fail_batch = fail_batch
+        self.batches = []
+
+    def create_orders(self, batch):
+        self.batches.append([order['price'] for order in batch])
+        if len(self.batches) - 1 == self.fail_batch:
+            raise Exception('batch failed')
+        # 价格为 3 的订单被交易所拒绝, 其余成功
+        return [{'id': str(order['price']), 'status': 'rejected' if order['price'] == 3 else 'open', 'info': {}}
+                for order in batch]
+
+    def cancel_orders(self, ids, symbol):
+        return [{'id': order_id, 'status': 'rejected' if order_id == '1' else 'canceled', 'info': {}}
+                for order_id in ids]
+
+
+def make_store(exchange, concurrency=1):
+    store = CCXTStore.__new__(CCXTStore)
+    store.p = SimpleNamespace(exchange_name='okx', order_concurrency=concurrency)
+    store._gateway = ThreadPoolExecutor(max_workers=concurrency) if concurrency > 1 else None
+    store.exchange = exchange
+    store.handler_precision = lambda symbol, price, size: (price, size)
+    return store
+
+
+def make_broker(store):
+    broker = OKXBroker.__new__(OKXBroker)
+    broker.p = SimpleNamespace(symbol='FIL-USDT', type=OKXBroker.SPOT, slippage=0, stop_percent=0, limit_percent=0,
+                               journal=None, history=None)
+    broker.store = store
+    broker.book = None
+    broker.orders = []
+    broker.notifs = collections.deque()
+    broker.get_highest_price_limit = lambda symbol: (float('inf'), 0.0)
+    return broker
+
+
+class FakeOrder:
+    def __init__(self, owner, data, ccxt_order, side, size, price, exectype, signal_price=None):
+        self.ccxt_order = ccxt_order
+        self.price = price
+        self.status = bt.Order.Submitted
+        self.recorded_status = None
+
+    def reject(self):
+        self.status = bt.Order.Rejected
+
+    def alive(self):
+        return self.status == bt.Order.Submitted
+
+    def clone(self):
+        return self
+
+
+def test_create_orders_splits_batches_in_order():
+    exchange = FakeExchange()
+    store = make_store(exchange, concurrency=3)
+    requests = [{'price': i} for i in range(45)]
+    results = store.create_orders(requests)
+    assert sorted(len(batch) for batch in exchange.batches) == [5, 20, 20]
+    assert [result['id'] for result in results] == [str(i) for i in range(45)]
+
+
+def test_failed_batch_maps_to_none():
+    store = make_store(FakeExchange(fail_batch=1))
+    results = store.create_orders([{'price': i} for i in range(45)])
+    assert all(result is not None for result in results[:20] + results[40:])
+    assert results[20:40] == [None] * 20
+
+
+def test_submit_orders_rejects_only_failed_positions(monkeypatch):
+    monkeypatch.setattr(okx_broker, 'CCXTOrder', FakeOrder)
+    broker = make_broker(make_store(FakeExchange(fail_batch=1)))
+    specs = [{'side': bt.Order.Buy, 'size': 1, 'price': i} for i in range(45)]
+    orders = broker.submit_orders(None, None, specs)
+
+    assert [order.price for order in orders] == list(range(45))  # 与请求一一对应
+    rejected = [order.price for order in orders if order.status == bt.Order.Rejected]
+    assert rejected == [3] + list(range(20, 40))
+    assert [order.price for order in broker.orders] == [i for i in range(45) if i not in rejected]
+    assert len(broker.notifs) == len(rejected)
+
+
+def test_cancel_orders_returns_accepted():
+    broker = make_broker(make_store(FakeExchange()))
+    orders = [FakeOrder(None, None, {'id': str(i)}, bt.Order.Buy, 1, i, bt.Order.Limit) for i in range(3)]
+    orders[2].status = bt.Order.Completed  # 已结束的订单不提交撤单
+    assert broker.cancel_orders(orders) == [orders[0]]
@@ -0,0 +1,83 @@
+import queue
+import threading
+
+from stores.OKX_Data import OKXKlineSocket
+
+MINUTE = 60 * 1000
+
+
+def make_socket(backfill=None):
+    # 不建立连接, 只测试K线处理
+    socket = OKXKlineSocket.__new__(OKXKlineSocket)
+    socket.symbol = 'FIL-USDT'
+    socket.interval = '1m'
+    socket.interval_ms = MINUTE
+    socket.backfill = backfill
+    socket.last_ts = None
+    socket.ohlcv = queue.Queue()
+    socket._lock = threading.Lock()
+    return socket
+
+
+def candle(ts, confirm=1):
+    return [str(ts), '10', '11', '9', '10.5', '100', '1050', '1050', str(confirm)]
+
+
+def push(socket, *candles):
+    for kline in candles:
+        socket._handle_kline_data({'data': [kline]})
+
+
+def queued(socket):
+    result = []
+    while not socket.ohlcv.empty():
+        result.append(int(socket.ohlcv.get_nowait()[0].timestamp() * 1000))
+    return result
+
+
+def test_drops_duplicates_and_unconfirmed():
+    socket = make_socket()
+    push(socket, candle(MINUTE), candle(2 * MINUTE, confirm=0), candle(MINUTE), candle(2 * MINUTE))
+    assert queued(socket) == [MINUTE, 2 * MINUTE]
+    push(socket, candle(MINUTE))  # 重连后重复推送更早的K线
+    assert queued(socket) == []
+
+
+def test_gap_backfilled_before_new_bar():
+    requests = []
+
+    def backfill(from_ms, to_ms):
+        requests.append((from_ms, to_ms))
+        # REST 返回的范围可能超出缺口, 超出部分和已有的K线都要丢弃
+        return [candle(ts) for ts in (MINUTE, 2 * MINUTE, 3 * MINUTE, 4 * MINUTE, 5 * MINUTE)]
+
+    socket = make_socket(backfill)
+    push(socket, candle(MINUTE), candle(5 * MINUTE))
+    assert requests == [(2 * MINUTE, 5 * MINUTE)]
+    assert queued(socket) == [MINUTE, 2 * MINUTE, 3 * MINUTE, 4 * MINUTE, 5 * MINUTE]
+
+
+def test_gap_without_backfill_keeps_new_bar():
+    socket = make_socket()
+    push(socket, candle(MINUTE), candle(4 * MINUTE))
+    assert queued(socket) == [MINUTE, 4 * MINUTE]
+
+
+def test_seed_and_fill_gap():
+    requests = []
+
+    def backfill(from_ms, to_ms):
+        requests.append((from_ms, to_ms))
+        return [candle(ts) for ts in range(from_ms, to_ms, MINUTE)]
+
+    socket = make_socket(backfill)
+    socket.seed(2 * MINUTE)  # REST 已加载到 2 分钟
+    push(socket, candle(2 * MINUTE))
+    assert queued(socket) == []
+
+    # 4 分 10 秒时仍未收到新K线: 补齐 3 分钟这一根已完成的K线, 4 分钟的K线还没结束
+    socket.fill_gap(4 * MINUTE + 10000)
+    assert requests == [(3 * MINUTE, 4 * MINUTE)]
+    assert queued(socket) == [3 * MINUTE]
+    socket.fill_gap(4 * MINUTE + 20000)
+    assert len(requests) == 1
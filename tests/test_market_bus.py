@@ -0,0 +1,91 @@
+import uuid
+from multiprocessing import shared_memory
+
+import pytest
+
+from stores.MarketBus import CandleRing, MarketBusReader, segment_name
+
+
+@pytest.fixture
+def name():
+    name = segment_name(f"TEST-{uuid.uuid4().hex[:8]}", '1m')
+    yield name
+    try:
+        shm = shared_memory.SharedMemory(name)
+    except FileNotFoundError:
+        return
+    shm.close()
+    shm.unlink()
+
+
+def _write(ring, n, start=0):
+    for i in range(start, start + n):
+        ring.write(i * 60000, 1.0 + i, 2.0 + i, 0.5 + i, 1.5 + i, 10.0 * i)
+
+
+def test_read_written_and_unwritten(name):
+    ring = CandleRing.create(name, 4, 60000)
+    assert ring.read(0) is None
+    _write(ring, 3)
+    assert ring.count == 3
+    assert ring.last_ts == 120000
+    assert ring.read(1) == (60000, 2.0, 3.0, 1.5, 2.5, 10.0)
+    assert ring.read(3) is None
+    ring.close()
+
+
+def test_overrun_detected(name):
+    ring = CandleRing.create(name, 4, 60000)
+    _write(ring, 6)  # 第 0、1 根已被第 4、5 根覆盖
+    assert ring.read(0) is False
+    assert ring.read(1) is False
+    assert ring.read(2)[0] == 120000
+    assert ring.read(5)[0] == 300000
+    assert ring.read(6) is None
+    ring.close()
+
+
+def test_write_in_progress_not_read(name):
+    ring = CandleRing.create(name, 4, 60000)
+    _write(ring, 1)
+    # 模拟写入第 1 根时读者读取: seq 为奇数
+    ring.seqs[1] += 1
+    assert ring.read(1) is None
+    ring.close()
+
+
+def test_create_reuses_matching_segment(name):
+    ring = CandleRing.create(name, 4, 60000)
+    _write(ring, 3)
+    ring.close()
+
+    ring = CandleRing.create(name, 4, 60000)
+    assert ring.count == 3
+    ring.close()
+
+    # 格式不同时重建
+    ring = CandleRing.create(name, 8, 60000)
+    assert ring.count == 0
+    assert ring.capacity == 8
+    ring.close()
+
+
+def test_reader_skips_overrun_and_duplicates(name):
+    assert CandleRing.attach(name) is None
+    ring = CandleRing.create(name, 4, 60000)
+    _write(ring, 2)
+    reader = MarketBusReader.__new__(MarketBusReader)
+    reader.name, reader.ring, reader.cursor, reader.last_ts = name, None, None, None
+    reader._attach()
+    assert reader.cursor == 2
+    assert [row[1] for row in reader.history(10)] == [1.0, 2.0]
+
+    _write(ring, 6, start=2)  # 读者落后超过 capacity
+    row = reader.get_ohlcv(timeout=0)
+    # 跳到 count - capacity + 1(第 5 根), 留一格余量, 避免读取期间再次被覆盖
+    assert row[1] == 6.0
+    reader.seed(6 * 60000)  # 已通过其他途径加载到第 6 根
+    assert reader.get_ohlcv(timeout=0)[1] == 8.0
+    assert reader.get_ohlcv(timeout=0) is None
+    reader.close()
+    ring.close()
@@ -0,0 +1,45 @@
+import zlib
+
+from stores.OrderBook import OrderBook
+
+
+def _signed_crc(text):
+    crc = zlib.crc32(text.encode())
+    return crc - (1 << 32) if crc >= (1 << 31) else crc
+
+
+def test_checksum_interleaves_raw_levels():
+    book = OrderBook()
+    book.apply_snapshot([['3366.1', '7', '0', '3'], ['3366', '6', '3', '4']],
+                        [['3366.8', '9', '10', '3'], ['3368', '8', '3', '4']], 1)
+    # 价格和数量保留交易所推送的原始字符串, 买卖交替拼接
+    assert book.checksum() == _signed_crc('3366.1:7:3366.8:9:3366:6:3368:8')
+
+
+def test_checksum_after_update_and_delete():
+    book = OrderBook()
+    book.apply_snapshot([['10.0', '1', '0', '1'], ['9.5', '2', '0', '1']], [['10.5', '3', '0', '1']], 1)
+    book.apply_update([['9.5', '0', '0', '0'], ['9.8', '4', '0', '1']], [['11', '1', '0', '1']], 2)
+    assert book.best_bid() == 10.0
+    assert book.best_ask() == 10.5
+    assert book.checksum() == _signed_crc('10.0:1:10.5:3:9.8:4:11:1')
+
+
+def test_fill_price_walks_depth():
+    book = OrderBook()
+    assert book.fill_price(True, 1) is None
+    book.apply_snapshot([['10', '1', '0', '1']], [['11', '1', '0', '1'], ['12', '2', '0', '1']], 1)
+    assert book.fill_price(True, 0.5) == 11.0
+    assert book.fill_price(True, 2) == 12.0
+    assert book.fill_price(True, 10) is None
+    assert book.fill_price(False, 1) == 10.0
+
+
+def test_checksum_mismatch_invalidates_book():
+    book = OrderBook()
+    good = _signed_crc('10:1:11:1')
+    assert book.apply_snapshot([['10', '1', '0', '1']], [['11', '1', '0', '1']], 1, good)
+    assert not book.apply_update([['10', '2', '0', '1']], [], 2, good)
+    assert book.fill_price(True, 1) is None
+    assert book.apply_snapshot([['10', '2', '0', '1']], [['11', '1', '0', '1']], 3, _signed_crc('10:2:11:1'))
+    assert book.fill_price(False, 2) == 10.0
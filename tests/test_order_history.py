@@ -0,0 +1,54 @@
+import os
+from types import SimpleNamespace
+
+import backtrader as bt
+import pytest
+
+from stores.OrderHistory import OrderHistory
+
+DAY1 = 1704067200000  # 2024-01-01 00:00 UTC
+DAY2 = DAY1 + 86400000
+
+
+def _order(order_id, ordtype=bt.Order.Buy, status=bt.Order.Submitted, filled=0.0):
+    return SimpleNamespace(ccxt_order={'id': order_id}, ref=1, ordtype=ordtype, exectype=bt.Order.Limit,
+                           status=status, size=2.0, price=10.0, signal_price=10.0,
+                           executed=SimpleNamespace(size=filled, price=10.1 if filled else 0.0, comm=0.0))
+
+
+@pytest.fixture
+def history(tmp_path):
+    history = OrderHistory(str(tmp_path), flush_interval=3600)
+    yield history
+    history.close()
+
+
+def test_compact_merges_chunks_without_losing_rows(history):
+    for i in range(3):
+        history.record_fill('FIL-USDT', _order(f"o{i}"), 1.0, 10.0 + i, 0.01, ts=DAY1 + i * 1000)
+        history.flush()  # 每次写出一个块
+    directory = os.path.join(history.path, 'fills', 'FIL-USDT', '20240101')
+    assert len(history._chunks(directory)) == 3
+    before = history.read('fills')
+
+    history.compact('fills', 'FIL-USDT', '20240101')
+    assert len(history._chunks(directory)) == 1
+    after = history.read('fills')
+    assert after.equals(before)
+    assert after['price'].tolist() == [10.0, 11.0, 12.0]
+
+
+def test_read_filters_by_symbol_and_time(history):
+    history.record_order('FIL-USDT', _order('a'), ts=DAY1)
+    history.record_order('FIL-USDT', _order('a', status=bt.Order.Completed, filled=2.0), ts=DAY2 + 1)
+    history.record_order('BTC-USDT', _order('b'), ts=DAY2 + 2)
+    history.flush()
+
+    assert history.read('orders')['ts'].tolist() == [DAY1, DAY2 + 1, DAY2 + 2]
+    assert history.read('orders', symbol='BTC-USDT')['order_id'].tolist() == ['b']
+    assert history.read('orders', start=DAY2, end=DAY2 + 2)['ts'].tolist() == [DAY2 + 1]
+
+    report = history.report('FIL-USDT')
+    assert report.loc['FIL-USDT', 'orders'] == 1
+    assert report.loc['FIL-USDT', 'completed'] == 1
+    assert report.loc['FIL-USDT', 'fill_ratio'] == 1.0
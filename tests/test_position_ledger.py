@@ -0,0 +1,130 @@
+from datetime import datetime
+from types import SimpleNamespace
+
+import backtrader as bt
+import pytest
+
+from broker.PositionLedger import PositionLedger, fill_delta
+from strategy.MartinPositionManager import MartinPositionManager
+from strategy.MartingaleStrategy import MartingaleLongStrategy
+
+
+def test_fill_delta():
+    assert fill_delta(0, 0, 0, 2, 10.0, 0.1) == (2, 10.0, 0.1)
+    size, price, fee = fill_delta(2, 10.0, 0.1, 5, 11.2, 0.25)
+    assert size == 3
+    assert price == pytest.approx(12.0)  # (11.2 * 5 - 10 * 2) / 3
+    assert fee == pytest.approx(0.15)
+    assert fill_delta(5, 11.2, 0.25, 5, 11.2, 0.25) is None
+
+
+def test_weighted_cost_and_realized():
+    ledger = PositionLedger()
+    ledger.add_fill(2, 10.0, 0.02)
+    ledger.add_fill(2, 12.0, 0.02)
+    assert ledger.size == 4
+    assert ledger.price == pytest.approx(11.0)
+
+    ledger.add_fill(-1, 13.0)  # 减仓不改变均价
+    assert ledger.size == 3
+    assert ledger.price == pytest.approx(11.0)
+    assert ledger.realized == pytest.approx(2.0)
+
+    ledger.add_fill(-3, 10.0)
+    assert ledger.size == 0
+    assert ledger.price == 0.0
+    assert ledger.realized == pytest.approx(-1.0)
+    assert ledger.fees == pytest.approx(0.04)
+    assert ledger.pnl(99.0) == pytest.approx(-1.04)
+
+
+def test_reverse_position_opens_at_fill_price():
+    ledger = PositionLedger()
+    ledger.add_fill(1, 10.0)
+    ledger.add_fill(-3, 12.0)
+    assert ledger.size == -2
+    assert ledger.price == 12.0
+    assert ledger.realized == pytest.approx(2.0)
+    assert ledger.unrealized(11.0) == pytest.approx(2.0)
+
+
+def test_partial_fills_booked_incrementally():
+    ledger = PositionLedger()
+    # 同一订单多次通知, 数量和均价为累计值
+    assert ledger.order_fill('a', 1.0, 10.0, 0.01) == (1.0, 10.0, 0.01)
+    ledger.order_fill('a', 1.0, 10.0, 0.01)  # 重复通知没有新成交
+    fill = ledger.order_fill('a', 3.0, 11.0, 0.03)
+    assert fill[0] == pytest.approx(2.0)
+    assert fill[1] == pytest.approx(11.5)
+    assert ledger.size == pytest.approx(3.0)
+    assert ledger.price == pytest.approx(11.0)
+    assert ledger.fees == pytest.approx(0.03)
+    assert ledger.fills == 2
+
+    ledger.close_order('a')
+    ledger.order_fill('b', -1.5, 12.0)
+    ledger.order_fill('b', -3.0, 12.0)
+    assert ledger.size == pytest.approx(0.0)
+    assert ledger.realized == pytest.approx(3.0)
+
+
+def test_state_round_trip_keeps_open_orders():
+    ledger = PositionLedger()
+    ledger.order_fill('a', 1.0, 10.0)
+    restored = PositionLedger()
+    restored.set_state(ledger.get_state())
+    restored.order_fill('a', 2.0, 11.0)  # 恢复后继续按增量记账
+    assert restored.size == pytest.approx(2.0)
+    assert restored.price == pytest.approx(11.0)
+    assert restored.fills == 2
+
+
+def test_martin_position_sell_closes_ladder():
+    manager = MartinPositionManager(2, 5)
+    manager.add_fill(1, 2.0, 10.0)
+    manager.add_fill(2, 4.0, 8.0)
+    assert manager.set_position_count == 2
+    assert manager.get_transaction_cost() == pytest.approx(8.0 + 2 / 3)
+
+    manager.add_fill(3, -6.0, 9.0)
+    assert manager.get_position() == pytest.approx(0.0)
+    assert manager.set_position_count == 2  # 卖单不计入加仓次数
+
+
+class FakeOrder(bt.Order):
+    def __init__(self, ref, ordtype, status, size, price, comm=0.0):
+        self.ref = ref
+        self.ordtype = ordtype
+        self.status = status
+        self.price = price
+        self.executed = SimpleNamespace(size=size, price=price, comm=comm)
+
+
+def fake_strategy(manager):
+    clock = SimpleNamespace(datetime=SimpleNamespace(datetime=lambda ago: datetime(2024, 1, 1)))
+    return SimpleNamespace(datas=[clock], martingale_position=manager, commission=0.0, count=0,
+                           checkpoint=lambda: None)
+
+
+def test_martingale_partial_fill_then_cancel():
+    manager = MartinPositionManager(2, 5)
+    manager.reset(100)
+    manager.get_size(10.0)
+    strategy = fake_strategy(manager)
+
+    MartingaleLongStrategy.notify_order(strategy, FakeOrder(1, bt.Order.Buy, bt.Order.Partial, 1.0, 10.0))
+    assert manager.set_position_count == 0
+    MartingaleLongStrategy.notify_order(strategy, FakeOrder(1, bt.Order.Buy, bt.Order.Canceled, 1.5, 10.0, 0.1))
+    assert manager.get_position() == pytest.approx(1.5)
+    assert manager.set_position_count == manager.count == 1
+    assert manager.is_completion()
+    assert manager.ledger._orders == {}
+    assert strategy.count == 1
+    assert strategy.commission == pytest.approx(0.1)
+
+    # 卖单部分成交后过期: 保留剩余持仓, 不重置加仓记录
+    MartingaleLongStrategy.notify_order(strategy, FakeOrder(2, bt.Order.Sell, bt.Order.Expired, -0.5, 12.0))
+    assert manager.get_position() == pytest.approx(1.0)
+    assert manager.set_position_count == manager.count == 1
+    assert manager.ledger._orders == {}
+    assert strategy.count == 2
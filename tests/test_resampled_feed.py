@@ -0,0 +1,39 @@
+import pytest
+
+from stores.ResampledFeed import ResampledFeed
+
+MINUTE = 60 * 1000
+T0 = 1888888 * 15 * MINUTE  # 对齐到 15 分钟的时间戳
+
+
+def feed_bars(feed, minutes):
+    """送入 T0 之后第 minutes 分钟的基础K线, dt 取分钟数便于核对"""
+    for m in minutes:
+        feed.add_bar(m, T0 + m * MINUTE, 10.0 + m, 20.0 + m, 5.0 + m, 11.0 + m, 1.0)
+
+
+def completed(feed):
+    return [(dt, int(bar[0].timestamp() * 1000), bar[1:6]) for dt, bar in feed.bars]
+
+
+def test_window_aligned_to_interval():
+    feed = ResampledFeed(interval_ms=15 * MINUTE, base_interval_ms=MINUTE)
+    feed_bars(feed, range(7, 14))  # 从区间中间开始
+    assert completed(feed) == []
+    feed_bars(feed, [14])  # 区间最后一根送入时完成, 不等下一根
+    assert completed(feed) == [(14, T0, [17.0, 34.0, 12.0, 25.0, 8.0])]
+    feed_bars(feed, range(15, 30))
+    assert [(dt, start) for dt, start, _ in completed(feed)] == [(14, T0), (29, T0 + 15 * MINUTE)]
+
+
+def test_missing_last_bar_closes_on_next_window():
+    feed = ResampledFeed(interval_ms=15 * MINUTE, base_interval_ms=MINUTE)
+    feed_bars(feed, [0, 13, 16])  # 缺少第 14 分钟
+    (dt, start, ohlcv), = completed(feed)
+    assert (dt, start) == (16, T0)  # 由下一个区间的第一根K线触发, 时间取触发的K线
+    assert ohlcv == [10.0, 33.0, 5.0, 24.0, 2.0]
+
+
+def test_interval_must_be_multiple_of_base():
+    with pytest.raises(ValueError):
+        ResampledFeed(interval_ms=90 * 1000, base_interval_ms=MINUTE)
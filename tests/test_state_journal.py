@@ -0,0 +1,67 @@
+import json
+
+from stores.StateJournal import StateJournal
+
+
+def _lines(path):
+    with open(path) as f:
+        return [json.loads(line) for line in f]
+
+
+def test_replay_last_write_wins(tmp_path):
+    path = str(tmp_path / 'state.jsonl')
+    journal = StateJournal(path, fsync=False)
+    journal.append('broker', {'cash': 100})
+    journal.append('strategy', {'count': 1})
+    journal.append('broker', {'cash': 90})
+    journal.close()
+
+    journal = StateJournal(path, fsync=False)
+    assert journal.get('broker') == {'cash': 90}
+    assert journal.get('strategy') == {'count': 1}
+    assert journal.get('missing', 'default') == 'default'
+    journal.close()
+
+
+def test_unchanged_state_not_rewritten(tmp_path):
+    path = str(tmp_path / 'state.jsonl')
+    journal = StateJournal(path, fsync=False)
+    journal.append('broker', {'cash': 100, 'orders': []})
+    journal.append('broker', {'orders': [], 'cash': 100})
+    journal.close()
+    assert len(_lines(path)) == 1
+
+
+def test_truncates_half_written_tail(tmp_path):
+    path = str(tmp_path / 'state.jsonl')
+    journal = StateJournal(path, fsync=False)
+    journal.append('broker', {'cash': 100})
+    journal.append('broker', {'cash': 90})
+    journal.close()
+    with open(path, 'a') as f:
+        f.write('{"key": "broker", "ts": 1, "state": {"cash": 8')  # 崩溃时只写了半行
+
+    journal = StateJournal(path, fsync=False)
+    assert journal.get('broker') == {'cash': 90}
+    # 新记录不能接在半行之后
+    journal.append('broker', {'cash': 80})
+    journal.close()
+    assert [record['state'] for record in _lines(path)] == [{'cash': 100}, {'cash': 90}, {'cash': 80}]
+    assert StateJournal(path, fsync=False).get('broker') == {'cash': 80}
+
+
+def test_compaction_keeps_latest_per_key(tmp_path):
+    path = str(tmp_path / 'state.jsonl')
+    journal = StateJournal(path, compact_every=5, fsync=False)
+    for i in range(4):
+        journal.append('broker', {'cash': i})
+    journal.append('strategy', {'count': 1})  # 第 5 条触发压缩
+    assert [record['key'] for record in _lines(path)] == ['broker', 'strategy']
+
+    journal.append('broker', {'cash': 10})
+    journal.close()
+    assert len(_lines(path)) == 3
+    journal = StateJournal(path, fsync=False)
+    assert journal.get('broker') == {'cash': 10}
+    assert journal.get('strategy') == {'count': 1}
+    journal.close()
@@ -0,0 +1,312 @@
+"""
+绩效统计(NumPy): 输入资产曲线、持仓和逐笔盈亏数组, 回测结果和实盘订单历史(OrderHistory)都可以使用
+
+- 函数沿最后一维计算, 二维输入(每行一组参数)一次算出整批结果, 逐笔盈亏长度不同时用 pad 补 nan
+- EquityTracker 逐根K线累计, 不保存整条资产曲线, 用于上万组参数的向量化回测(MartingaleSimulator)
+
+    stats = analytics.summary(equity, trades=pnl, positions=position, periods_per_year=analytics.periods_per_year(60))
+    stats = analytics.summary(np.vstack(curves), trades=analytics.pad(pnls))  # 每个值为一维数组
+"""
+import math
+
+import numpy as np
+
+YEAR_SECONDS = 365 * 24 * 3600  # 数字货币全年交易
+
+
+def periods_per_year(bar_seconds):
+    """每根K线秒数 -> 每年K线数, 用于年化"""
+    return YEAR_SECONDS / bar_seconds if bar_seconds else math.nan
+
+
+def pad(arrays):
+    """长度不同的一维数组 -> 二维数组, 不足部分为 nan"""
+    length = max((len(values) for values in arrays), default=0)
+    result = np.full((len(arrays), length), np.nan)
+    for row, values in enumerate(arrays):
+        result[row, :len(values)] = values
+    return result
+
+
+def returns(equity):
+    """逐根K线收益率, 前一根资产为 0 时记为 0"""
+    equity = np.asarray(equity, dtype=np.float64)
+    previous = equity[..., :-1]
+    return np.divide(equity[..., 1:] - previous, previous, out=np.zeros_like(previous), where=previous != 0)
+
+
+def drawdown(equity, peak=None):
+    """相对历史最高资产的回撤比例, 与资产曲线同形状"""
+    equity = np.asarray(equity, dtype=np.float64)
+    peak = np.maximum.accumulate(equity, axis=-1) if peak is None else peak
+    return np.divide(peak - equity, peak, out=np.zeros_like(equity), where=peak > 0)
+
+
+def max_drawdown_duration(equity, peak=None):
+    """最长的回撤持续K线数(从创新高到再次创新高)"""
+    equity = np.asarray(equity, dtype=np.float64)
+    peak = np.maximum.accumulate(equity, axis=-1) if peak is None else peak
+    index = np.broadcast_to(np.arange(equity.shape[-1]), equity.shape)
+    last_peak = np.maximum.accumulate(np.where(equity >= peak, index, 0), axis=-1)
+    return (index - last_peak).max(axis=-1, initial=0)
+
+
+def sharpe(rets, periods_per_year, risk_free=0.0):
+    """
+    年化夏普比率
+    :param rets: 逐根K线收益率
+    :param risk_free: 年化无风险利率
+    """
+    excess = np.asarray(rets, dtype=np.float64) - risk_free / periods_per_year
+    n = excess.shape[-1]
+    if n < 2:
+        return np.full(excess.shape[:-1], np.nan)[()]
+    std = excess.std(axis=-1, ddof=1)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return np.where(std > 0, excess.mean(axis=-1) / std * np.sqrt(periods_per_year), np.nan)[()]
+
+
+def sortino(rets, periods_per_year, risk_free=0.0):
+    """年化索提诺比率: 只用低于无风险收益的部分计算波动"""
+    excess = np.asarray(rets, dtype=np.float64) - risk_free / periods_per_year
+    if excess.shape[-1] == 0:
+        return np.full(excess.shape[:-1], np.nan)[()]
+    downside = np.sqrt(np.mean(np.minimum(excess, 0) ** 2, axis=-1))
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return np.where(downside > 0, excess.mean(axis=-1) / downside * np.sqrt(periods_per_year), np.nan)[()]
+
+
+def exposure(positions):
+    """持仓K线数占比"""
+    positions = np.asarray(positions, dtype=np.float64)
+    if positions.shape[-1] == 0:
+        return np.zeros(positions.shape[:-1])[()]
+    return (positions != 0).mean(axis=-1)[()]
+
+
+def _max_streak(flags):
+    """每行最长的连续 True 个数"""
+    count = np.cumsum(flags, axis=-1)
+    reset = np.maximum.accumulate(np.where(flags, 0, count), axis=-1)
+    return (count - reset).max(axis=-1, initial=0)
+
+
+def trade_stats(pnl):
+    """
+    逐笔盈亏分布
+    :param pnl: 每笔交易的盈亏, 二维时每行一组参数, nan 为补齐的空位
+    :return: {指标: 数值或数组}
+    """
+    pnl = np.asarray(pnl, dtype=np.float64)
+    valid = ~np.isnan(pnl)
+    values = np.where(valid, pnl, 0.0)
+    win = values > 0
+    loss = values < 0
+    trades = valid.sum(axis=-1)
+    wins = win.sum(axis=-1)
+    losses = loss.sum(axis=-1)
+    gross_win = np.where(win, values, 0.0).sum(axis=-1)
+    gross_loss = -np.where(loss, values, 0.0).sum(axis=-1)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        avg_win = np.where(wins > 0, gross_win / wins, 0.0)
+        avg_loss = np.where(losses > 0, gross_loss / losses, 0.0)
+        stats = {
+            'trades': trades,
+            'wins': wins,
+            'losses': losses,
+            'win_rate': np.where(trades > 0, wins / trades, np.nan),
+            'avg_win': avg_win,
+            'avg_loss': avg_loss,
+            'payoff': np.where(avg_loss > 0, avg_win / avg_loss, np.nan),
+            'profit_factor': np.where(gross_loss > 0, gross_win / gross_loss, np.nan),
+            'expectancy': np.where(trades > 0, values.sum(axis=-1) / trades, np.nan),
+            'max_consecutive_losses': _max_streak(loss),
+        }
+    if pnl.shape[-1]:
+        # 一次排序得到全部分位数, nan 排在末尾; 比 np.nanpercentile 逐行处理快一个数量级, 结果相同
+        ordered = np.sort(pnl, axis=-1)
+        for name, q in (('worst', 0), ('p05', 5), ('median', 50), ('p95', 95), ('best', 100)):
+            stats[name] = _percentile(ordered, trades, q)
+    return {name: value[()] for name, value in stats.items()}
+
+
+def _percentile(ordered, count, q):
+    """已排序数组前 count 个值的 q 分位数(线性插值, 与 np.percentile 默认方法相同), count 为 0 时为 nan"""
+    position = np.maximum(count - 1, 0) * (q / 100)
+    low = np.floor(position).astype(np.int64)
+    high = np.minimum(low + 1, np.maximum(count - 1, 0))
+    lower = np.take_along_axis(ordered, low[..., None], axis=-1)[..., 0]
+    upper = np.take_along_axis(ordered, high[..., None], axis=-1)[..., 0]
+    return np.where(count > 0, lower + (upper - lower) * (position - low), np.nan)
+
+
+def trades_from_fills(sizes, prices, fees=None):
+    """
+    按成交还原逐笔交易盈亏(加权平均成本, 仓位归零时为一笔交易结束), 用于实盘订单历史
+    :param sizes: 带方向的成交数量, 买入为正
+    :param fees: 每笔成交的手续费(计价币), 计入所在交易
+    :return: 每笔已结束交易的盈亏
+    """
+    fees = np.zeros(len(sizes)) if fees is None else fees
+    position = cost = pnl = 0.0
+    result = []
+    for size, price, fee in zip(np.asarray(sizes, dtype=np.float64).tolist(),
+                                np.asarray(prices, dtype=np.float64).tolist(),
+                                np.asarray(fees, dtype=np.float64).tolist()):
+        pnl -= fee
+        if position == 0 or (position > 0) == (size > 0):
+            cost = (cost * position + price * size) / (position + size)
+            position += size
+            continue
+        closed = size if abs(size) <= abs(position) else -position
+        pnl += (price - cost) * -closed
+        position += size
+        if abs(position) < 1e-12:
+            result.append(pnl)
+            position = cost = pnl = 0.0
+        elif (position > 0) == (size > 0):
+            # 反手: 剩余部分按成交价开新仓
+            result.append(pnl)
+            cost, pnl = price, 0.0
+    return np.array(result)
+
+
+def summary(equity, trades=None, positions=None, periods_per_year=YEAR_SECONDS / 60, risk_free=0.0):
+    """
+    :param equity: 逐根K线的总资产, 二维时每行一组参数
+    :param trades: 逐笔盈亏, 见 trade_stats
+    :param positions: 逐根K线的持仓, 用于计算 exposure
+    :param periods_per_year: 每年K线数, 默认按 1 分钟K线
+    :return: {指标: 数值或数组}
+        total_return 总收益率, annual_return 年化收益率, volatility 年化波动率,
+        max_drawdown 最大回撤, max_drawdown_duration 最长回撤K线数, sharpe, sortino, calmar(年化收益/最大回撤),
+        exposure 持仓K线占比, 以及 trade_stats 的各项
+    """
+    equity = np.asarray(equity, dtype=np.float64)
+    rets = returns(equity)
+    peak = np.maximum.accumulate(equity, axis=-1)
+    bars = equity.shape[-1]
+    with np.errstate(divide='ignore', invalid='ignore'):
+        total = np.where(equity[..., 0] > 0, equity[..., -1] / equity[..., 0] - 1, np.nan) if bars else np.nan
+        annual = np.power(1 + total, periods_per_year / max(bars - 1, 1)) - 1
+        max_dd = drawdown(equity, peak).max(axis=-1, initial=0)
+        stats = {
+            'total_return': total,
+            'annual_return': annual,
+            'volatility': rets.std(axis=-1, ddof=1) * np.sqrt(periods_per_year) if bars > 2 else np.nan,
+            'max_drawdown': max_dd,
+            'max_drawdown_duration': max_drawdown_duration(equity, peak),
+            'sharpe': sharpe(rets, periods_per_year, risk_free),
+            'sortino': sortino(rets, periods_per_year, risk_free),
+            'calmar': np.where(max_dd > 0, annual / max_dd, np.nan),
+        }
+    if positions is not None:
+        stats['exposure'] = exposure(positions)
+    if trades is not None:
+        stats.update(trade_stats(trades))
+    return {name: np.asarray(value)[()] for name, value in stats.items()}
+
+
+class EquityTracker:
+    def __init__(self, n, periods_per_year=YEAR_SECONDS / 60, risk_free=0.0):
+        """
+        逐根K线累计 n 组参数的绩效, 内存与K线数无关, 结果与 summary 相同(波动率按单遍公式计算, 末位可能不同)
+        :param n: 参数组数
+        """
+        self.periods_per_year = periods_per_year
+        self.risk_free = risk_free
+        self.bars = 0
+        self.first = self.last = self.peak = None
+        self.max_drawdown = np.zeros(n)
+        self.duration = np.zeros(n, dtype=np.int64)  # 当前回撤已持续的K线数
+        self.max_duration = np.zeros(n, dtype=np.int64)
+        self.exposed = np.zeros(n, dtype=np.int64)
+        self._sum = np.zeros(n)
+        self._sumsq = np.zeros(n)
+        self._downside = np.zeros(n)
+        self._pnl = np.zeros(n)
+        self._trades = np.zeros(n, dtype=np.int64)
+        self._wins = np.zeros(n, dtype=np.int64)
+        self._losses = np.zeros(n, dtype=np.int64)
+        self._gross_win = np.zeros(n)
+        self._gross_loss = np.zeros(n)
+        self._streak = np.zeros(n, dtype=np.int64)
+        self._max_streak = np.zeros(n, dtype=np.int64)
+
+    def update(self, equity, positions=None):
+        """
+        :param equity: 本根K线各组的总资产
+        :param positions: 本根K线各组的持仓
+        """
+        equity = np.asarray(equity, dtype=np.float64)
+        if self.bars == 0:
+            self.first = equity.copy()
+            self.peak = equity.copy()
+        else:
+            ret = np.divide(equity - self.last, self.last, out=np.zeros_like(equity), where=self.last != 0)
+            excess = ret - self.risk_free / self.periods_per_year
+            self._sum += excess
+            self._sumsq += excess * excess
+            self._downside += np.minimum(excess, 0) ** 2
+            new_peak = equity >= self.peak
+            np.maximum(self.peak, equity, out=self.peak)
+            self.duration = np.where(new_peak, 0, self.duration + 1)
+            np.maximum(self.max_duration, self.duration, out=self.max_duration)
+        drawdown = np.divide(self.peak - equity, self.peak, out=np.zeros_like(equity), where=self.peak > 0)
+        np.maximum(self.max_drawdown, drawdown, out=self.max_drawdown)
+        if positions is not None:
+            self.exposed += np.asarray(positions) != 0
+        self.last = equity
+        self.bars += 1
+
+    def add_trades(self, pnl, mask):
+        """
+        :param pnl: 各组本次结束的交易盈亏
+        :param mask: 哪些组有交易结束
+        """
+        pnl = np.where(mask, pnl, 0.0)
+        win = mask & (pnl > 0)
+        loss = mask & (pnl < 0)
+        self._trades += mask
+        self._wins += win
+        self._losses += loss
+        self._pnl += pnl
+        self._gross_win += np.where(win, pnl, 0.0)
+        self._gross_loss -= np.where(loss, pnl, 0.0)
+        self._streak = np.where(loss, self._streak + 1, np.where(mask, 0, self._streak))
+        np.maximum(self._max_streak, self._streak, out=self._max_streak)
+
+    def summary(self):
+        """与 summary 同名的指标(逐笔分布的分位数除外), 每个值为长度 n 的数组"""
+        ppy = self.periods_per_year
+        n = self.bars - 1
+        with np.errstate(divide='ignore', invalid='ignore'):
+            total = np.where(self.first > 0, self.last / self.first - 1, np.nan)
+            annual = np.power(1 + total, ppy / max(n, 1)) - 1
+            mean = self._sum / n if n else np.full_like(total, np.nan)
+            std = np.sqrt(np.maximum(self._sumsq - self._sum * mean, 0) / (n - 1)) if n > 1 else np.nan
+            downside = np.sqrt(self._downside / n) if n else np.nan
+            wins, losses, trades = self._wins, self._losses, self._trades
+            avg_win = np.where(wins > 0, self._gross_win / wins, 0.0)
+            avg_loss = np.where(losses > 0, self._gross_loss / losses, 0.0)
+            return {
+                'total_return': total,
+                'annual_return': annual,
+                'volatility': std * np.sqrt(ppy),
+                'max_drawdown': self.max_drawdown,
+                'max_drawdown_duration': self.max_duration,
+                'sharpe': np.where(std > 0, mean / std * np.sqrt(ppy), np.nan),
+                'sortino': np.where(downside > 0, mean / downside * np.sqrt(ppy), np.nan),
+                'calmar': np.where(self.max_drawdown > 0, annual / self.max_drawdown, np.nan),
+                'exposure': self.exposed / max(self.bars, 1),
+                'trades': trades,
+                'wins': wins,
+                'losses': losses,
+                'win_rate': np.where(trades > 0, wins / trades, np.nan),
+                'avg_win': avg_win,
+                'avg_loss': avg_loss,
+                'payoff': np.where(avg_loss > 0, avg_win / avg_loss, np.nan),
+                'profit_factor': np.where(self._gross_loss > 0, self._gross_win / self._gross_loss, np.nan),
+                'expectancy': np.where(trades > 0, self._pnl / trades, np.nan),
+                'max_consecutive_losses': self._max_streak,
+            }
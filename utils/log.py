@@ -0,0 +1,144 @@
+"""
+交易热路径上的日志工具(基于 loguru)
+
+- setup: 日志写入由后台线程完成(QueueSink), 交易线程只负责把消息放入队列
+- enabled: 判断级别是否会被输出(按 setup / set_level 设置的级别), 被过滤的级别不格式化 f-string、不 json.dumps
+- throttled: 重复消息限流, interval 秒内同一个 key 只输出一次, 跳过的条数附在下一条消息后
+
+    if log.enabled('DEBUG'):
+        logger.debug(f"close:{close} rsi:{rsi}")
+    log.throttled(('order', order_id, status), 60, 'INFO', "Order details: {}", lambda: json.dumps(order))
+"""
+import collections
+import math
+import queue
+import sys
+import threading
+import time
+
+from loguru import logger
+
+
+class QueueSink:
+    def __init__(self, target):
+        """
+        loguru 输出: 调用线程只把格式化好的消息放入队列, 后台线程批量写入
+        loguru 自带的 enqueue 每条记录都要 pickle 后经过进程间管道, 在交易线程上的开销比同步写文件还大
+        :param target: 文件路径或已打开的流(如 sys.stderr)
+        """
+        self._owned = isinstance(target, str)
+        self._stream = open(target, 'a', encoding='utf-8') if self._owned else target
+        self._queue = queue.SimpleQueue()
+        self._thread = threading.Thread(target=self._run, name='log-writer', daemon=True)
+        self._thread.start()
+
+    def write(self, message):
+        self._queue.put(message)
+
+    def _run(self):
+        while True:
+            batch = [self._queue.get()]
+            while True:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            stop = batch[-1] is None
+            if stop:
+                batch.pop()
+            self._stream.write(''.join(batch))
+            self._stream.flush()
+            if stop:
+                return
+
+    def stop(self):
+        """logger.remove 时调用, 写完队列中的消息"""
+        self._queue.put(None)
+        self._thread.join()
+        if self._owned:
+            self._stream.close()
+
+
+def setup(level='INFO', path=None, enqueue=True):
+    """
+    替换 loguru 默认的同步 stderr 输出
+    :param level: 最低输出级别
+    :param path: 日志文件, None 时只输出到 stderr
+    :param enqueue: 由后台线程写入, 交易线程不等待 IO
+    """
+    logger.remove()
+    logger.add(QueueSink(sys.stderr) if enqueue else sys.stderr, level=level)
+    if path:
+        logger.add(QueueSink(path) if enqueue else path, level=level)
+    set_level(level)
+
+
+_levels = {}  # 级别名称 -> 数值
+_min_level = 0  # 已配置的最低输出级别, 未调用 setup / set_level 时视为全部输出(loguru 默认 DEBUG)
+
+
+def set_level(level):
+    """
+    不经过 setup 自行 logger.remove / logger.add 时调用, 使 enabled 与实际输出一致
+    :param level: 所有输出中的最低级别, None 表示没有任何输出
+    """
+    global _min_level
+    _min_level = math.inf if level is None else logger.level(level).no
+
+
+def enabled(level):
+    """
+    :param level: 级别名称, 如 'DEBUG'
+    :return: 是否至少有一个输出会记录该级别
+    """
+    no = _levels.get(level)
+    if no is None:
+        no = _levels[level] = logger.level(level).no
+    return no >= _min_level
+
+
+class Throttle:
+    def __init__(self, maxsize=10000):
+        """
+        :param maxsize: 记录的 key 数量上限, 超出时淘汰最久未出现的 key
+        """
+        self.maxsize = maxsize
+        self._keys = collections.OrderedDict()  # key -> [上次输出时间, 跳过条数]
+        self._lock = threading.Lock()
+
+    def allow(self, key, interval):
+        """
+        :return: (是否输出, 上次输出后跳过的条数)
+        """
+        now = time.monotonic()
+        with self._lock:
+            entry = self._keys.get(key)
+            if entry is not None and now - entry[0] < interval:
+                entry[1] += 1
+                return False, 0
+            suppressed = entry[1] if entry is not None else 0
+            self._keys[key] = [now, 0]
+            self._keys.move_to_end(key)
+            if len(self._keys) > self.maxsize:
+                self._keys.popitem(last=False)
+            return True, suppressed
+
+
+_throttle = Throttle()
+
+
+def throttled(key, interval, level, message, *args):
+    """
+    interval 秒内同一个 key 只输出一次
+    :param key: 重复消息的标识, 如 ('order', 订单ID, 状态)
+    :param message: loguru 格式的消息, 如 "Order details: {}"
+    :param args: 可调用对象, 只在确实输出时调用
+    """
+    if not enabled(level):
+        return
+    allowed, suppressed = _throttle.allow(key, interval)
+    if not allowed:
+        return
+    if suppressed:
+        message = f"{message} (+{suppressed} suppressed)"
+    logger.opt(lazy=True, depth=1).log(level, message, *args)